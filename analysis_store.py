@@ -0,0 +1,172 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import threading
+
+import tracing
+import sqlite_util
+
+###########################
+# 分析结果存储配置
+###########################
+# 大纲分析结果落盘到 SQLite（WAL 模式，多个进程可同时读写）；设为空字符串则不落盘，只在内存中缓存
+ANALYSIS_STORE_PATH = os.environ.get(
+    "INTERVIEW_ANALYSIS_STORE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "analysis_store.sqlite3")
+)
+# 启动时预热到内存的最近记录条数
+ANALYSIS_STORE_WARM_LIMIT = int(os.environ.get("INTERVIEW_ANALYSIS_STORE_WARM_LIMIT", "256"))
+
+
+def make_analysis_key(namespace, prompt_version, interview_outline, key_questions):
+    """
+    存储键 = (调用方模块, 提示词版本, 大纲, 关键问题) 的哈希：
+    修改分析提示词时递增 prompt_version，旧结果自然失效
+    """
+    raw = json.dumps([namespace, prompt_version, interview_outline, key_questions], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class AnalysisStore:
+    """
+    大纲分析结果（评分指标列表）的持久化存储：
+      - 内存字典在前，SQLite 在后；内存未命中时再查库（其他进程可能刚写入）
+      - 每次操作单独开连接，不在线程间共享 sqlite3 连接
+      - 创建时把最近的若干条记录预热到内存
+    """
+
+    def __init__(self, path=ANALYSIS_STORE_PATH, warm_limit=ANALYSIS_STORE_WARM_LIMIT):
+        self.path = path
+        self._memory = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if self.path:
+            self._init_db()
+            self._warm(warm_limit)
+
+    def _connect(self):
+        return sqlite_util.connect(self.path)
+
+    def _init_db(self):
+        sqlite_util.init_schema(
+            self.path,
+            "CREATE TABLE IF NOT EXISTS outline_analysis ("
+            " key TEXT PRIMARY KEY,"
+            " rating_metrics TEXT NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+
+    def _warm(self, limit):
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT key, rating_metrics FROM outline_analysis ORDER BY created_at DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+        finally:
+            conn.close()
+        with self._lock:
+            for key, rating_metrics in rows:
+                self._memory[key] = json.loads(rating_metrics)
+
+    def get(self, key):
+        """返回评分指标列表；没有记录时返回 None"""
+        with self._lock:
+            rating_metrics = self._memory.get(key)
+        if rating_metrics is None and self.path:
+            conn = self._connect()
+            try:
+                row = conn.execute(
+                    "SELECT rating_metrics FROM outline_analysis WHERE key = ?", (key,)
+                ).fetchone()
+            finally:
+                conn.close()
+            if row is not None:
+                rating_metrics = json.loads(row[0])
+                with self._lock:
+                    self._memory[key] = rating_metrics
+        with self._lock:
+            if rating_metrics is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return list(rating_metrics) if rating_metrics is not None else None
+
+    def put(self, key, rating_metrics):
+        rating_metrics = list(rating_metrics)
+        if self.path:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO outline_analysis (key, rating_metrics, created_at) VALUES (?, ?, ?)",
+                        (key, json.dumps(rating_metrics, ensure_ascii=False), time.time())
+                    )
+            finally:
+                conn.close()
+        with self._lock:
+            self._memory[key] = rating_metrics
+
+    def clear(self):
+        """清空全部分析结果（内存与数据库），例如基准测试需要每轮都冷启动时"""
+        if self.path:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute("DELETE FROM outline_analysis")
+            finally:
+                conn.close()
+        with self._lock:
+            self._memory.clear()
+
+
+_analysis_store = None
+_analysis_store_lock = threading.Lock()
+
+
+def get_analysis_store():
+    """进程内共享的分析结果存储（首次使用时建表并预热）"""
+    global _analysis_store
+    if _analysis_store is None:
+        with _analysis_store_lock:
+            if _analysis_store is None:
+                _analysis_store = AnalysisStore()
+    return _analysis_store
+
+
+def load_or_analyze(analyze, interview_outline, key_questions, namespace, prompt_version):
+    """
+    先查存储，命中则直接返回评分指标；否则调用 analyze(interview_outline, key_questions) 并写回。
+    分析失败（评分指标为空）时不写入，下次仍会重新分析。
+    """
+    store = get_analysis_store()
+    key = make_analysis_key(namespace, prompt_version, interview_outline, key_questions)
+    with tracing.span("analysis_store.get", path=store.path) as span:
+        rating_metrics = store.get(key)
+        span.set_attribute("hit", rating_metrics is not None)
+    if rating_metrics is not None:
+        return rating_metrics
+    rating_metrics = analyze(interview_outline, key_questions)
+    if rating_metrics:
+        with tracing.span("analysis_store.put", path=store.path):
+            store.put(key, rating_metrics)
+    return rating_metrics
+
+
+async def load_or_analyze_async(analyze, interview_outline, key_questions, namespace, prompt_version):
+    """load_or_analyze 的异步版本：analyze 为协程函数；读写存储放到线程里，不阻塞事件循环"""
+    store = get_analysis_store()
+    key = make_analysis_key(namespace, prompt_version, interview_outline, key_questions)
+    with tracing.span("analysis_store.get", path=store.path) as span:
+        rating_metrics = await asyncio.to_thread(store.get, key)
+        span.set_attribute("hit", rating_metrics is not None)
+    if rating_metrics is not None:
+        return rating_metrics
+    rating_metrics = await analyze(interview_outline, key_questions)
+    if rating_metrics:
+        with tracing.span("analysis_store.put", path=store.path):
+            await asyncio.to_thread(store.put, key, rating_metrics)
+    return rating_metrics
@@ -0,0 +1,258 @@
+"""
+离线批量评估历史访谈记录：从 JSONL 文件逐行读取访谈记录，对每条记录
+  - 对每一轮（访谈员提问 + 受访者回答）重新调用 evaluate_response 判断回答深度
+  - 调用 generate_final_summary 生成最终的打分总结
+结果逐条追加写入输出 JSONL，并定期报告吞吐（条 / 分钟）。
+
+输入每行一条记录：
+    {"id": "...", "interview_outline": "...", "key_questions": [...],
+     "dialog_history": [{"role": "interviewer" | "interviewee", "content": "..."}, ...],
+     "rating_metrics": [...]}
+rating_metrics 可省略：省略时按大纲分析（load_outline_analysis_async，同一大纲只分析一次，结果存进 analysis_store）；
+id 省略时用行号（line-N）。
+
+输出每行一条结果：
+    {"id": "...", "final_summary": {...}, "turn_depths": [{"turn": 3, "depth": "DEEPER", "confidence": 0.82}, ...],
+     "elapsed_s": 1.23}
+失败的记录带 "error" 字段。中断后用同样的命令重新运行即可续跑：输出文件里已经成功的 id 会跳过，
+失败的会重试（同一 id 以输出文件中最后一行为准）。
+
+用法（在仓库根目录）：
+    python batch_evaluate.py transcripts.jsonl results.jsonl --concurrency 8 --max-calls 32
+    python batch_evaluate.py transcripts.jsonl results.jsonl --no-turns   # 只生成总结
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+
+import final_model
+from llm_client import close_async_client
+
+
+###########################
+# 输入 / 断点
+###########################
+def read_records(path):
+    """逐行产出 (id, 记录)；解析失败的行产出 (id, None)"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield f"line-{line_number}", None
+                continue
+            yield str(record.get("id", f"line-{line_number}")), record
+
+
+def load_checkpoint(output_path):
+    """
+    已成功完成的 id 集合（同一 id 以最后一行为准）。
+    上次运行在写一行的中途被杀掉时，文件末尾会留下半行，这里把它截掉，避免与之后追加的结果粘在一起。
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            data = data[:data.rfind(b"\n") + 1]
+            f.truncate(len(data))
+    for line in data.decode("utf-8").splitlines():
+        try:
+            result = json.loads(line)
+        except ValueError:
+            continue
+        if result.get("error"):
+            done.discard(result.get("id"))
+        else:
+            done.add(result.get("id"))
+    return done
+
+
+def turn_pairs(dialog_history):
+    """(回答在 dialog_history 中的位置, 访谈员的问题, 受访者的回答) 列表"""
+    return [
+        (i, dialog_history[i - 1]["content"], turn["content"])
+        for i, turn in enumerate(dialog_history)
+        if i > 0 and turn["role"] == "interviewee" and dialog_history[i - 1]["role"] == "interviewer"
+    ]
+
+
+###########################
+# 评估
+###########################
+class BatchEvaluator:
+    """
+    在一个事件循环里并发评估多条记录（使用 final_model 的 *_async 函数）。
+    max_calls 限制同时在途的模型调用数（大纲分析的四步各占一个名额）；
+    大纲分析按 (大纲, 关键问题) 去重，同一大纲的记录共用一次分析。
+    """
+
+    def __init__(self, max_calls=32, evaluate_turns=True):
+        self.evaluate_turns = evaluate_turns
+        self._calls = asyncio.Semaphore(max(1, max_calls))
+        self._analyses = {}
+
+    async def _call(self, coro):
+        async with self._calls:
+            return await coro
+
+    async def rating_metrics(self, record):
+        if record.get("rating_metrics"):
+            return record["rating_metrics"]
+        interview_outline = record["interview_outline"]
+        key_questions = record.get("key_questions") or []
+        key = json.dumps([interview_outline, key_questions], ensure_ascii=False)
+        if key not in self._analyses:
+            self._analyses[key] = asyncio.ensure_future(
+                final_model.load_outline_analysis_async(interview_outline, key_questions, limit=self._call)
+            )
+        analysis = self._analyses[key]
+        try:
+            rating_metrics = await analysis
+            if not rating_metrics:
+                raise RuntimeError("outline analysis failed")
+        except Exception:
+            # 分析失败（抛异常或评分指标为空）不缓存，下一条同大纲的记录重新分析
+            if self._analyses.get(key) is analysis:
+                del self._analyses[key]
+            raise
+        return rating_metrics
+
+    async def _turn_depths(self, dialog_history):
+        pairs = turn_pairs(dialog_history)
+        decisions = await asyncio.gather(*(
+            self._call(final_model.evaluate_response_async(question, answer)) for _, question, answer in pairs
+        ))
+        return [
+            {"turn": i, "depth": str(decision), "confidence": decision.confidence}
+            for (i, _, _), decision in zip(pairs, decisions)
+        ]
+
+    async def evaluate(self, record_id, record):
+        started = time.perf_counter()
+        result = {"id": record_id}
+        if record is None:
+            result["error"] = "invalid json line"
+            return result
+        try:
+            dialog_history = record["dialog_history"]
+            rating_metrics = await self.rating_metrics(record)
+            summary = self._call(final_model.generate_final_summary_async(
+                dialog_history, record["interview_outline"], rating_metrics
+            ))
+            if self.evaluate_turns:
+                summary_text, result["turn_depths"] = await asyncio.gather(summary, self._turn_depths(dialog_history))
+            else:
+                summary_text = await summary
+            result["rating_metrics"] = rating_metrics
+            try:
+                result["final_summary"] = json.loads(summary_text)
+            except ValueError:
+                result["final_summary"] = summary_text
+                result["error"] = "final summary is not valid JSON"
+            if isinstance(result["final_summary"], dict) and "error" in result["final_summary"]:
+                # final_model 在重试用尽后返回的兜底 JSON
+                result["error"] = result["final_summary"]["error"]
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+        result["elapsed_s"] = round(time.perf_counter() - started, 3)
+        return result
+
+
+###########################
+# 进度与吞吐
+###########################
+class Progress:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.completed = 0
+        self.failed = 0
+        self.skipped = 0
+
+    def record(self, result):
+        if result.get("error"):
+            self.failed += 1
+        else:
+            self.completed += 1
+
+    def throughput(self):
+        """本次运行完成的条数（含失败） / 分钟"""
+        elapsed = time.perf_counter() - self.started
+        return (self.completed + self.failed) / elapsed * 60 if elapsed > 0 else 0.0
+
+    def line(self):
+        return (f"完成 {self.completed} 条，失败 {self.failed} 条，跳过（已完成）{self.skipped} 条，"
+                f"{time.perf_counter() - self.started:.1f}s，{self.throughput():.1f} 条/分钟")
+
+
+async def _report_periodically(progress, interval):
+    while True:
+        await asyncio.sleep(interval)
+        print(progress.line(), flush=True)
+
+
+async def run(args):
+    done = load_checkpoint(args.output)
+    evaluator = BatchEvaluator(max_calls=args.max_calls, evaluate_turns=not args.no_turns)
+    progress = Progress()
+    # 控制同时在处理的记录数，输入文件按需读取，不会一次把所有记录读进内存
+    slots = asyncio.Semaphore(max(1, args.concurrency))
+    pending = set()
+    submitted = 0
+
+    with open(args.output, "a", encoding="utf-8") as out:
+        async def process(record_id, record):
+            try:
+                result = await evaluator.evaluate(record_id, record)
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()
+                progress.record(result)
+            finally:
+                slots.release()
+
+        reporter = asyncio.ensure_future(_report_periodically(progress, args.progress_interval))
+        try:
+            for record_id, record in read_records(args.input):
+                if record_id in done:
+                    progress.skipped += 1
+                    continue
+                if args.limit is not None and submitted >= args.limit:
+                    break
+                await slots.acquire()
+                task = asyncio.ensure_future(process(record_id, record))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                submitted += 1
+            if pending:
+                await asyncio.gather(*pending)
+        finally:
+            reporter.cancel()
+            await close_async_client()
+    print(progress.line())
+    return progress
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线批量评估历史访谈记录（可断点续跑）")
+    parser.add_argument("input", help="访谈记录 JSONL")
+    parser.add_argument("output", help="结果 JSONL（追加写入；已有的成功结果在续跑时跳过）")
+    parser.add_argument("--concurrency", type=int, default=8, help="同时处理的记录数")
+    parser.add_argument("--max-calls", type=int, default=32, help="同时在途的模型调用数")
+    parser.add_argument("--no-turns", action="store_true", help="不重新评估每一轮回答的深度，只生成总结")
+    parser.add_argument("--limit", type=int, default=None, help="本次最多处理多少条（不含跳过的）")
+    parser.add_argument("--progress-interval", type=float, default=10.0, help="报告进度的间隔（秒）")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        print("已中断；用同样的命令重新运行会从断点继续")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+大纲分析阶段的基准测试：本地起一个模拟的 vLLM 服务（mock_vllm，每个请求固定延迟，模拟生成耗时），
+比较 analyze_interview_outline 四步顺序执行与并发执行的耗时，
+并给出四步之间可被服务端前缀缓存复用的 token 数（本地估算，见 prompt_layout）。
+
+用法（在仓库根目录）：
+    python benchmarks/bench_analysis.py --latency 2 --rounds 3
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_vllm import MockConfig, start_mock_server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="analyze_interview_outline 顺序 vs 并发")
+    parser.add_argument("--latency", type=float, default=1.0, help="模拟服务每个请求的耗时（秒）")
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    # 每个请求固定耗时 latency 秒（全部算作首 token 耗时）
+    server = start_mock_server(MockConfig(ttft=args.latency, tpot=0.0))
+    # 必须在导入 final_model 之前设置：指向本地模拟服务，并关闭回复缓存以免后几轮直接命中
+    os.environ["INTERVIEW_API_URL"] = server.url
+    os.environ["INTERVIEW_CACHE"] = "0"
+    import final_model
+    import interview_prompts
+
+    outline = "未来人工智能的发展趋势"
+    key_questions = ["你认为当前 AI 发展的最大挑战是什么？", "AI 在未来 10 年可能会如何影响人类社会？"]
+
+    def sequential():
+        # 改造前的执行方式：四步依次请求
+        for _, messages in interview_prompts.analysis_steps(outline, key_questions):
+            final_model._generate_text(messages, "analysis")
+
+    def concurrent():
+        final_model.analyze_interview_outline(outline, key_questions)
+
+    print(f"模拟延迟 {args.latency:.2f}s / 请求，{args.rounds} 轮")
+    timings = {}
+    for name, fn in (("sequential", sequential), ("concurrent", concurrent)):
+        samples = []
+        for _ in range(args.rounds):
+            started = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - started)
+        timings[name] = sum(samples) / len(samples)
+        print(f"{name:>10}: 平均 {timings[name]:.3f}s（{', '.join(f'{s:.3f}' for s in samples)}）")
+    print(f"加速比: {timings['sequential'] / timings['concurrent']:.2f}x")
+
+    # 一次全新的分析（本地前缀缓存估算清零）中，四步之间能共享多少前缀 token（估算默认关闭，这里打开）
+    import prompt_layout
+    prompt_layout.PREFIX_STATS_ENABLED = True
+    prompt_layout.reset_prefix_stats()
+    final_model.analyze_interview_outline(outline, key_questions)
+    stats = prompt_layout.prefix_stats()["analysis"]
+    print(
+        f"前缀复用估算: {stats['requests']} 个请求，共 {stats['prompt_tokens']} token，"
+        f"可复用 {stats['shared_tokens']} token（{stats['shared_ratio']:.0%}）"
+    )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""
+完整访谈的基准测试：用脚本文件里的受访者回答驱动 final_model.conduct_interview，
+记录各阶段的耗时（大纲分析、背景问题、每次回答评估、追问、过渡语、最终总结），
+并统计每个阶段的 LLM 调用次数、prompt / 输出字符数以及耗时的 p50 / p95。
+
+默认在本地启动 mock_vllm 模拟服务；传 --api-url 则对真实服务测试。
+脚本文件格式见 benchmarks/interview_script.json：大纲、关键问题，以及按顺序作答的 answers
+（回答用完后自动回答 “结束”）。
+
+用法（在仓库根目录）：
+    python benchmarks/bench_interview.py --rounds 5 --ttft 0.3 --tpot 0.02
+    python benchmarks/bench_interview.py --api-url http://10.77.110.129:8000/v1/chat/completions
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_prompt import to_messages
+from mock_vllm import MockConfig, start_mock_server
+
+DEFAULT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "interview_script.json")
+
+# 计时的阶段：final_model 中的函数名 -> 报告里的阶段名
+TIMED_STAGES = {
+    "load_outline_analysis": "analysis",
+    "generate_overall_background_question": "background_question",
+    "evaluate_response": "evaluate_response",
+    "assess_turn": "assess_turn",
+    "generate_deeper_question": "deeper_question",
+    "handle_unanswerable_response": "unanswerable_followup",
+    "generate_final_summary": "final_summary",
+}
+# 后台预取过渡语的调用不在受访者的等待路径上，单独归类
+PREFETCH_STAGE = "transition_prefetch"
+
+
+def percentile(samples, q):
+    """最近秩法的分位数"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+class ScriptedInterviewee:
+    """按顺序给出脚本里的回答；回答用完后回答 “结束”，并记下脚本与访谈流程没对上"""
+
+    def __init__(self, answers, print_fn=None):
+        self.answers = list(answers)
+        self.position = 0
+        self.exhausted = False
+        self.print_fn = print_fn
+
+    def __call__(self, prompt=""):
+        if self.position >= len(self.answers):
+            self.exhausted = True
+            answer = "结束"
+        else:
+            answer = self.answers[self.position]
+            self.position += 1
+        if self.print_fn is not None:
+            self.print_fn(f"{prompt}{answer}")
+        return answer
+
+
+class StageRecorder:
+    """
+    给 final_model 的各阶段函数和 LLM 适配层套上计时 / 计数的包装。
+    每个线程记录自己当前所在的阶段，LLM 调用计入该阶段；
+    预取线程里没有阶段，计入 transition_prefetch。
+    """
+
+    def __init__(self):
+        self.latencies = {}
+        self.calls = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _current(self):
+        return getattr(self._local, "stage", None) or PREFETCH_STAGE
+
+    def timed(self, stage, fn):
+        def wrapper(*args, **kwargs):
+            outer = getattr(self._local, "stage", None)
+            self._local.stage = stage
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                self._local.stage = outer
+                # 嵌套调用（assess_turn 退回两次分类）只计最外层的耗时
+                if outer is None:
+                    with self._lock:
+                        self.latencies.setdefault(stage, []).append(elapsed)
+        return wrapper
+
+    def _count(self, prompts, completions):
+        stage = self._current()
+        prompt_chars = sum(len(m["content"]) for prompt in prompts for m in to_messages(prompt))
+        with self._lock:
+            calls = self.calls.setdefault(stage, {"calls": 0, "prompt_chars": 0, "completion_chars": 0})
+            calls["calls"] += len(prompts)
+            calls["prompt_chars"] += prompt_chars
+            calls["completion_chars"] += sum(len(text) for text in completions)
+
+    def instrument_adapter(self, adapter):
+        generate, generate_stream, top_logprobs = adapter.generate, adapter.generate_stream, adapter.top_logprobs
+
+        def counted_generate(prompts, sampling_params, *args, **kwargs):
+            results = generate(prompts, sampling_params, *args, **kwargs)
+            self._count(prompts, [result.outputs[0].text for result in results])
+            return results
+
+        def counted_stream(prompt, sampling_params, *args, **kwargs):
+            pieces = []
+            try:
+                for delta in generate_stream(prompt, sampling_params, *args, **kwargs):
+                    pieces.append(delta)
+                    yield delta
+            finally:
+                self._count([prompt], ["".join(pieces)])
+
+        def counted_top_logprobs(prompt, sampling_params, *args, **kwargs):
+            top = top_logprobs(prompt, sampling_params, *args, **kwargs)
+            self._count([prompt], [top[0][0] if top else ""])
+            return top
+
+        adapter.generate = counted_generate
+        adapter.generate_stream = counted_stream
+        adapter.top_logprobs = counted_top_logprobs
+
+    def instrument_transitions(self, start_prefetch):
+        """过渡语的耗时按受访者实际等待的时间计（TransitionTable.get：预取好了几乎为 0）"""
+        def wrapper(*args, **kwargs):
+            table = start_prefetch(*args, **kwargs)
+            table.get = self.timed("transition", table.get)
+            return table
+        return wrapper
+
+
+def install(final_model, recorder):
+    for name, stage in TIMED_STAGES.items():
+        setattr(final_model, name, recorder.timed(stage, getattr(final_model, name)))
+    final_model.start_transition_prefetch = recorder.instrument_transitions(final_model.start_transition_prefetch)
+    recorder.instrument_adapter(final_model.llm)
+
+
+def report(recorder, wall_times, rounds, incomplete):
+    stages = sorted(set(recorder.latencies) | set(recorder.calls), key=_stage_order)
+    print(f"{rounds} 轮访谈，平均 {sum(wall_times) / len(wall_times):.3f}s / 轮"
+          + (f"（{incomplete} 轮脚本回答不够，提前结束）" if incomplete else ""))
+    print(f"{'stage':<22}{'n':>5}{'p50(s)':>9}{'p95(s)':>9}{'calls':>7}{'prompt':>9}{'output':>9}")
+    totals = {"calls": 0, "prompt_chars": 0, "completion_chars": 0}
+    for stage in stages:
+        samples = recorder.latencies.get(stage, [])
+        calls = recorder.calls.get(stage, {"calls": 0, "prompt_chars": 0, "completion_chars": 0})
+        for key in totals:
+            totals[key] += calls[key]
+        print(f"{stage:<22}{len(samples):>5}{percentile(samples, 50):>9.3f}{percentile(samples, 95):>9.3f}"
+              f"{calls['calls']:>7}{calls['prompt_chars']:>9}{calls['completion_chars']:>9}")
+    print(f"{'total':<22}{'':>5}{'':>9}{'':>9}{totals['calls']:>7}{totals['prompt_chars']:>9}{totals['completion_chars']:>9}")
+
+
+def _stage_order(stage):
+    order = list(TIMED_STAGES.values()) + ["transition", PREFETCH_STAGE]
+    return order.index(stage) if stage in order else len(order)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="脚本化的完整访谈基准测试")
+    parser.add_argument("--script", default=DEFAULT_SCRIPT, help="大纲与受访者回答的 JSON 文件")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--api-url", default=None, help="对真实服务测试；不传则启动本地模拟服务")
+    parser.add_argument("--ttft", type=float, default=0.2, help="模拟服务的首 token 耗时（秒）")
+    parser.add_argument("--tpot", type=float, default=0.02, help="模拟服务每个输出 token 的耗时（秒）")
+    parser.add_argument("--jitter", type=float, default=0.3, help="模拟服务的对数正态抖动")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="模拟服务注入 5xx 的比例")
+    parser.add_argument("--warm", action="store_true", help="各轮之间保留分析结果和过渡语（默认每轮冷启动）")
+    parser.add_argument("--verbose", action="store_true", help="打印访谈过程")
+    args = parser.parse_args()
+
+    with open(args.script, "r", encoding="utf-8") as f:
+        script = json.load(f)
+
+    server = None
+    if args.api_url is None:
+        server = start_mock_server(MockConfig(
+            ttft=args.ttft, tpot=args.tpot, jitter=args.jitter, distribution="lognormal",
+            error_rate=args.error_rate,
+        ))
+    # 必须在导入 final_model 之前设置；关闭回复缓存，分析结果只放内存（每轮按需清空）
+    os.environ["INTERVIEW_API_URL"] = args.api_url or server.url
+    os.environ["INTERVIEW_CACHE"] = "0"
+    os.environ["INTERVIEW_ANALYSIS_STORE"] = ""
+
+    import final_model
+    import analysis_store
+    import transition_prefetch
+
+    recorder = StageRecorder()
+    install(final_model, recorder)
+
+    workdir = tempfile.mkdtemp(prefix="bench_interview_")
+    outline_path = os.path.join(workdir, "interview_outline.json")
+    with open(outline_path, "w", encoding="utf-8") as f:
+        json.dump({"interview_outline": script["interview_outline"], "key_questions": script["key_questions"]},
+                  f, ensure_ascii=False)
+
+    print_fn = print if args.verbose else (lambda *a, **k: None)
+    wall_times = []
+    incomplete = 0
+    for _ in range(args.rounds):
+        if not args.warm:
+            analysis_store.get_analysis_store().clear()
+            transition_prefetch.clear_transition_tables()
+        interviewee = ScriptedInterviewee(script["answers"], print_fn if args.verbose else None)
+        started = time.perf_counter()
+        final_model.conduct_interview(
+            input_fn=interviewee, print_fn=print_fn,
+            outline_path=outline_path, summary_path=os.path.join(workdir, "interview_summary.json"),
+        )
+        wall_times.append(time.perf_counter() - started)
+        incomplete += interviewee.exhausted
+
+    report(recorder, wall_times, args.rounds, incomplete)
+    if server is not None:
+        print(f"模拟服务: {server.stats.snapshot()}")
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
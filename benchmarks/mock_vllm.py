@@ -0,0 +1,483 @@
+"""
+本地模拟的 vLLM 服务（OpenAI 兼容的 /v1/chat/completions），没有 GPU 机器时用来做基准测试和压测。
+
+- 支持流式（SSE）、logprobs / top_logprobs、guided_choice / guided_json、max_tokens 与 stop
+- 延迟按 “首 token 耗时（TTFT）+ 每个输出 token 的耗时” 模拟，可选固定、均匀或对数正态分布；
+  还可以给每个未命中前缀缓存的 prompt token 计 prefill 耗时（前缀缓存按 prompt_layout 的方式模拟）
+- 按任务给出确定性的回复：同一请求总是得到同样的结果
+  （不愿回答 YES/NO、回答深度 SURFACE/DEEPER/ENOUGH、单轮评估 JSON、总结 JSON、分析、提问 / 过渡语）
+- 故障注入：按比例返回 5xx、挂起不响应（触发客户端超时）、极慢地逐个吐 token
+
+用法（在仓库根目录）：
+    python benchmarks/mock_vllm.py --port 8000 --ttft 0.3 --tpot 0.02 --error-rate 0.05
+    INTERVIEW_API_URL=http://127.0.0.1:8000/v1/chat/completions python final_model.py
+
+也可以在脚本里直接启动：
+    server = start_mock_server(MockConfig(ttft=0.2))
+    os.environ["INTERVIEW_API_URL"] = server.url
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_prompt import ChatPrompt
+from prompt_layout import approx_tokens, PrefixCacheEstimator
+
+###########################
+# 延迟与故障配置
+###########################
+
+class LatencyModel:
+    """
+    单个耗时的分布：fixed 总是 mean；uniform 在 mean ± jitter 之间；
+    lognormal 的中位数为 mean、jitter 为对数标准差（长尾，更接近真实服务）
+    """
+
+    def __init__(self, mean, jitter=0.0, distribution="fixed"):
+        if distribution not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"unknown distribution: {distribution}")
+        self.mean = mean
+        self.jitter = jitter
+        self.distribution = distribution
+
+    def sample(self, rng):
+        if self.mean <= 0:
+            return 0.0
+        if self.distribution == "uniform":
+            return max(0.0, rng.uniform(self.mean - self.jitter, self.mean + self.jitter))
+        if self.distribution == "lognormal":
+            return rng.lognormvariate(math.log(self.mean), self.jitter)
+        return self.mean
+
+
+class MockConfig:
+    """
+    模拟服务的配置：
+      ttft / tpot             首 token 耗时、每个输出 token 的耗时（秒），分布见 LatencyModel
+      prefill_per_token       每个未命中前缀缓存的 prompt token 额外增加的首 token 耗时（秒）
+      error_rate / error_status  按比例直接返回的错误状态码
+      hang_rate / hang_seconds   按比例挂起 hang_seconds 秒后断开连接，不返回任何内容
+      drip_rate / drip_tpot      按比例变成 “慢滴”：每个 token 耗时 drip_tpot 秒
+      seed                    随机数种子（延迟抖动与故障是否发生）
+    """
+
+    def __init__(self,
+                 ttft=0.2,
+                 tpot=0.02,
+                 jitter=0.0,
+                 distribution="fixed",
+                 prefill_per_token=0.0,
+                 error_rate=0.0,
+                 error_status=503,
+                 hang_rate=0.0,
+                 hang_seconds=60.0,
+                 drip_rate=0.0,
+                 drip_tpot=1.0,
+                 seed=0):
+        self.ttft = LatencyModel(ttft, jitter * ttft, distribution)
+        self.tpot = LatencyModel(tpot, jitter * tpot, distribution)
+        self.prefill_per_token = prefill_per_token
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.drip_rate = drip_rate
+        self.drip_tpot = drip_tpot
+        self.seed = seed
+
+
+###########################
+# 确定性回复
+###########################
+_REFUSAL_MARKERS = ("不想", "不愿", "不方便", "不知道", "不清楚", "跳过", "无可奉告", "没什么好说", "pass")
+
+_QUESTIONS = [
+    "能具体说说这件事对您的日常生活有什么影响吗",
+    "您当时为什么会这样想，背后有哪些考虑",
+    "如果换一个角度看，您觉得其他人会怎么评价这个问题",
+    "这种看法是从什么时候开始形成的，有没有具体的经历",
+]
+_TRANSITIONS = [
+    "谢谢您的分享，接下来我们聊聊另一个相关的话题",
+    "这部分我们先聊到这里，下面想听听您对另一个问题的看法",
+]
+_CLOSINGS = ["感谢您今天的分享，我们的访谈就到这里"]
+_BACKGROUND_QUESTIONS = ["请先简单介绍一下您自己，以及您平时和这个主题有哪些接触"]
+_METRICS = ["对主题的理解深度", "个人经验的相关性", "观点的多样性", "对未来影响的判断", "表达的逻辑性"]
+
+
+def _digest(text):
+    return int(hashlib.sha256(text.encode("utf-8")).hexdigest(), 16)
+
+
+def _pick(options, key):
+    return options[_digest(key) % len(options)]
+
+
+def _field(text, name):
+    """取出 user 消息中 “名称: 值” 一行的值（提示词布局见 prompt_layout.build_messages）"""
+    for line in text.splitlines():
+        if line.startswith(f"{name}:"):
+            return line[len(name) + 1:].strip()
+    return ""
+
+
+def detect_task(body):
+    """按请求里的约束字段和 system 提示词判断是哪个访谈任务（关闭 guided decoding 时也能识别）"""
+    messages = body.get("messages") or [{"content": ""}]
+    system = messages[0]["content"] if messages[0].get("role") == "system" else ""
+    labels = body.get("guided_choice")
+    schema_keys = set((body.get("guided_json") or {}).get("properties", {}))
+    if labels == ["YES", "NO"] or "Only output 'YES' or 'NO'" in system:
+        return "check_unanswerable"
+    if labels == ["SURFACE", "DEEPER", "ENOUGH"] or "Return 'SURFACE'" in system:
+        return "evaluate_response"
+    if "unwilling" in schema_keys or "\"unwilling\"" in system:
+        return "assess_turn"
+    if "takeaways" in schema_keys or "总结状态" in system:
+        return "final_summary"
+    if "transcript digest" in system:
+        return "transcript_digest"
+    if "analysis state" in system:
+        return "analysis"
+    if "transition" in system:
+        return "transition"
+    if "introductory question" in system:
+        return "background_question"
+    if "unable or unwilling" in system:
+        return "unanswerable_followup"
+    return "deeper_question"
+
+
+def _unwilling(answer):
+    return any(marker in answer.lower() for marker in _REFUSAL_MARKERS)
+
+
+def _depth(answer):
+    # 回答越长越 “深入”：短回答会被追问，长回答直接进入下一话题
+    length = len(answer.strip())
+    if length < 20:
+        return "SURFACE"
+    if length < 60:
+        return "DEEPER"
+    return "ENOUGH"
+
+
+def canned_label(task, user_content):
+    """分类任务的确定性标签"""
+    answer = _field(user_content, "用户回答") or _field(user_content, "受访者的回答")
+    if task == "check_unanswerable":
+        return "YES" if _unwilling(answer) else "NO"
+    return _depth(answer)
+
+
+def canned_reply(task, body):
+    """各任务的确定性回复文本"""
+    user_content = body["messages"][-1]["content"]
+    if task in ("check_unanswerable", "evaluate_response"):
+        return canned_label(task, user_content)
+    if task == "assess_turn":
+        answer = _field(user_content, "受访者的回答")
+        unwilling = _unwilling(answer)
+        return json.dumps({
+            "unwilling": unwilling,
+            "depth": "SURFACE" if unwilling else _depth(answer),
+            "confidence": 0.9,
+        })
+    if task == "final_summary":
+        metrics = [line for line in user_content.splitlines() if line.startswith("- ")]
+        return json.dumps({
+            "takeaways": "受访者对主题有基本的认识，并结合自身经历给出了看法",
+            "points": [3 + _digest(metric) % 3 for metric in metrics],
+            "explanations": [f"{metric[2:]}：回答中有相应的内容支撑" for metric in metrics],
+        }, ensure_ascii=False)
+    if task == "transcript_digest":
+        answers = [line[len("interviewee:"):].strip() for line in user_content.splitlines()
+                   if line.startswith("interviewee:")]
+        return f"受访者围绕“{_field(user_content, '话题')}”回答了 {len(answers)} 次，主要观点：" + "；".join(
+            answer[:30] for answer in answers)
+    if task == "analysis":
+        if "Step 4" in user_content:
+            return "\n".join(f"{i}. {metric}" for i, metric in enumerate(_METRICS, 1))
+        return "这一部分的分析：访谈主题涉及多个方面，需要结合受访者的经历逐步展开。"
+    if task == "transition":
+        if _field(user_content, "下一话题") in ("", "（无）"):
+            return _pick(_CLOSINGS, user_content)
+        return _pick(_TRANSITIONS, user_content)
+    if task == "background_question":
+        return _pick(_BACKGROUND_QUESTIONS, user_content)
+    return _pick(_QUESTIONS, user_content)
+
+
+def _truncate(tokens, body):
+    """按 max_tokens 与 stop 截断输出，返回 (tokens, finish_reason)"""
+    max_tokens = body.get("max_tokens")
+    finish_reason = "stop"
+    if max_tokens is not None and len(tokens) > max_tokens:
+        tokens, finish_reason = tokens[:max_tokens], "length"
+    text = "".join(tokens)
+    cut = min((text.find(stop) for stop in body.get("stop") or [] if stop in text), default=-1)
+    if cut != -1:
+        return approx_tokens(text[:cut]), "stop"
+    return tokens, finish_reason
+
+
+def _top_logprobs(task, label, count):
+    """分类任务的首 token 候选：所选标签占 90% 概率，其余标签均分剩下的"""
+    if task == "check_unanswerable":
+        labels = ["YES", "NO"]
+    elif task == "evaluate_response":
+        labels = ["SURFACE", "DEEPER", "ENOUGH"]
+    else:
+        labels = [label]
+    rest = 0.1 / max(1, len(labels) - 1)
+    top = [{"token": label, "logprob": math.log(0.9 if len(labels) > 1 else 1.0)}]
+    top += [{"token": other, "logprob": math.log(rest)} for other in labels if other != label]
+    return top[:count]
+
+
+###########################
+# HTTP 服务
+###########################
+
+class MockStats:
+    """服务端计数：按任务统计请求数，以及注入的各类故障次数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}
+        self.faults = {"error": 0, "hang": 0, "drip": 0}
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+
+    def count(self, task, fault, prompt_tokens, cached_tokens):
+        with self._lock:
+            self.requests[task] = self.requests.get(task, 0) + 1
+            if fault is not None:
+                self.faults[fault] += 1
+            self.prompt_tokens += prompt_tokens
+            self.cached_tokens += cached_tokens
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "requests": dict(self.requests),
+                "faults": dict(self.faults),
+                "prompt_tokens": self.prompt_tokens,
+                "cached_tokens": self.cached_tokens,
+            }
+
+
+class MockVLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.rstrip("/") in ("/health", "/v1/health"):
+            self._send_json(200, {"status": "ok"})
+        elif self.path.rstrip("/") == "/v1/models":
+            self._send_json(200, {"object": "list", "data": [{"id": "mock-vllm", "object": "model"}]})
+        elif self.path.rstrip("/") == "/stats":
+            self._send_json(200, self.server.stats.snapshot())
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/v1/chat/completions":
+            self._send_json(404, {"error": "not found"})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            body = json.loads(self.rfile.read(length))
+        except ValueError:
+            self._send_json(400, {"error": "invalid json"})
+            return
+
+        server = self.server
+        config = server.config
+        with server.lock:
+            roll = server.rng.random()
+            ttft = config.ttft.sample(server.rng)
+            tpot = config.tpot.sample(server.rng)
+
+        task = detect_task(body)
+        prompt = [m for m in body.get("messages", []) if m.get("role") in ("system", "user", "assistant")]
+        cached = server.prefix_cache.observe(task, prompt)
+        # 与前缀缓存模拟用同一种渲染方式计数，cached 不会超过 prompt_tokens
+        prompt_tokens = len(approx_tokens(ChatPrompt(prompt).to_template_text()))
+
+        # 故障按 error / hang / drip 的顺序分段落在 [0, 1) 上，每个请求至多命中一种
+        fault = None
+        if roll < config.error_rate:
+            fault = "error"
+        elif roll < config.error_rate + config.hang_rate:
+            fault = "hang"
+        elif roll < config.error_rate + config.hang_rate + config.drip_rate:
+            fault = "drip"
+            tpot = config.drip_tpot
+        server.stats.count(task, fault, prompt_tokens, cached)
+
+        if fault == "error":
+            self._send_json(config.error_status, {"error": {"message": "injected fault", "code": config.error_status}})
+            return
+        if fault == "hang":
+            time.sleep(config.hang_seconds)
+            self.close_connection = True
+            return
+
+        ttft += max(0, prompt_tokens - cached) * config.prefill_per_token
+        if body.get("logprobs"):
+            # 分类任务的单步打分请求：只返回 1 个 token
+            tokens, finish_reason = approx_tokens(canned_reply(task, body))[:1], "length"
+        else:
+            tokens, finish_reason = _truncate(approx_tokens(canned_reply(task, body)), body)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(tokens),
+            "total_tokens": prompt_tokens + len(tokens),
+        }
+
+        if body.get("stream"):
+            self._stream(body, tokens, finish_reason, ttft, tpot, usage)
+            return
+
+        time.sleep(ttft + tpot * max(0, len(tokens) - 1))
+        choice = {
+            "index": 0,
+            "message": {"role": "assistant", "content": "".join(tokens)},
+            "finish_reason": finish_reason,
+        }
+        if body.get("logprobs"):
+            top = _top_logprobs(task, tokens[0], body.get("top_logprobs") or 1)
+            choice["logprobs"] = {"content": [{"token": tokens[0], "logprob": top[0]["logprob"], "top_logprobs": top}]}
+        self._send_json(200, {
+            "id": f"chatcmpl-mock-{_digest(json.dumps(body, ensure_ascii=False)) % 10 ** 12}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock-vllm"),
+            "choices": [choice],
+            "usage": usage,
+        })
+
+    def _stream(self, body, tokens, finish_reason, ttft, tpot, usage):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(delta, reason=None):
+            chunk = {
+                "object": "chat.completion.chunk",
+                "model": body.get("model", "mock-vllm"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": reason}],
+            }
+            self._write_chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+        try:
+            event({"role": "assistant"})
+            time.sleep(ttft)
+            for i, token in enumerate(tokens):
+                if i:
+                    time.sleep(tpot)
+                event({"content": token})
+            event({}, finish_reason)
+            if (body.get("stream_options") or {}).get("include_usage"):
+                # 与 vLLM 一样，usage 单独放在 [DONE] 前的最后一个分片里（choices 为空）
+                chunk = {"object": "chat.completion.chunk", "model": body.get("model", "mock-vllm"),
+                         "choices": [], "usage": usage}
+                self._write_chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端提前关闭（对冲请求被取消、访谈中途退出等）
+            self.close_connection = True
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+
+class MockVLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config):
+        super().__init__(address, MockVLLMHandler)
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.lock = threading.Lock()
+        self.stats = MockStats()
+        self.prefix_cache = PrefixCacheEstimator()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+
+
+def start_mock_server(config=None, host="127.0.0.1", port=0):
+    """在后台线程启动模拟服务，返回 server（server.url 为接口地址，server.stats 为计数）；用完调用 server.shutdown()"""
+    server = MockVLLMServer((host, port), config or MockConfig())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI 兼容的模拟 vLLM 服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--ttft", type=float, default=0.2, help="首 token 耗时（秒）")
+    parser.add_argument("--tpot", type=float, default=0.02, help="每个输出 token 的耗时（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="相对抖动（uniform 为 ±比例，lognormal 为对数标准差）")
+    parser.add_argument("--distribution", choices=("fixed", "uniform", "lognormal"), default="fixed")
+    parser.add_argument("--prefill-per-token", type=float, default=0.0, help="未命中前缀缓存的每个 prompt token 的耗时（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--hang-rate", type=float, default=0.0)
+    parser.add_argument("--hang-seconds", type=float, default=60.0)
+    parser.add_argument("--drip-rate", type=float, default=0.0)
+    parser.add_argument("--drip-tpot", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    config = MockConfig(
+        ttft=args.ttft, tpot=args.tpot, jitter=args.jitter, distribution=args.distribution,
+        prefill_per_token=args.prefill_per_token,
+        error_rate=args.error_rate, error_status=args.error_status,
+        hang_rate=args.hang_rate, hang_seconds=args.hang_seconds,
+        drip_rate=args.drip_rate, drip_tpot=args.drip_tpot,
+        seed=args.seed,
+    )
+    server = MockVLLMServer((args.host, args.port), config)
+    print(f"模拟 vLLM 服务已启动: INTERVIEW_API_URL={server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
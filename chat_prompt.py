@@ -0,0 +1,48 @@
+import re
+
+ROLES = ("system", "user", "assistant")
+
+# DummyTokenizer 渲染出的格式：<|role|>content<|end|>，一次扫描取出全部轮次
+_TEMPLATE_PATTERN = re.compile(r'<\|(system|user|assistant)\|>(.*?)<\|end\|>', re.DOTALL)
+
+
+class ChatPrompt:
+    """
+    结构化的对话 prompt：直接携带 messages 列表交给接口。
+    取代 “apply_chat_template 渲染成字符串 -> 正则再解析回 messages” 的往返，
+    并且保留全部轮次（可以有多个 user / assistant 消息）。
+    """
+
+    def __init__(self, messages):
+        self.messages = []
+        for msg in messages:
+            if msg["role"] not in ROLES:
+                raise ValueError(f"unknown role: {msg['role']}")
+            self.messages.append({"role": msg["role"], "content": msg["content"]})
+
+    @classmethod
+    def from_template_text(cls, text):
+        """兼容旧的 llm.generate([text], ...) 调用：把模板字符串解析回 messages（按出现顺序）"""
+        return cls([
+            {"role": role, "content": content.strip()}
+            for role, content in _TEMPLATE_PATTERN.findall(text)
+        ])
+
+    def to_template_text(self, add_generation_prompt=True):
+        """渲染成 DummyTokenizer 的模板格式"""
+        template = ""
+        for msg in self.messages:
+            template += f"<|{msg['role']}|>{msg['content']}<|end|>\n"
+        if add_generation_prompt:
+            template += "<|assistant|>"
+        return template
+
+    def __repr__(self):
+        return f"ChatPrompt({self.messages!r})"
+
+
+def to_messages(prompt):
+    """适配层入口：ChatPrompt 直接取 messages，字符串走兼容解析"""
+    if isinstance(prompt, ChatPrompt):
+        return prompt.messages
+    return ChatPrompt.from_template_text(prompt).messages
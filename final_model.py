@@ -1,284 +1,153 @@
 import re
-import json
-import requests
-class CompletionOutput:
-    def __init__(self, text):
-        self.text = text
-
-class CompletionResult:
-    def __init__(self, outputs):
-        self.outputs = outputs  # outputs应该是CompletionOutput实例的列表
-###########################
-# API调用适配层（核心修改）
-###########################
-API_URL = "http://10.77.110.129:8000/v1/chat/completions"
-HEADERS = {"Content-Type": "application/json"}
-MODEL_NAME = "/home/zhangyuheng/.cache/modelscope/hub/Qwen/Qwen2.5-7B-Instruct"
-
-class APIAdapter:
-    @staticmethod
-    def generate(text_list, sampling_params):
-        """替换原有的vLLM generate方法"""
-        responses = []
-        for text in text_list:
-            # 解析原apply_chat_template生成的文本格式
-            # 示例：假设原格式为"[INST] {system} [/INST] {user} [/INST]"
-            # 这里需要根据实际模板格式解析出messages
-            parsed_messages = APIAdapter._parse_template_text(text)
-            
-            data = {
-                "model": MODEL_NAME,
-                "messages": parsed_messages,
-                "temperature": sampling_params.temperature,
-                "top_p": sampling_params.top_p,
-                "repetition_penalty": sampling_params.repetition_penalty,
-                "max_tokens": sampling_params.max_tokens
-            }
-            
-            try:
-                response = requests.post(API_URL, headers=HEADERS, json=data, timeout=30)
-                if response.status_code == 200:
-                    content = response.json()["choices"][0]["message"]["content"]
-                    # 关键修改：将输出包装为列表
-                    responses.append([CompletionOutput(content)])  # <- 注意这里变成二维列表
-                else:
-                    responses.append([CompletionOutput(f"API Error: {response.status_code}")])
-            except Exception as e:
-                responses.append([CompletionOutput(f"Connection Error: {str(e)}")])
-        
-        # 结构调整：每个返回项对应一个CompletionResult
-        return [CompletionResult(outputs) for outputs in responses]
-
-    @staticmethod
-    def _parse_template_text(text):
-        """逆向解析apply_chat_template生成的文本（关键修改点）"""
-        # 这里需要根据原tokenizer实际生成的模板格式进行解析
-        # 示例解析逻辑（需根据实际情况调整）：
-        messages = []
-        
-        # 匹配系统消息
-        system_match = re.search(r'<\|system\|>(.*?)<\|end\|>', text, re.DOTALL)
-        if system_match:
-            messages.append({
-                "role": "system",
-                "content": system_match.group(1).strip()
-            })
-        
-        # 匹配用户消息
-        user_match = re.search(r'<\|user\|>(.*?)<\|end\|>', text, re.DOTALL)
-        if user_match:
-            messages.append({
-                "role": "user",
-                "content": user_match.group(1).strip()
-            })
-        
-        # 匹配assistant消息（如果有）
-        assistant_match = re.search(r'<\|assistant\|>(.*?)<\|end\|>', text, re.DOTALL)
-        if assistant_match:
-            messages.append({
-                "role": "assistant",
-                "content": assistant_match.group(1).strip()
-            })
-        
-        return messages
-class DummyTokenizer:
-    @staticmethod
-    def apply_chat_template(messages, tokenize=False, add_generation_prompt=True):
-        """模拟原tokenizer的模板生成逻辑"""
-        # 这里需要与原模型模板格式保持一致
-        template = ""
-        for msg in messages:
-            role = msg["role"]
-            content = msg["content"]
-            template += f"<|{role}|>{content}<|end|>\n"
-        if add_generation_prompt:
-            template += "<|assistant|>"
-        return template
-
+import sys
+import uuid
+import asyncio
+from llm_adapter import APIAdapter, AsyncAPIAdapter, DummyTokenizer, SamplingParams
+from chat_prompt import ChatPrompt
+import interview_prompts
+from interview_prompts import FALLBACK_OUTPUTS
+from transition_prefetch import start_transition_prefetch
+import analysis_store
+from interview_engine import InterviewEngine, WAIT, SUMMARIZE
+from outline_store import load_outline
+from llm_metrics import start_metrics_server
+import tracing
+
+# 保持原有SamplingParams和LLM初始化（原代码14-18行），适配层见 llm_adapter
 tokenizer = DummyTokenizer()  # 替换原有tokenizer初始化
-
-# 保持原有SamplingParams和LLM初始化（原代码14-18行）
-class SamplingParams:
-    def __init__(self, 
-                 temperature=0.6,
-                 top_p=0.9,
-                 repetition_penalty=1.02,
-                 max_tokens=512):
-        self.temperature = temperature
-        self.top_p = top_p
-        self.repetition_penalty = repetition_penalty
-        self.max_tokens = max_tokens
-
 sampling_params = SamplingParams()
 llm = APIAdapter()
+allm = AsyncAPIAdapter()
 
 ###########################
 # ---- 工具函数（访谈逻辑）----
 ###########################
+# 提示词、兜底输出和分类逻辑都在 interview_prompts（与 Streamlit 端共用），这里绑定本端的 llm / allm；
+# 同步版本与 *_async 异步版本共用同一份提示词和解析逻辑
+
+def _generate_text(messages, task, on_token=None):
+    """同步调用 llm，返回去掉首尾空白的文本；传入 on_token 时改用流式接口（见 interview_prompts.generate_text）"""
+    return interview_prompts.generate_text(llm, sampling_params, messages, task, on_token)
+
+
+async def _generate_text_async(messages, task, on_token=None):
+    """异步调用：与 _generate_text 相同，但走非阻塞的 allm.generate"""
+    return await interview_prompts.generate_text_async(allm, sampling_params, messages, task, on_token)
+
+
+def _classify(messages, task):
+    """分类任务，返回带 confidence 的 Decision（见 interview_prompts.classify）"""
+    return interview_prompts.classify(llm, sampling_params, messages, task)
+
+
+async def _classify_async(messages, task):
+    """_classify 的异步版本"""
+    return await interview_prompts.classify_async(allm, sampling_params, messages, task)
+
+
+def _strip_punctuation(text):
+    return re.sub(r'[^\w\s]', '', text)
+
+
+# generate_transition 失败时返回的文本（去掉标点后的兜底过渡语），预取到它时不保存
+TRANSITION_FALLBACK = _strip_punctuation(FALLBACK_OUTPUTS["transition"])
+
+
+def _strip_punctuation_stream(on_token):
+    """把 on_token 包一层：逐段去掉标点后再回调，保证流式显示与最终返回的文本一致"""
+    if on_token is None:
+        return None
+    return lambda delta: on_token(_strip_punctuation(delta))
+
 
 def check_unanswerable(current_question, user_response):
-    messages = [
-        {
-            "role": "system",
-            "content": (
-                "You are an expert in analyzing user responses. The user might be reluctant or uncomfortable answering. "
-                "We want a YES/NO decision: \n"
-                " - YES: The user is unwilling, reluctant, or implicitly refusing to answer. \n"
-                " - NO: Otherwise.\n"
-                "Only output 'YES' or 'NO'."
-            )
-        },
-        {
-            "role": "user",
-            "content": (
-                f"当前问题: {current_question}\n"
-                f"用户回答: {user_response}\n\n"
-                "请判断：该用户是否不愿回答当前问题？"
-            )
-        }
-    ]
-    text = tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
-    outputs = llm.generate([text], sampling_params)
-    decision = outputs[0].outputs[0].text.strip().upper()
-
-    return "YES" if "YES" in decision else "NO"
-
-
-def generate_overall_background_question(interview_outline):
-    messages = [
-        {
-            "role": "system",
-            "content": (
-                "You are a skilled interviewer. Generate a short introductory question to learn about "
-                "the interviewee's overall background or personal connection with the interview theme."
-            )
-        },
-        {
-            "role": "user",
-            "content": (
-                f"访谈大纲: {interview_outline}\n"
-                "请生成一个简短的问题，引导受访者谈谈与这个大纲相关的个人背景、经历或看法。"
-            )
-        }
-    ]
-    text = tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
-    outputs = llm.generate([text], sampling_params)
-    background_question = outputs[0].outputs[0].text.strip()
-    background_question = re.sub(r'[^\w\s]', '', background_question)
-    return background_question
-
-
-def generate_transition(previous_question, next_question=None):
-    if next_question:
-        user_content = (
-            f"上一话题: {previous_question}\n"
-            f"下一话题: {next_question}\n"
-            "请生成一个自然的过渡语句，使访谈流畅，不要显得死板或机械。"
-        )
-    else:
-        user_content = (
-            f"上一话题: {previous_question}\n"
-            "下一话题: （无）\n"
-            "请生成一个自然的结束语或过渡语，使访谈流畅。"
-        )
-    messages = [
-        {
-            "role": "system",
-            "content": "You are a skilled interviewer. Generate smooth, natural, and engaging transition statements."
-        },
-        {
-            "role": "user",
-            "content": user_content
-        }
-    ]
-    text = tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
-    outputs = llm.generate([text], sampling_params)
-    transition_sentence = outputs[0].outputs[0].text.strip()
-    transition_sentence = re.sub(r'[^\w\s]', '', transition_sentence)
-    return transition_sentence
+    """返回 "YES" / "NO"（Decision，带 confidence）"""
+    messages = interview_prompts.check_unanswerable_messages(current_question, user_response)
+    return _classify(messages, "check_unanswerable")
+
+
+async def check_unanswerable_async(current_question, user_response):
+    messages = interview_prompts.check_unanswerable_messages(current_question, user_response)
+    return await _classify_async(messages, "check_unanswerable")
+
+
+def generate_overall_background_question(interview_outline, on_token=None):
+    messages = interview_prompts.background_question_messages(interview_outline)
+    return _strip_punctuation(_generate_text(messages, "background_question", _strip_punctuation_stream(on_token)))
+
+
+async def generate_overall_background_question_async(interview_outline, on_token=None):
+    messages = interview_prompts.background_question_messages(interview_outline)
+    return _strip_punctuation(await _generate_text_async(messages, "background_question", _strip_punctuation_stream(on_token)))
+
+
+def generate_transition(previous_question, next_question=None, on_token=None):
+    messages = interview_prompts.transition_messages(previous_question, next_question)
+    return _strip_punctuation(_generate_text(messages, "transition", _strip_punctuation_stream(on_token)))
+
+
+async def generate_transition_async(previous_question, next_question=None, on_token=None):
+    messages = interview_prompts.transition_messages(previous_question, next_question)
+    return _strip_punctuation(await _generate_text_async(messages, "transition", _strip_punctuation_stream(on_token)))
 
 
 def evaluate_response(current_question, user_response):
-    messages = [
-        {
-            "role": "system",
-            "content": (
-                "You are an expert in qualitative interviews. "
-                "Your task is to analyze the depth of the interviewee's response "
-                "based on four key criteria:\n"
-                "1. Multiple Perspectives\n"
-                "2. Personal Relevance\n"
-                "3. Impact or Future Outlook\n"
-                "4. Logical & Organized\n\n"
-                "Return 'SURFACE' if the response is lacking in detail.\n"
-                "Return 'DEEPER' if it is somewhat detailed but can be further explored.\n"
-                "Return 'ENOUGH' if it meets at least 3 out of 4 criteria above."
-            )
-        },
-        {
-            "role": "user",
-            "content": (
-                f"当前问题: {current_question}\n"
-                f"受访者的回答: {user_response}\n"
-                "请基于上述标准给出判断：'SURFACE'，'DEEPER' 或 'ENOUGH'。"
-            )
-        }
-    ]
-    text = tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
-    outputs = llm.generate([text], sampling_params)
-    decision = outputs[0].outputs[0].text.strip().upper()
-    return decision
-
-
-def generate_deeper_question(current_question, user_response):
-    messages = [
-        {
-            "role": "system",
-            "content": (
-                "You are a skilled qualitative researcher. Generate one open-ended question "
-                "to explore deeper. Ask about motivations, emotions, long-term impact, or alternative perspectives. "
-                "Do NOT generate yes/no questions."
-            )
-        },
-        {
-            "role": "user",
-            "content": (
-                f"当前问题: {current_question}\n"
-                f"受访者的回答: {user_response}\n"
-                "请生成一个更深入的问题，引导受访者适度反思和阐述。"
-            )
-        }
-    ]
-    text = tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
-    outputs = llm.generate([text], sampling_params)
-    deeper_question = outputs[0].outputs[0].text.strip()
-    deeper_question = re.sub(r'[^\w\s]', '', deeper_question)
-    return deeper_question
-
-
-def handle_unanswerable_response(current_question):
-    messages = [
-        {
-            "role": "system",
-            "content": (
-                "You are a professional interviewer. "
-                "The interviewee is unable or unwilling to answer the current question. "
-                "Generate a new, related question that explores the same topic from a different angle."
-            )
-        },
-        {
-            "role": "user",
-            "content": (
-                f"当前问题: {current_question}\n"
-                "受访者无法回答，请生成一个不同但仍然相关且可能更容易回答的问题。"
-            )
-        }
-    ]
-    text = tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
-    outputs = llm.generate([text], sampling_params)
-    new_question = outputs[0].outputs[0].text.strip()
-    new_question = re.sub(r'[^\w\s]', '', new_question)
-    return new_question
+    """返回 "SURFACE" / "DEEPER" / "ENOUGH"（Decision，带 confidence）"""
+    messages = interview_prompts.evaluate_response_messages(current_question, user_response)
+    return _classify(messages, "evaluate_response")
+
+
+async def evaluate_response_async(current_question, user_response):
+    messages = interview_prompts.evaluate_response_messages(current_question, user_response)
+    return await _classify_async(messages, "evaluate_response")
+
+
+def assess_turn(current_question, user_response):
+    """
+    一次调用同时判断受访者是否不愿回答、回答深度如何，
+    返回 {"unwilling": bool, "depth": "SURFACE"/"DEEPER"/"ENOUGH", "confidence": 0~1}。
+    模型输出的 JSON 解析不了时退回 check_unanswerable + evaluate_response 两次调用。
+    """
+    messages = interview_prompts.assess_turn_messages(current_question, user_response)
+    assessment = interview_prompts.parse_turn_assessment(_generate_text(messages, "assess_turn"))
+    if assessment is not None:
+        return assessment
+    unwilling = check_unanswerable(current_question, user_response)
+    if unwilling == "YES":
+        return interview_prompts.turn_assessment(unwilling, None)
+    return interview_prompts.turn_assessment(unwilling, evaluate_response(current_question, user_response))
+
+
+async def assess_turn_async(current_question, user_response):
+    """assess_turn 的异步版本"""
+    messages = interview_prompts.assess_turn_messages(current_question, user_response)
+    assessment = interview_prompts.parse_turn_assessment(await _generate_text_async(messages, "assess_turn"))
+    if assessment is not None:
+        return assessment
+    unwilling = await check_unanswerable_async(current_question, user_response)
+    if unwilling == "YES":
+        return interview_prompts.turn_assessment(unwilling, None)
+    return interview_prompts.turn_assessment(unwilling, await evaluate_response_async(current_question, user_response))
+
+
+def generate_deeper_question(current_question, user_response, on_token=None):
+    messages = interview_prompts.deeper_question_messages(current_question, user_response)
+    return _strip_punctuation(_generate_text(messages, "deeper_question", _strip_punctuation_stream(on_token)))
+
+
+async def generate_deeper_question_async(current_question, user_response, on_token=None):
+    messages = interview_prompts.deeper_question_messages(current_question, user_response)
+    return _strip_punctuation(await _generate_text_async(messages, "deeper_question", _strip_punctuation_stream(on_token)))
+
+
+def handle_unanswerable_response(current_question, on_token=None):
+    messages = interview_prompts.unanswerable_followup_messages(current_question)
+    return _strip_punctuation(_generate_text(messages, "unanswerable_followup", _strip_punctuation_stream(on_token)))
+
+
+async def handle_unanswerable_response_async(current_question, on_token=None):
+    messages = interview_prompts.unanswerable_followup_messages(current_question)
+    return _strip_punctuation(await _generate_text_async(messages, "unanswerable_followup", _strip_punctuation_stream(on_token)))
 
 
 ###########################
@@ -286,7 +155,7 @@ def handle_unanswerable_response(current_question):
 ###########################
 def analyze_interview_outline(interview_outline, key_questions):
     """
-    如果你想让模型对大纲进行多步分析，可以扩展此函数：
+    对大纲做多步分析（各步提示词见 interview_prompts.analysis_steps）：
       Step 1) 理解每一个关键主题
       Step 2) 预测访谈走向
       Step 3) 提出问题框架
@@ -295,347 +164,214 @@ def analyze_interview_outline(interview_outline, key_questions):
     - 分析的结果不需要输出（不打印），只在内存中留存
     - 返回“评分指标”供后续总结阶段使用
     """
-    # 在此使用一个字典来存储可能的分析结果
-    analysis_data = {
-        "topics_interpretation": None,
-        "possible_directions": None,
-        "question_framework": None,
-        "rating_metrics": None
-    }
-
-    # --- Step 1: 理解每一个关键主题 ---
-    messages_step1 = [
-        {
-            "role": "system",
-            "content": (
-                "You are in the 'analysis state' (step 1). "
-                "Please interpret each key topic from the interview outline in detail. "
-                "Do NOT produce final output for the user; only analyze."
-            )
-        },
-        {
-            "role": "user",
-            "content": (
-                f"访谈大纲: {interview_outline}\n"
-                f"关键问题: {key_questions}\n"
-                "请对以上主题进行理解和解读，谈谈它们代表的含义。"
-            )
-        }
-    ]
-    text_step1 = tokenizer.apply_chat_template(messages_step1, tokenize=False, add_generation_prompt=True)
-    outputs_step1 = llm.generate([text_step1], sampling_params)
-    step1_result = outputs_step1[0].outputs[0].text.strip()
-
-    # 存到 analysis_data 但不打印
-    analysis_data["topics_interpretation"] = step1_result
-
-    # --- Step 2: 预测访谈走向 ---
-    messages_step2 = [
-        {
-            "role": "system",
-            "content": (
-                "You are in the 'analysis state' (step 2). "
-                "Predict the possible directions or scenarios that may emerge during the interview. "
-                "Focus on potential follow-up angles or sensitive points."
-            )
-        },
-        {
-            "role": "user",
-            "content": (
-                f"访谈大纲: {interview_outline}\n"
-                f"关键问题: {key_questions}\n"
-                "请预测该访谈可能的走向与潜在话题分支。"
-            )
-        }
-    ]
-    text_step2 = tokenizer.apply_chat_template(messages_step2, tokenize=False, add_generation_prompt=True)
-    outputs_step2 = llm.generate([text_step2], sampling_params)
-    step2_result = outputs_step2[0].outputs[0].text.strip()
-    analysis_data["possible_directions"] = step2_result
-
-    # --- Step 3: 提出问题框架 ---
-    messages_step3 = [
-        {
-            "role": "system",
-            "content": (
-                "You are in the 'analysis state' (step 3). "
-                "Propose a question framework or structure for the interview. "
-                "Be specific, but do not reveal it to the user directly, we only need it for internal reference."
-            )
-        },
-        {
-            "role": "user",
-            "content": (
-                f"访谈大纲: {interview_outline}\n"
-                f"关键问题: {key_questions}\n"
-                "请提出一个可行的提问框架，仅供内部参考。"
-            )
-        }
-    ]
-    text_step3 = tokenizer.apply_chat_template(messages_step3, tokenize=False, add_generation_prompt=True)
-    outputs_step3 = llm.generate([text_step3], sampling_params)
-    step3_result = outputs_step3[0].outputs[0].text.strip()
-    analysis_data["question_framework"] = step3_result
-
-    # --- Step 4: 提出评分指标（重点）---
-    messages_step4 = [
-        {
-            "role": "system",
-            "content": (
-                "You are in the 'analysis state' (step 4). "
-                "Based on the interview outline, propose a list of rating metrics. "
-                "These metrics will be used later to evaluate how well the interviewee meets certain criteria. "
-                "Only output them in plain text, one metric per line or a simple list."
-            )
-        },
-        {
-            "role": "user",
-            "content": (
-                f"访谈大纲: {interview_outline}\n"
-                f"关键问题: {key_questions}\n"
-                "请提出与访谈主题相关的评分指标（数量与主题相近，或稍多）。"
-            )
-        }
-    ]
-    text_step4 = tokenizer.apply_chat_template(messages_step4, tokenize=False, add_generation_prompt=True)
-    outputs_step4 = llm.generate([text_step4], sampling_params)
-    step4_result = outputs_step4[0].outputs[0].text.strip()
-    analysis_data["rating_metrics"] = step4_result
-
-    # 注意：step4_result 可能是文字段落，需要我们做简单的分行或解析：
-    # 比如如果模型输出:
-    # "1. 对主题A的理解\n2. 对主题B的经验\n3. 态度..."
-    # 可以把它拆分成列表
-    rating_metrics_list = []
-    for line in step4_result.splitlines():
-        line = line.strip()
-        # 简单判断一下是否是空行或编号
-        if line and not line.lower().startswith("step") and not line.startswith("---"):
-            rating_metrics_list.append(line)
-
-    # 返回 rating_metrics_list 即可
-    return rating_metrics_list
+    # 四步只依赖大纲和关键问题，彼此独立：作为一个批次并发请求，总耗时取决于最慢的一步。
+    # 每步的超时见 task_profiles.ANALYSIS_STEP_TIMEOUT，超时或失败的那步结果为空字符串
+    steps = interview_prompts.analysis_steps(interview_outline, key_questions)
+    results = llm.generate([ChatPrompt(messages) for _, messages in steps], sampling_params, task="analysis")
+    return interview_prompts.rating_metrics_from(steps, results)
+
+
+async def analyze_interview_outline_async(interview_outline, key_questions, limit=None):
+    """
+    analyze_interview_outline 的异步版本（四步同样并发）。
+    limit 为包装单个请求协程的函数（如 batch_evaluate 限制在途调用数的 BatchEvaluator._call）：
+    传入时四步分别经它发出，每个请求各占一个名额，而不是整批只占一个
+    """
+    steps = interview_prompts.analysis_steps(interview_outline, key_questions)
+    prompts = [ChatPrompt(messages) for _, messages in steps]
+    if limit is None:
+        results = await allm.generate(prompts, sampling_params, task="analysis")
+    else:
+        batches = await asyncio.gather(*(
+            limit(allm.generate([prompt], sampling_params, task="analysis")) for prompt in prompts
+        ))
+        results = [batch[0] for batch in batches]
+    return interview_prompts.rating_metrics_from(steps, results)
+
+
+def load_outline_analysis(interview_outline, key_questions):
+    """先查持久化的分析结果（跨会话、跨进程共用），没有才调用 analyze_interview_outline"""
+    return analysis_store.load_or_analyze(
+        analyze_interview_outline, interview_outline, key_questions,
+        namespace=__name__, prompt_version=interview_prompts.ANALYSIS_PROMPT_VERSION
+    )
+
+
+async def load_outline_analysis_async(interview_outline, key_questions, limit=None):
+    """load_outline_analysis 的异步版本：与同步版本共用同一份存储；limit 见 analyze_interview_outline_async"""
+    analyze = lambda outline, questions: analyze_interview_outline_async(outline, questions, limit)
+    return await analysis_store.load_or_analyze_async(
+        analyze, interview_outline, key_questions,
+        namespace=__name__, prompt_version=interview_prompts.ANALYSIS_PROMPT_VERSION
+    )
+
+
+###########################
+# ---- 访谈记录摘要 ----
+###########################
+def generate_transcript_digest(interview_outline, topic, turns):
+    """把一个话题的对话（dialog_history 的片段）压缩成摘要；失败时返回空串"""
+    messages = interview_prompts.transcript_digest_messages(interview_outline, topic, turns)
+    return _generate_text(messages, "transcript_digest")
+
+
+async def generate_transcript_digest_async(interview_outline, topic, turns):
+    messages = interview_prompts.transcript_digest_messages(interview_outline, topic, turns)
+    return await _generate_text_async(messages, "transcript_digest")
+
+
+def new_transcript_digester(interview_outline, key_questions, state=None):
+    """
+    一场访谈的滚动摘要（见 transcript_digest.TranscriptDigester），话题结束时调用 close_topic()；
+    state 为之前 to_dict() 保存的状态（恢复会话时）
+    """
+    return interview_prompts.new_transcript_digester(generate_transcript_digest, interview_outline, key_questions, state)
 
 
 ###########################
 # ---- 最终总结阶段 ----
 ###########################
-def generate_final_summary(dialog_history, interview_outline, rating_metrics):
+def generate_final_summary(dialog_history, interview_outline, rating_metrics, digester=None):
     """
     让模型基于访谈完整对话 & 评分指标，生成最终的 JSON 总结：
       "takeaways": 访谈主要结论或洞察
       "points":    列表（与 rating_metrics 顺序对应的分值）
       "explanations": 对每个分值的解释
+    传入 digester（new_transcript_digester）时，已压缩好的话题用摘要代替原文，prompt 长度不随访谈轮数线性增长。
     """
-    # 将对话转成文本
-    conversation_text = ""
-    for turn in dialog_history:
-        role = turn["role"]
-        content = turn["content"]
-        conversation_text += f"{role}: {content}\n"
-
-    # 将评分指标也传给大模型
-    rating_metrics_str = "\n".join(f"- {m}" for m in rating_metrics)
-
-    messages = [
-        {
-            "role": "system",
-            "content": (
-                "You are now in the '总结状态'. You have the entire interview transcript. "
-                "You also have a set of rating metrics. "
-                "You will produce a final summary in JSON format with the structure:\n\n"
-                "{\n"
-                "  \"takeaways\": \"...\",      // main conclusions\n"
-                "  \"points\": [...],           // numeric scores for each metric\n"
-                "  \"explanations\": [...]      // explanation for each score\n"
-                "}\n\n"
-                "Only output valid JSON with these three keys."
-            )
-        },
-        {
-            "role": "user",
-            "content": (
-                f"访谈大纲: {interview_outline}\n"
-                f"访谈完整记录:\n{conversation_text}\n\n"
-                f"评分指标列表:\n{rating_metrics_str}\n\n"
-                "请根据以上信息，对受访者进行打分。"
-                "将上述总结转换为json字典，第一个键是takeaways，"
-                "值是一个字符串，包含你从访谈中得到的结论；"
-                "第二个键是points，值是一个列表，每个元素是对应的评分指标的分值；"
-                "第三个键是explanations，值是一个列表，对应每个评分指标的解释。"
-                "以文本形式输出这个json字典即可。"
-            )
-        }
-    ]
-    text = tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
-    outputs = llm.generate([text], sampling_params)
-    final_summary_json = outputs[0].outputs[0].text.strip()
+    messages = interview_prompts.final_summary_messages(dialog_history, interview_outline, rating_metrics, digester)
+    return _generate_text(messages, "final_summary")
 
-    return final_summary_json
+
+async def generate_final_summary_async(dialog_history, interview_outline, rating_metrics, digester=None):
+    """generate_final_summary 的异步版本"""
+    messages = interview_prompts.final_summary_messages(dialog_history, interview_outline, rating_metrics, digester)
+    return await _generate_text_async(messages, "final_summary")
 
 
 ###########################
 # ---- 初始化与主逻辑 ----
 ###########################
-def initialize_interview():
-    # 读取 interview_outline.json 文件
-    with open("interview_outline.json", "r", encoding="utf-8") as f:
-        data = json.load(f)
-    
-    # 从文件中获取访谈大纲和关键问题
-    interview_outline = data["interview_outline"]
-    key_questions = data["key_questions"]
+def initialize_interview(outline_path=None, outline_id=None):
+    # 与 Streamlit 端相同的选择规则（见 outline_store.load_outline）：指定 id 读存储，指定文件读文件，
+    # 都没有指定时取最近提交的大纲，还没有提交过时读 interview_outline.json
+    return load_outline(outline_id, outline_path)
 
-    return interview_outline, key_questions
 
+def _token_printer(print_fn):
+    """流式输出回调：模型每生成一段文本就立即打印，不必等整段生成完"""
+    return lambda delta: print_fn(delta, end="", flush=True)
 
-def conduct_interview():
-    # 1) 初始化 & 多步分析
-    interview_outline, key_questions = initialize_interview()
 
-    # 在分析阶段获取评分指标，但不输出给用户
-    rating_metrics = analyze_interview_outline(interview_outline, key_questions)
+def _run_engine_task(action, transitions, print_fn=print):
+    """
+    执行状态机要求的模型调用并返回结果；访谈员说的话（问题、追问、过渡语）流式打印。
+    函数按名字在调用时查找，基准测试替换掉的计时版本也能生效。
+    """
+    on_token = None
+    if action.spoken:
+        print_fn("\n访谈员（过渡）：" if action.task == "transition" else "\n访谈员: ", end="", flush=True)
+        on_token = _token_printer(print_fn)
+
+    if action.task == "transition":
+        # 过渡语优先取预取好的，没有时现场生成
+        result = transitions.get(*action.args, on_token=on_token)
+    elif action.task == "background_question":
+        result = generate_overall_background_question(*action.args, on_token=on_token)
+    elif action.task == "deeper_question":
+        result = generate_deeper_question(*action.args, on_token=on_token)
+    elif action.task == "unanswerable_followup":
+        result = handle_unanswerable_response(*action.args, on_token=on_token)
+    elif action.task == "evaluate_response":
+        result = evaluate_response(*action.args)
+    elif action.task == "assess_turn":
+        # 一次调用同时判断是否不愿回答和回答深度
+        result = assess_turn(*action.args)
+    else:
+        raise ValueError(f"unknown interview task: {action.task}")
 
-    # 2) 进入提问状态
-    print(f"\n受访者您好，今天我们访谈的主题是：{interview_outline}")
+    if action.spoken:
+        print_fn()
+    return result
 
-    dialog_history = []
 
-    # 整体背景了解
-    overall_bg_question = generate_overall_background_question(interview_outline)
-    print(f"\n访谈员: {overall_bg_question}")
-    dialog_history.append({"role": "interviewer", "content": overall_bg_question})
+def conduct_interview(input_fn=input, print_fn=print,
+                      outline_path=None,
+                      summary_path="interview_summary.json",
+                      outline_id=None):
+    """
+    命令行访谈。input_fn / print_fn 默认为 input / print，
+    可以换成脚本化的实现来重复跑完整访谈（见 benchmarks/bench_interview.py）；
+    传 outline_id 时从大纲存储按 id 读取大纲，传 outline_path 时读取该文件，都不传时取最近提交的大纲（见 initialize_interview）。
+    返回最终总结的 JSON 文本（受访者中途回答 “结束” 时也会用已有的对话生成总结）。
+    流程由 interview_engine.InterviewEngine 决定，这里只负责输入输出和调用模型。
+    开启追踪（INTERVIEW_TRACE_FILE）时整场访谈为一个 interview.session span，受访者的每次回答之后为一个 interview.turn span。
+    """
+    session_id = uuid.uuid4().hex
+    turns = tracing.TurnSpans(session_id)
+    with tracing.span("interview.session", session_id=session_id, outline_path=outline_path, outline_id=outline_id):
+        try:
+            return _conduct_interview(input_fn, print_fn, outline_path, summary_path, turns, outline_id)
+        finally:
+            turns.end()
 
-    overall_bg_answer = input("受访者: ")
-    dialog_history.append({"role": "interviewee", "content": overall_bg_answer})
 
-    # 背景追问
-    MAX_BG_QUESTIONS = 3
-    bg_count = 1
-    depth = evaluate_response(overall_bg_question, overall_bg_answer)
+def _conduct_interview(input_fn, print_fn, outline_path, summary_path, turns, outline_id=None):
+    # 1) 初始化 & 多步分析
+    interview_outline, key_questions = initialize_interview(outline_path, outline_id)
 
-    while depth != "ENOUGH" and bg_count < MAX_BG_QUESTIONS:
-        bg_count += 1
-        deeper_q = generate_deeper_question(overall_bg_question, overall_bg_answer)
-        print(f"\n访谈员: {deeper_q}")
-        dialog_history.append({"role": "interviewer", "content": deeper_q})
+    # 话题之间的过渡语只取决于相邻话题，读完大纲就在后台并发生成，与下面的分析同时进行
+    transitions = start_transition_prefetch(
+        generate_transition, interview_outline, key_questions, fallback=TRANSITION_FALLBACK
+    )
 
-        overall_bg_answer = input("受访者: ")
-        dialog_history.append({"role": "interviewee", "content": overall_bg_answer})
+    # 在分析阶段获取评分指标，但不输出给用户
+    rating_metrics = load_outline_analysis(interview_outline, key_questions)
 
-        depth = evaluate_response(deeper_q, overall_bg_answer)
+    # 每个话题结束时在后台压缩该话题的对话，最终总结用摘要 + 最后一个话题的原文
+    digester = new_transcript_digester(interview_outline, key_questions)
 
-    # 过渡
-    if key_questions:
-        first_topic = key_questions[0]
-        transition = generate_transition(overall_bg_question, first_topic)
-    else:
-        transition = generate_transition(overall_bg_question, None)
-
-    print(f"\n访谈员（过渡）：{transition}")
-    dialog_history.append({"role": "interviewer", "content": transition})
-
-    # 3) 正式访谈
-    current_question_idx = 0
-    MAX_QUESTIONS_PER_TOPIC = 8
-
-    while current_question_idx < len(key_questions):
-        current_question = key_questions[current_question_idx]
-        subquestion_count = 1
-
-        print(f"\n访谈员: {current_question}")
-        dialog_history.append({"role": "interviewer", "content": current_question})
-
-        user_response = input("受访者: ")
-        dialog_history.append({"role": "interviewee", "content": user_response})
-
-        if user_response.lower() in ["exit", "quit", "结束"]:
-            print("\n访谈结束，谢谢参与！")
-            break
-
-        while True:
-            # 不愿回答
-            if check_unanswerable(current_question, user_response) == "YES":
-                subquestion_count += 1
-                if subquestion_count > MAX_QUESTIONS_PER_TOPIC:
-                    if current_question_idx + 1 < len(key_questions):
-                        next_q = key_questions[current_question_idx + 1]
-                        transition_sentence = generate_transition(current_question, next_q)
-                    else:
-                        transition_sentence = generate_transition(current_question, None)
-
-                    print(f"\n访谈员（过渡）：{transition_sentence}")
-                    dialog_history.append({"role": "interviewer", "content": transition_sentence})
-
-                    current_question_idx += 1
-                    break
-
-                new_question = handle_unanswerable_response(current_question)
-                print(f"\n访谈员: {new_question}")
-                dialog_history.append({"role": "interviewer", "content": new_question})
-
-                user_response = input("受访者: ")
-                dialog_history.append({"role": "interviewee", "content": user_response})
-
-                if user_response.lower() in ["exit", "quit", "结束"]:
-                    print("\n访谈结束，谢谢参与！")
-                    return
-                continue
-
-            # 评估回答深度
-            response_depth = evaluate_response(current_question, user_response)
-
-            if response_depth == "ENOUGH" or user_response.lower() == "继续":
-                if current_question_idx + 1 < len(key_questions):
-                    next_q = key_questions[current_question_idx + 1]
-                    transition_sentence = generate_transition(current_question, next_q)
-                else:
-                    transition_sentence = generate_transition(current_question, None)
-
-                print(f"\n访谈员（过渡）：{transition_sentence}")
-                dialog_history.append({"role": "interviewer", "content": transition_sentence})
-
-                current_question_idx += 1
-                break
-            else:
-                subquestion_count += 1
-                if subquestion_count > MAX_QUESTIONS_PER_TOPIC:
-                    if current_question_idx + 1 < len(key_questions):
-                        next_q = key_questions[current_question_idx + 1]
-                        transition_sentence = generate_transition(current_question, next_q)
-                    else:
-                        transition_sentence = generate_transition(current_question, None)
-                    print(f"\n访谈员（过渡）：{transition_sentence}")
-                    dialog_history.append({"role": "interviewer", "content": transition_sentence})
-
-                    current_question_idx += 1
-                    break
-
-                deeper_question = generate_deeper_question(current_question, user_response)
-                print(f"\n访谈员: {deeper_question}")
-                dialog_history.append({"role": "interviewer", "content": deeper_question})
-
-                user_response = input("受访者: ")
-                dialog_history.append({"role": "interviewee", "content": user_response})
-
-                if user_response.lower() in ["exit", "quit", "结束"]:
-                    print("\n访谈结束，谢谢参与！")
-                    return
+    # 2) 进入提问状态
+    print_fn(f"\n受访者您好，今天我们访谈的主题是：{interview_outline}")
+
+    # 3) 背景问题 + 正式访谈：状态机给出下一步，这里执行（调用模型 / 等待回答），直到该生成总结
+    engine = InterviewEngine(interview_outline, key_questions)
+    dialog_history = engine.dialog_history
+    action = engine.start()
+
+    while action.kind != SUMMARIZE:
+        if action.kind == WAIT:
+            if action.text:
+                print_fn(f"\n访谈员: {action.text}")
+            action = engine.answer(turns.answer(input_fn, "受访者: ", engine.question_index))
+            continue
+
+        result = _run_engine_task(action, transitions, print_fn)
+        finished_task = action
+        action = engine.resolve(result)
+
+        if finished_task.task == "background_question":
+            # 背景问题到第一个话题的过渡语在受访者作答期间预取
+            transitions.prefetch(result, key_questions[0] if key_questions else None)
+        elif finished_task.task == "transition":
+            digester.close_topic(finished_task.topic, dialog_history)
 
     # 4) 结束 & 总结
-    print("\n访谈结束，谢谢参与！\n")
-    final_summary_json = generate_final_summary(dialog_history, interview_outline, rating_metrics)
+    print_fn("\n访谈结束，谢谢参与！\n")
+    final_summary_json = generate_final_summary(dialog_history, interview_outline, rating_metrics, digester)
 
     # 写入文件
-    output_filename = "interview_summary.json"
-    with open(output_filename, "w", encoding="utf-8") as f:
+    with tracing.span("file.write", path=summary_path), open(summary_path, "w", encoding="utf-8") as f:
         f.write(final_summary_json)
 
-    print(f"已生成总结并保存到文件: {output_filename}\n")
-    print("以下为模型输出的 JSON 总结:\n")
-    print(final_summary_json)
+    print_fn(f"已生成总结并保存到文件: {summary_path}\n")
+    print_fn("以下为模型输出的 JSON 总结:\n")
+    print_fn(final_summary_json)
+    return final_summary_json
 
 
 # 启动访谈
 if __name__ == "__main__":
-    conduct_interview()
\ No newline at end of file
+    start_metrics_server()
+    # python final_model.py [大纲 id]：不传 id 时取最近提交的大纲，还没有提交过时读取 interview_outline.json
+    conduct_interview(outline_id=sys.argv[1] if len(sys.argv) > 1 else None)
\ No newline at end of file
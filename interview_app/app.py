@@ -3,8 +3,19 @@ import json
 import re
 from interview_logic import *
 from utils import *
+# 以下模块在仓库根目录，interview_logic 导入时已把根目录加入 sys.path
+from interview_engine import InterviewEngine, CALL_MODEL, SUMMARIZE
+from transition_prefetch import start_transition_prefetch
+from session_store import SessionConflict, load_session, save_session
+from outline_store import OutlineNotFound, get_outline_store, load_outline
+from llm_metrics import start_metrics_server
+import tracing
 import time
 import uuid  # 添加uuid库用于生成唯一key
+from contextlib import contextmanager
+
+# 配置了 INTERVIEW_METRICS_PORT 时在后台提供 /metrics（Streamlit 每次重跑脚本都会执行到这里，只会启动一次）
+start_metrics_server()
 
 # 添加缓存装饰器
 @st.cache_resource
@@ -40,12 +51,178 @@ def clean_json_string(json_str):
     
     return json_str
 
+@contextmanager
+def interviewer_stream(placeholder, spinner_text):
+    """
+    生成访谈员发言时使用：
+    有占位元素时返回 on_token 回调，把模型输出逐段渲染出来（首字延迟即可见）；
+    没有占位元素时退回到原来的 spinner。
+    """
+    if placeholder is None:
+        with st.spinner(spinner_text):
+            yield None
+        return
+
+    pieces = []
+
+    def on_token(delta):
+        pieces.append(delta)
+        placeholder.markdown(
+            f"<div class='interviewer'><b>访谈员:</b> {''.join(pieces)}▌</div>",
+            unsafe_allow_html=True
+        )
+
+    yield on_token
+    # 生成结束后由 dialog_history 正常渲染，这里清掉临时内容
+    placeholder.empty()
+
+def _close_topic(topic):
+    """话题结束：在后台压缩这个话题的对话（旧会话没有 transcript_digester 时跳过）"""
+    if "transcript_digester" in st.session_state:
+        st.session_state.transcript_digester.close_topic(topic, st.session_state.dialog_history)
+
+def _get_transition(previous_question, next_question, on_token=None):
+    """优先取预取好的过渡语，没有预取表（旧会话）或还没生成好时现场生成"""
+    if "transitions" in st.session_state:
+        return st.session_state.transitions.get(previous_question, next_question, on_token=on_token)
+    return generate_transition(previous_question, next_question, on_token=on_token)
+
+# 状态机的每种模型调用在界面上的提示
+TASK_SPINNER_TEXT = {
+    "background_question": "生成背景问题...",
+    "evaluate_response": "分析回答中...",
+    "assess_turn": "分析回答中...",
+    "deeper_question": "生成深入问题...",
+    "unanswerable_followup": "换个角度提问...",
+    "transition": "生成过渡中...",
+}
+
+def _engine():
+    """当前会话的访谈状态机（还没开始访谈时为 None）"""
+    return st.session_state.get("engine")
+
+def _run_engine_task(action, on_token=None):
+    """执行状态机要求的一次模型调用并返回结果"""
+    if action.task == "transition":
+        return _get_transition(*action.args, on_token=on_token)
+    if action.task == "background_question":
+        return generate_overall_background_question(*action.args, on_token=on_token)
+    if action.task == "deeper_question":
+        return generate_deeper_question(*action.args, on_token=on_token)
+    if action.task == "unanswerable_followup":
+        return handle_unanswerable_response(*action.args, on_token=on_token)
+    if action.task == "evaluate_response":
+        return evaluate_response(*action.args)
+    if action.task == "assess_turn":
+        # 一次调用同时判断是否不愿回答和回答深度
+        return assess_turn(*action.args)
+    raise ValueError(f"unknown interview task: {action.task}")
+
+def _generate_summary():
+    """用当前的对话记录生成最终总结"""
+    with st.spinner("生成总结中..."):
+        final_summary_json = generate_final_summary(
+            st.session_state.dialog_history, 
+            st.session_state.get("interview_outline", ""), 
+            st.session_state.get("rating_metrics", []),
+            st.session_state.get("transcript_digester")
+        )
+        # 清理JSON字符串
+        st.session_state.final_summary = clean_json_string(final_summary_json)
+
+def advance_interview(action, stream_placeholder=None):
+    """
+    按状态机给出的动作往下执行，直到需要受访者回答或访谈结束：
+    访谈员说的话流式显示在 stream_placeholder，其余调用显示 spinner；结束时生成总结。
+    """
+    engine = st.session_state.engine
+    while action.kind == CALL_MODEL:
+        spinner_text = TASK_SPINNER_TEXT.get(action.task, "处理中...")
+        if action.spoken:
+            with interviewer_stream(stream_placeholder, spinner_text) as on_token:
+                result = _run_engine_task(action, on_token=on_token)
+        else:
+            with st.spinner(spinner_text):
+                result = _run_engine_task(action)
+        finished_task = action
+        action = engine.resolve(result)
+
+        if finished_task.task == "background_question" and "transitions" in st.session_state:
+            # 背景问题到第一个话题的过渡语在受访者作答期间预取
+            st.session_state.transitions.prefetch(result, engine.key_questions[0] if engine.key_questions else None)
+        elif finished_task.task == "transition":
+            _close_topic(finished_task.topic)
+
+    if action.kind == SUMMARIZE:
+        _generate_summary()
+        st.session_state.dialog_history.append({"role": "interviewer", "content": "访谈结束，感谢您的参与！"})
+
+# 除状态机和滚动摘要（单独序列化）之外，写入会话存储的访谈进度
+PERSISTED_KEYS = ("interview_outline", "current_outline", "rating_metrics", "final_summary", "interview_active")
+
+def save_session_state():
+    """
+    把访谈进度写入会话存储（受访者回答后、每轮处理完后调用），重连或换到其他 worker 时按 session_id 恢复。
+    会话已被其他页面 / worker 推进时不覆盖，改为载入存储中的最新进度。
+    """
+    session_id = st.session_state.get("session_id")
+    engine = _engine()
+    if session_id is None or engine is None:
+        return
+    state = {key: st.session_state[key] for key in PERSISTED_KEYS if key in st.session_state}
+    state["engine"] = engine.to_dict()
+    if st.session_state.get("transcript_digester") is not None:
+        state["transcript_digester"] = st.session_state.transcript_digester.to_dict()
+    try:
+        st.session_state.session_version = save_session(
+            session_id, state, st.session_state.get("session_version", 0)
+        )
+    except SessionConflict:
+        st.warning("这场访谈已在其他页面继续进行，已载入最新进度")
+        restore_session_state(session_id)
+    except Exception as e:
+        # 存储不可用时访谈照常进行，只是不能跨进程恢复
+        st.warning(f"访谈进度保存失败（{type(e).__name__}: {e}），刷新页面后可能无法恢复本次访谈")
+
+def restore_session_state(session_id):
+    """按 session_id 从会话存储恢复访谈进度；没有这个会话时返回 False"""
+    state, version = load_session(session_id)
+    if state is None:
+        return False
+    engine = InterviewEngine.from_dict(state["engine"])
+    for key in PERSISTED_KEYS:
+        if key in state:
+            st.session_state[key] = state[key]
+        elif key in st.session_state:
+            del st.session_state[key]
+    st.session_state.session_id = session_id
+    st.session_state.session_version = version
+    st.session_state.engine = engine
+    st.session_state.dialog_history = engine.dialog_history
+    st.session_state.key_questions = engine.key_questions
+    st.session_state.transcript_digester = new_transcript_digester(
+        engine.interview_outline, engine.key_questions, state.get("transcript_digester")
+    )
+    st.session_state.transitions = start_transition_prefetch(
+        generate_transition, engine.interview_outline, engine.key_questions, fallback=TRANSITION_FALLBACK
+    )
+    return True
+
 def start_interview():
     # 确保模型已加载（只会执行一次）
     get_model()
     
-    # 获取当前大纲和问题
-    interview_outline, key_questions = initialize_interview()
+    # 获取当前大纲和问题（侧边栏选中的大纲）
+    try:
+        interview_outline, key_questions = initialize_interview(st.session_state.get("outline_id"))
+    except OutlineNotFound:
+        st.error(f"未找到编号为 {st.session_state.get('outline_id')} 的访谈大纲")
+        return False
+
+    # 读完大纲就在后台并发生成所有话题之间的过渡语（同一大纲的会话共用），切换话题时直接取用
+    st.session_state.transitions = start_transition_prefetch(
+        generate_transition, interview_outline, key_questions, fallback=TRANSITION_FALLBACK
+    )
     
     # 检查大纲是否改变或未分析
     outline_changed = (
@@ -53,10 +230,10 @@ def start_interview():
         st.session_state.current_outline != interview_outline
     )
     
-    # 只有当大纲变化或未分析时才重新分析
+    # 只有当大纲变化或未分析时才重新分析；先查持久化的分析结果，同一大纲在新会话、服务重启后都不必重新分析
     if outline_changed:
         with st.spinner("正在分析访谈大纲..."):
-            rating_metrics = analyze_interview_outline(interview_outline, key_questions)
+            rating_metrics = load_outline_analysis(interview_outline, key_questions)
             st.session_state.rating_metrics = rating_metrics
             st.session_state.current_outline = interview_outline
     
@@ -64,10 +241,14 @@ def start_interview():
     st.session_state.interview_outline = interview_outline
     st.session_state.key_questions = key_questions
     
-    # 重置访谈进度
-    st.session_state.dialog_history = []
-    st.session_state.current_question_idx = 0
-    st.session_state.current_subquestion_count = 1
+    # 重置访谈进度（每次开始访谈是一个新会话，session_id 用于追踪）；访谈流程由状态机决定，
+    # dialog_history 与 engine.dialog_history 是同一个列表
+    st.session_state.session_id = uuid.uuid4().hex
+    engine = InterviewEngine(interview_outline, key_questions)
+    st.session_state.engine = engine
+    st.session_state.dialog_history = engine.dialog_history
+    # 每个话题结束时在后台压缩该话题的对话，最终总结用摘要 + 最后一个话题的原文
+    st.session_state.transcript_digester = new_transcript_digester(interview_outline, key_questions)
     
     # 清除之前的总结
     if "final_summary" in st.session_state:
@@ -82,11 +263,17 @@ def start_interview():
     else:
         st.session_state.input_key = str(uuid.uuid4())
     
+    # 会话 id 放进链接，刷新页面或重连到其他 worker 后据此恢复
+    st.session_state.session_version = 0
+    query_params = {"session": st.session_state.session_id}
+    if st.session_state.get("outline_id") is not None:
+        query_params["outline"] = st.session_state.outline_id
+    st.experimental_set_query_params(**query_params)
+    
     # 生成背景问题
-    with st.spinner("生成背景问题..."):
-        overall_bg_question = generate_overall_background_question(interview_outline)
-        st.session_state.overall_bg_question = overall_bg_question
-        st.session_state.dialog_history = [{"role": "interviewer", "content": overall_bg_question}]
+    advance_interview(engine.start())
+    save_session_state()
+    return True
 
 def display_interview_ui():
     # 只有当访谈活跃时才显示访谈界面
@@ -111,8 +298,12 @@ def display_interview_ui():
         else:
             st.markdown(f"<div class='interviewee'><b>{role}:</b> {content}</div>", unsafe_allow_html=True)
     
-    # 如果最后一条消息是访谈员的，显示输入框
-    if not st.session_state.dialog_history or st.session_state.dialog_history[-1]["role"] == "interviewer":
+    # 访谈员下一句话的流式显示位置
+    stream_placeholder = st.empty()
+
+    # 状态机在等受访者回答时，显示输入框
+    engine = _engine()
+    if engine is not None and engine.waiting:
         # 确保有唯一的input_key
         if "input_key" not in st.session_state:
             st.session_state.input_key = str(uuid.uuid4())
@@ -123,113 +314,41 @@ def display_interview_ui():
             submit_button = st.form_submit_button("发送")
             
             if submit_button and user_response:
-                st.session_state.dialog_history.append({"role": "interviewee", "content": user_response})
                 # 生成新的input_key确保下次表单是全新的
                 st.session_state.input_key = str(uuid.uuid4())
                 # 处理用户回答
-                handle_next_question()
+                handle_next_question(user_response, stream_placeholder)
                 # 重新加载UI以显示新消息
                 st.experimental_rerun()
 
-def handle_next_question():
-    # 如果对话历史为空，不处理
-    if not st.session_state.dialog_history:
-        return
-    
-    # 当前的访谈状态和回答
-    dialog_history = st.session_state.dialog_history
-    current_question_idx = st.session_state.current_question_idx
-    current_subquestion_count = st.session_state.current_subquestion_count
-    key_questions = st.session_state.key_questions
-    
-    # 如果最后一条消息不是用户的，直接返回
-    if dialog_history[-1]["role"] != "interviewee":
+def handle_next_question(user_response, stream_placeholder=None):
+    """处理受访者的一次回答；开启追踪时整个处理过程记为一个 interview.turn span"""
+    engine = _engine()
+    if engine is None or not engine.waiting:
         return
-    
-    user_response = dialog_history[-1]["content"]
-    
-    # 如果没有更多问题，生成总结
-    if current_question_idx >= len(key_questions):
-        with st.spinner("生成总结中..."):
-            final_summary_json = generate_final_summary(
-                dialog_history, 
-                st.session_state.interview_outline, 
-                st.session_state.rating_metrics
-            )
-            # 清理JSON字符串
-            final_summary_json = clean_json_string(final_summary_json)
-            st.session_state.final_summary = final_summary_json
-        return
-    
-    # 当前问题
-    current_question = key_questions[current_question_idx]
-    
-    # 评估回答深度
-    with st.spinner("分析回答中..."):
-        response_depth = evaluate_response(current_question, user_response)
-    
-    # 根据深度决定下一步
-    if response_depth == "ENOUGH" or user_response.lower() == "继续":
-        # 问题回答足够深入，生成过渡到下一个问题
-        if current_question_idx + 1 < len(key_questions):
-            with st.spinner("生成过渡中..."):
-                next_q = key_questions[current_question_idx + 1]
-                transition_sentence = generate_transition(current_question, next_q)
-                st.session_state.dialog_history.append({"role": "interviewer", "content": transition_sentence})
-            st.session_state.current_question_idx += 1
-            st.session_state.current_subquestion_count = 1
-        else:
-            # 所有问题都回答完毕
-            with st.spinner("生成总结中..."):
-                final_summary_json = generate_final_summary(
-                    dialog_history, 
-                    st.session_state.interview_outline, 
-                    st.session_state.rating_metrics
-                )
-                # 清理JSON字符串
-                final_summary_json = clean_json_string(final_summary_json)
-                st.session_state.final_summary = final_summary_json
-                st.session_state.dialog_history.append({"role": "interviewer", "content": "访谈结束，感谢您的参与！"})
-    else:
-        # 问题不够深入，生成更深入的问题
-        with st.spinner("生成深入问题..."):
-            deeper_question = generate_deeper_question(current_question, user_response)
-            st.session_state.dialog_history.append({"role": "interviewer", "content": deeper_question})
-        st.session_state.current_subquestion_count += 1
+    with tracing.span(
+        "interview.turn",
+        session_id=st.session_state.get("session_id"),
+        question_index=engine.question_index,
+        turn=sum(entry["role"] == "interviewee" for entry in engine.dialog_history) + 1,
+    ):
+        action = engine.answer(user_response)
+        # 先保存回答和待执行的模型调用：处理过程中 worker 退出，恢复后从这里继续
+        save_session_state()
+        advance_interview(action, stream_placeholder)
+        save_session_state()
 
 def handle_next_button_click():
     # 如果没有开始访谈，不处理
-    if "dialog_history" not in st.session_state or not st.session_state.dialog_history:
+    engine = _engine()
+    if engine is None or not engine.dialog_history:
         st.warning("请先开始访谈")
         return
     
-    # 强制进入下一个问题
-    current_question_idx = st.session_state.current_question_idx
-    key_questions = st.session_state.key_questions
-    
-    # 如果没有更多问题，结束访谈
-    if current_question_idx >= len(key_questions) - 1:
-        with st.spinner("生成总结中..."):
-            final_summary_json = generate_final_summary(
-                st.session_state.dialog_history, 
-                st.session_state.interview_outline, 
-                st.session_state.rating_metrics
-            )
-            # 清理JSON字符串
-            final_summary_json = clean_json_string(final_summary_json)
-            st.session_state.final_summary = final_summary_json
-            st.session_state.dialog_history.append({"role": "interviewer", "content": "访谈结束，感谢您的参与！"})
-    else:
-        # 显示下一个问题
-        with st.spinner("生成下一个问题..."):
-            next_q = key_questions[current_question_idx + 1]
-            transition_sentence = generate_transition(
-                key_questions[current_question_idx] if current_question_idx < len(key_questions) else "上一个话题", 
-                next_q
-            )
-            st.session_state.dialog_history.append({"role": "interviewer", "content": transition_sentence})
-        st.session_state.current_question_idx += 1
-        st.session_state.current_subquestion_count = 1
+    # 强制进入下一个问题（最后一个话题之后生成总结）
+    if not engine.finished:
+        advance_interview(engine.skip_topic())
+        save_session_state()
     
     # 重新加载UI以显示新消息
     st.experimental_rerun()
@@ -237,29 +356,42 @@ def handle_next_button_click():
 def end_interview():
     """结束访谈并显示总结"""
     if "dialog_history" in st.session_state and st.session_state.dialog_history:
-        with st.spinner("生成总结中..."):
-            final_summary_json = generate_final_summary(
-                st.session_state.dialog_history, 
-                st.session_state.interview_outline if "interview_outline" in st.session_state else "", 
-                st.session_state.rating_metrics if "rating_metrics" in st.session_state else []
-            )
-            # 清理JSON字符串
-            final_summary_json = clean_json_string(final_summary_json)
-            st.session_state.final_summary = final_summary_json
-            
-            # 设置访谈为非活跃，停止显示访谈界面
-            st.session_state.interview_active = False
+        if _engine() is not None:
+            _engine().finish()
+        _generate_summary()
+        
+        # 设置访谈为非活跃，停止显示访谈界面
+        st.session_state.interview_active = False
+        save_session_state()
             
         st.experimental_rerun()
     else:
         st.warning("请先开始访谈")
 
-def initialize_interview():
-    with open("interview_outline.json", "r", encoding="utf-8") as f:
-        data = json.load(f)
-    interview_outline = data["interview_outline"]
-    key_questions = data["key_questions"]
-    return interview_outline, key_questions
+def initialize_interview(outline_id=None):
+    # 与命令行相同的选择规则（见 outline_store.load_outline）：按 id 读取 pre-interview 提交的大纲，
+    # 未指定时取最近提交的一份，还没有提交过时读 interview_outline.json
+    return load_outline(outline_id)
+
+def select_outline():
+    """侧边栏选择访谈大纲（最近提交的在前），链接里的 outline 参数可以指定默认选中的大纲"""
+    outlines = get_outline_store().recent()
+    if not outlines:
+        st.session_state.outline_id = None
+        return
+    ids = [outline["id"] for outline in outlines]
+    requested = st.experimental_get_query_params().get("outline", [None])[0]
+    if requested is not None and requested.isdigit() and int(requested) not in ids:
+        # 较早提交、不在最近列表里的大纲
+        ids.append(int(requested))
+    previews = {outline["id"]: outline["interview_outline"].strip()[:20] for outline in outlines}
+    default_id = int(requested) if requested is not None and requested.isdigit() else ids[0]
+    st.session_state.outline_id = st.sidebar.selectbox(
+        "访谈大纲",
+        ids,
+        index=ids.index(default_id),
+        format_func=lambda outline_id: f"#{outline_id} {previews.get(outline_id, '')}",
+    )
 
 def display_final_summary():
     if "final_summary" in st.session_state:
@@ -339,6 +471,14 @@ def main():
     # 创建边栏
     st.sidebar.title('访谈操作')
     
+    # 新连接（刷新页面、重连到其他 worker、服务重启）按链接里的 session 参数恢复访谈进度，
+    # 上次中断在模型调用中间的，从那次调用继续
+    if "engine" not in st.session_state:
+        session_id = st.experimental_get_query_params().get("session", [None])[0]
+        if session_id and restore_session_state(session_id) and _engine().pending is not None:
+            advance_interview(_engine().next_action())
+            save_session_state()
+    
     # 初始化session_state
     if "dialog_history" not in st.session_state:
         st.session_state.dialog_history = []
@@ -350,9 +490,10 @@ def main():
         st.session_state.interview_active = False
     
     # 边栏按钮
+    select_outline()
     if st.sidebar.button('开始访谈'):
-        start_interview()
-        st.experimental_rerun()
+        if start_interview():
+            st.experimental_rerun()
     
     if st.sidebar.button('下一个问题'):
         handle_next_button_click()
@@ -1,473 +1,149 @@
 # interview_logic.py
-import requests
-import json
+import os
+import sys
 import re
-from transformers import AutoTokenizer
-from vllm import LLM, SamplingParams
-
-class CompletionOutput:
-    def __init__(self, text):
-        self.text = text
-
-class CompletionResult:
-    def __init__(self, outputs):
-        self.outputs = outputs  # outputs应该是CompletionOutput实例的列表
-###########################
-# API调用适配层（核心修改）
-###########################
-API_URL = "http://10.77.110.129:8000/v1/chat/completions"
-HEADERS = {"Content-Type": "application/json"}
-MODEL_NAME = "/home/zhangyuheng/.cache/modelscope/hub/Qwen/Qwen2.5-7B-Instruct"
-
-class APIAdapter:
-    @staticmethod
-    def generate(text_list, sampling_params):
-        """替换原有的vLLM generate方法"""
-        responses = []
-        for text in text_list:
-            # 解析原apply_chat_template生成的文本格式
-            # 示例：假设原格式为"[INST] {system} [/INST] {user} [/INST]"
-            # 这里需要根据实际模板格式解析出messages
-            parsed_messages = APIAdapter._parse_template_text(text)
-            
-            data = {
-                "model": MODEL_NAME,
-                "messages": parsed_messages,
-                "temperature": sampling_params.temperature,
-                "top_p": sampling_params.top_p,
-                "repetition_penalty": sampling_params.repetition_penalty,
-                "max_tokens": sampling_params.max_tokens
-            }
-            
-            try:
-                response = requests.post(API_URL, headers=HEADERS, json=data, timeout=30)
-                if response.status_code == 200:
-                    content = response.json()["choices"][0]["message"]["content"]
-                    # 关键修改：将输出包装为列表
-                    responses.append([CompletionOutput(content)])  # <- 注意这里变成二维列表
-                else:
-                    responses.append([CompletionOutput(f"API Error: {response.status_code}")])
-            except Exception as e:
-                responses.append([CompletionOutput(f"Connection Error: {str(e)}")])
-        
-        # 结构调整：每个返回项对应一个CompletionResult
-        return [CompletionResult(outputs) for outputs in responses]
-
-    @staticmethod
-    def _parse_template_text(text):
-        """逆向解析apply_chat_template生成的文本（关键修改点）"""
-        # 这里需要根据原tokenizer实际生成的模板格式进行解析
-        # 示例解析逻辑（需根据实际情况调整）：
-        messages = []
-        
-        # 匹配系统消息
-        system_match = re.search(r'<\|system\|>(.*?)<\|end\|>', text, re.DOTALL)
-        if system_match:
-            messages.append({
-                "role": "system",
-                "content": system_match.group(1).strip()
-            })
-        
-        # 匹配用户消息
-        user_match = re.search(r'<\|user\|>(.*?)<\|end\|>', text, re.DOTALL)
-        if user_match:
-            messages.append({
-                "role": "user",
-                "content": user_match.group(1).strip()
-            })
-        
-        # 匹配assistant消息（如果有）
-        assistant_match = re.search(r'<\|assistant\|>(.*?)<\|end\|>', text, re.DOTALL)
-        if assistant_match:
-            messages.append({
-                "role": "assistant",
-                "content": assistant_match.group(1).strip()
-            })
-        
-        return messages
-class DummyTokenizer:
-    @staticmethod
-    def apply_chat_template(messages, tokenize=False, add_generation_prompt=True):
-        """模拟原tokenizer的模板生成逻辑"""
-        # 这里需要与原模型模板格式保持一致
-        template = ""
-        for msg in messages:
-            role = msg["role"]
-            content = msg["content"]
-            template += f"<|{role}|>{content}<|end|>\n"
-        if add_generation_prompt:
-            template += "<|assistant|>"
-        return template
 
-tokenizer = DummyTokenizer()  # 替换原有tokenizer初始化
-
-# 保持原有SamplingParams和LLM初始化（原代码14-18行）
-class SamplingParams:
-    def __init__(self, 
-                 temperature=0.6,
-                 top_p=0.9,
-                 repetition_penalty=1.02,
-                 max_tokens=512):
-        self.temperature = temperature
-        self.top_p = top_p
-        self.repetition_penalty = repetition_penalty
-        self.max_tokens = max_tokens
+# 与 final_model.py 共用仓库根目录下的 llm_client（连接池客户端）和 llm_adapter（适配层）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from llm_adapter import APIAdapter, DummyTokenizer, SamplingParams
+from chat_prompt import ChatPrompt
+import interview_prompts
+from interview_prompts import FALLBACK_OUTPUTS
+import analysis_store
 
+# 保持原有SamplingParams和LLM初始化（原代码14-18行），适配层与 final_model 共用 llm_adapter
+# 这里有意只用同步接口：Streamlit 每次交互都同步重跑脚本，没有事件循环可驱动 *_async 版本（异步版本见 final_model）
+tokenizer = DummyTokenizer()  # 替换原有tokenizer初始化
 sampling_params = SamplingParams()
 llm = APIAdapter()
 
-# 工具函数（访谈逻辑）
+# 工具函数（访谈逻辑）：提示词、兜底输出和分类逻辑与 final_model 共用 interview_prompts，这里只决定去标点的规则
+
+_PUNCTUATION_PATTERN = r'[^\w\s。，！？]'
+
+
+def _strip_punctuation(text):
+    return re.sub(_PUNCTUATION_PATTERN, '', text)
+
+
+# generate_transition 失败时返回的文本（按 _PUNCTUATION_PATTERN 去掉标点后的兜底过渡语），预取到它时不保存
+TRANSITION_FALLBACK = _strip_punctuation(FALLBACK_OUTPUTS["transition"])
+
+
+def _classify(messages, task):
+    """分类任务，返回带 confidence 的 Decision（见 interview_prompts.classify）"""
+    return interview_prompts.classify(llm, sampling_params, messages, task)
+
+
+def _generate_text(messages, task):
+    return interview_prompts.generate_text(llm, sampling_params, messages, task)
+
+
+def _generate_question_text(messages, task, on_token=None):
+    """
+    生成提问/过渡类文本并去掉多余标点。
+    传入 on_token 时走流式接口，每收到一段（已去标点的）文本就回调一次，便于界面逐字显示。
+    """
+    if on_token is not None:
+        stream_token = on_token
+        on_token = lambda delta: stream_token(_strip_punctuation(delta))
+    return _strip_punctuation(interview_prompts.generate_text(llm, sampling_params, messages, task, on_token))
+
 
 def check_unanswerable(current_question, user_response):
-    messages = [
-        {
-            "role": "system",
-            "content": (
-                "You are an expert in analyzing user responses. The user might be reluctant or uncomfortable answering. "
-                "We want a YES/NO decision: \n"
-                " - YES: The user is unwilling, reluctant, or implicitly refusing to answer. \n"
-                " - NO: Otherwise.\n"
-                "Only output 'YES' or 'NO'."
-            )
-        },
-        {
-            "role": "user",
-            "content": (
-                f"当前问题: {current_question}\n"
-                f"用户回答: {user_response}\n\n"
-                "请判断：该用户是否不愿回答当前问题？"
-            )
-        }
-    ]
-    text = tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
-    outputs = llm.generate([text], sampling_params)
-    decision = outputs[0].outputs[0].text.strip().upper()
-
-    return "YES" if "YES" in decision else "NO"
-
-
-def generate_overall_background_question(interview_outline):
-    messages = [
-        {
-            "role": "system",
-            "content": (
-                "You are a skilled interviewer. Generate a short introductory question to learn about "
-                "the interviewee's overall background or personal connection with the interview theme."
-            )
-        },
-        {
-            "role": "user",
-            "content": (
-                f"访谈大纲: {interview_outline}\n"
-                "请生成一个简短的问题，引导受访者谈谈与这个大纲相关的个人背景、经历或看法。"
-            )
-        }
-    ]
-    text = tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
-    outputs = llm.generate([text], sampling_params)
-    background_question = outputs[0].outputs[0].text.strip()
-    background_question = re.sub(r'[^\w\s。，！？]', '', background_question)
-    return background_question
-
-
-def generate_transition(previous_question, next_question=None):
-    if next_question:
-        user_content = (
-            f"上一话题: {previous_question}\n"
-            f"下一话题: {next_question}\n"
-            "请生成一个自然的过渡语句，使访谈流畅，不要显得死板或机械。"
-        )
-    else:
-        user_content = (
-            f"上一话题: {previous_question}\n"
-            "下一话题: （无）\n"
-            "请生成一个自然的结束语或过渡语，使访谈流畅。"
-        )
-    messages = [
-        {
-            "role": "system",
-            "content": "You are a skilled interviewer. Generate smooth, natural, and engaging transition statements."
-        },
-        {
-            "role": "user",
-            "content": user_content
-        }
-    ]
-    text = tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
-    outputs = llm.generate([text], sampling_params)
-    transition_sentence = outputs[0].outputs[0].text.strip()
-    transition_sentence = re.sub(r'[^\w\s。，！？]', '', transition_sentence)
-    return transition_sentence
+    messages = interview_prompts.check_unanswerable_messages(current_question, user_response)
+    # 返回 "YES" / "NO"（Decision，带 confidence）
+    return _classify(messages, "check_unanswerable")
+
+
+def generate_overall_background_question(interview_outline, on_token=None):
+    messages = interview_prompts.background_question_messages(interview_outline)
+    return _generate_question_text(messages, "background_question", on_token)
+
+
+def generate_transition(previous_question, next_question=None, on_token=None):
+    messages = interview_prompts.transition_messages(previous_question, next_question)
+    return _generate_question_text(messages, "transition", on_token)
 
 
 def evaluate_response(current_question, user_response):
-    messages = [
-        {
-            "role": "system",
-            "content": (
-                "You are an expert in qualitative interviews. "
-                "Your task is to analyze the depth of the interviewee's response "
-                "based on four key criteria:\n"
-                "1. Multiple Perspectives\n"
-                "2. Personal Relevance\n"
-                "3. Impact or Future Outlook\n"
-                "4. Logical & Organized\n\n"
-                "Return 'SURFACE' if the response is lacking in detail.\n"
-                "Return 'DEEPER' if it is somewhat detailed but can be further explored.\n"
-                "Return 'ENOUGH' if it meets at least 3 out of 4 criteria above."
-            )
-        },
-        {
-            "role": "user",
-            "content": (
-                f"当前问题: {current_question}\n"
-                f"受访者的回答: {user_response}\n"
-                "请基于上述标准给出判断：'SURFACE'，'DEEPER' 或 'ENOUGH'。"
-            )
-        }
-    ]
-    text = tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
-    outputs = llm.generate([text], sampling_params)
-    decision = outputs[0].outputs[0].text.strip().upper()
-    return decision
-
-
-def generate_deeper_question(current_question, user_response):
-    messages = [
-        {
-            "role": "system",
-            "content": (
-                "You are a skilled qualitative researcher. Generate one open-ended question "
-                "to explore deeper. Ask about motivations, emotions, long-term impact, or alternative perspectives. "
-                "Do NOT generate yes/no questions."
-            )
-        },
-        {
-            "role": "user",
-            "content": (
-                f"当前问题: {current_question}\n"
-                f"受访者的回答: {user_response}\n"
-                "请生成一个更深入的问题，引导受访者适度反思和阐述。"
-            )
-        }
-    ]
-    text = tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
-    outputs = llm.generate([text], sampling_params)
-    deeper_question = outputs[0].outputs[0].text.strip()
-    deeper_question = re.sub(r'[^\w\s。，！？]', '', deeper_question)
-    return deeper_question
-
-
-def handle_unanswerable_response(current_question):
-    messages = [
-        {
-            "role": "system",
-            "content": (
-                "You are a professional interviewer. "
-                "The interviewee is unable or unwilling to answer the current question. "
-                "Generate a new, related question that explores the same topic from a different angle."
-            )
-        },
-        {
-            "role": "user",
-            "content": (
-                f"当前问题: {current_question}\n"
-                "受访者无法回答，请生成一个不同但仍然相关且可能更容易回答的问题。"
-            )
-        }
-    ]
-    text = tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
-    outputs = llm.generate([text], sampling_params)
-    new_question = outputs[0].outputs[0].text.strip()
-    new_question = re.sub(r'[^\w\s。，！？]', '', new_question)
-    return new_question
+    messages = interview_prompts.evaluate_response_messages(current_question, user_response)
+    # 返回 "SURFACE" / "DEEPER" / "ENOUGH"（Decision，带 confidence）
+    return _classify(messages, "evaluate_response")
+
+
+def assess_turn(current_question, user_response):
+    """
+    一次调用同时判断受访者是否不愿回答、回答深度如何，
+    返回 {"unwilling": bool, "depth": "SURFACE"/"DEEPER"/"ENOUGH", "confidence": 0~1}。
+    模型输出的 JSON 解析不了时退回 check_unanswerable + evaluate_response 两次调用。
+    """
+    messages = interview_prompts.assess_turn_messages(current_question, user_response)
+    assessment = interview_prompts.parse_turn_assessment(_generate_text(messages, "assess_turn"))
+    if assessment is not None:
+        return assessment
+
+    unwilling = check_unanswerable(current_question, user_response)
+    if unwilling == "YES":
+        return interview_prompts.turn_assessment(unwilling, None)
+    return interview_prompts.turn_assessment(unwilling, evaluate_response(current_question, user_response))
+
+
+def generate_deeper_question(current_question, user_response, on_token=None):
+    messages = interview_prompts.deeper_question_messages(current_question, user_response)
+    return _generate_question_text(messages, "deeper_question", on_token)
+
+
+def handle_unanswerable_response(current_question, on_token=None):
+    messages = interview_prompts.unanswerable_followup_messages(current_question)
+    return _generate_question_text(messages, "unanswerable_followup", on_token)
 
 
 def analyze_interview_outline(interview_outline, key_questions):
     """
-    如果你想让模型对大纲进行多步分析，可以扩展此函数：
-      Step 1) 理解每一个关键主题
-      Step 2) 预测访谈走向
-      Step 3) 提出问题框架
-      Step 4) 提出评分指标
+    对大纲做多步分析（理解主题、预测走向、提问框架、评分指标，提示词见 interview_prompts.analysis_steps）
     
     - 分析的结果不需要输出（不打印），只在内存中留存
     - 返回"评分指标"供后续总结阶段使用
     """
-    # 在此使用一个字典来存储可能的分析结果
-    analysis_data = {
-        "topics_interpretation": None,
-        "possible_directions": None,
-        "question_framework": None,
-        "rating_metrics": None
-    }
-
-    # --- Step 1: 理解每一个关键主题 ---
-    messages_step1 = [
-        {
-            "role": "system",
-            "content": (
-                "You are in the 'analysis state' (step 1). "
-                "Please interpret each key topic from the interview outline in detail. "
-                "Do NOT produce final output for the user; only analyze."
-            )
-        },
-        {
-            "role": "user",
-            "content": (
-                f"访谈大纲: {interview_outline}\n"
-                f"关键问题: {key_questions}\n"
-                "请对以上主题进行理解和解读，谈谈它们代表的含义。"
-            )
-        }
-    ]
-    text_step1 = tokenizer.apply_chat_template(messages_step1, tokenize=False, add_generation_prompt=True)
-    outputs_step1 = llm.generate([text_step1], sampling_params)
-    step1_result = outputs_step1[0].outputs[0].text.strip()
-
-    # 存到 analysis_data 但不打印
-    analysis_data["topics_interpretation"] = step1_result
-
-    # --- Step 2: 预测访谈走向 ---
-    messages_step2 = [
-        {
-            "role": "system",
-            "content": (
-                "You are in the 'analysis state' (step 2). "
-                "Predict the possible directions or scenarios that may emerge during the interview. "
-                "Focus on potential follow-up angles or sensitive points."
-            )
-        },
-        {
-            "role": "user",
-            "content": (
-                f"访谈大纲: {interview_outline}\n"
-                f"关键问题: {key_questions}\n"
-                "请预测该访谈可能的走向与潜在话题分支。"
-            )
-        }
-    ]
-    text_step2 = tokenizer.apply_chat_template(messages_step2, tokenize=False, add_generation_prompt=True)
-    outputs_step2 = llm.generate([text_step2], sampling_params)
-    step2_result = outputs_step2[0].outputs[0].text.strip()
-    analysis_data["possible_directions"] = step2_result
-
-    # --- Step 3: 提出问题框架 ---
-    messages_step3 = [
-        {
-            "role": "system",
-            "content": (
-                "You are in the 'analysis state' (step 3). "
-                "Propose a question framework or structure for the interview. "
-                "Be specific, but do not reveal it to the user directly, we only need it for internal reference."
-            )
-        },
-        {
-            "role": "user",
-            "content": (
-                f"访谈大纲: {interview_outline}\n"
-                f"关键问题: {key_questions}\n"
-                "请提出一个可行的提问框架，仅供内部参考。"
-            )
-        }
-    ]
-    text_step3 = tokenizer.apply_chat_template(messages_step3, tokenize=False, add_generation_prompt=True)
-    outputs_step3 = llm.generate([text_step3], sampling_params)
-    step3_result = outputs_step3[0].outputs[0].text.strip()
-    analysis_data["question_framework"] = step3_result
-
-    # --- Step 4: 提出评分指标（重点）---
-    messages_step4 = [
-        {
-            "role": "system",
-            "content": (
-                "You are in the 'analysis state' (step 4). "
-                "Based on the interview outline, propose a list of rating metrics. "
-                "These metrics will be used later to evaluate how well the interviewee meets certain criteria. "
-                "Only output them in plain text, one metric per line or a simple list."
-            )
-        },
-        {
-            "role": "user",
-            "content": (
-                f"访谈大纲: {interview_outline}\n"
-                f"关键问题: {key_questions}\n"
-                "请提出与访谈主题相关的评分指标（数量与主题相近，或稍多）。"
-            )
-        }
-    ]
-    text_step4 = tokenizer.apply_chat_template(messages_step4, tokenize=False, add_generation_prompt=True)
-    outputs_step4 = llm.generate([text_step4], sampling_params)
-    step4_result = outputs_step4[0].outputs[0].text.strip()
-    analysis_data["rating_metrics"] = step4_result
-
-    # 注意：step4_result 可能是文字段落，需要我们做简单的分行或解析：
-    rating_metrics_list = []
-    for line in step4_result.splitlines():
-        line = line.strip()
-        if line and not line.lower().startswith("step") and not line.startswith("---"):
-            rating_metrics_list.append(line)
-
-    # 返回 rating_metrics_list 即可
-    return rating_metrics_list
-
-def generate_final_summary(dialog_history, interview_outline, rating_metrics):
+    # 四步只依赖大纲和关键问题，彼此独立：作为一个批次并发请求，总耗时取决于最慢的一步。
+    # 每步的超时见 task_profiles.ANALYSIS_STEP_TIMEOUT，超时或失败的那步结果为空字符串
+    steps = interview_prompts.analysis_steps(interview_outline, key_questions)
+    outputs = llm.generate([ChatPrompt(messages) for _, messages in steps], sampling_params, task="analysis")
+    return interview_prompts.rating_metrics_from(steps, outputs)
+
+def load_outline_analysis(interview_outline, key_questions):
+    """先查持久化的分析结果（跨会话、跨进程、服务重启后都可复用），没有才调用 analyze_interview_outline"""
+    return analysis_store.load_or_analyze(
+        analyze_interview_outline, interview_outline, key_questions,
+        namespace=__name__, prompt_version=interview_prompts.ANALYSIS_PROMPT_VERSION
+    )
+
+def generate_transcript_digest(interview_outline, topic, turns):
+    """把一个话题的对话（dialog_history 的片段）压缩成摘要；失败时返回空串"""
+    messages = interview_prompts.transcript_digest_messages(interview_outline, topic, turns)
+    return _generate_text(messages, "transcript_digest")
+
+def new_transcript_digester(interview_outline, key_questions, state=None):
+    """
+    一场访谈的滚动摘要（见 transcript_digest.TranscriptDigester），话题结束时调用 close_topic()；
+    state 为之前 to_dict() 保存的状态（恢复会话时）
+    """
+    return interview_prompts.new_transcript_digester(generate_transcript_digest, interview_outline, key_questions, state)
+
+def generate_final_summary(dialog_history, interview_outline, rating_metrics, digester=None):
     """
     让模型基于访谈完整对话 & 评分指标，生成最终的 JSON 总结：
       "takeaways": 访谈主要结论或洞察
       "points":    列表（与 rating_metrics 顺序对应的分值）
       "explanations": 对每个分值的解释
+    传入 digester（new_transcript_digester）时，已压缩好的话题用摘要代替原文；
+    提示词额外要求结论必须有受访者的原话支撑（interview_prompts.FINAL_SUMMARY_GROUNDING）
     """
-    # 将对话转成文本
-    conversation_text = ""
-    for turn in dialog_history:
-        role = turn["role"]
-        content = turn["content"]
-        conversation_text += f"{role}: {content}\n"
-
-    # 将评分指标也传给大模型
-    rating_metrics_str = "\n".join(f"- {m}" for m in rating_metrics)
-
-    messages = [
-        {
-            "role": "system",
-            "content": (
-                "You are now in the '总结状态'. You have the entire interview transcript. "
-                "You also have a set of rating metrics. "
-                "You will produce a final summary in JSON format with the structure:\n\n"
-                "{\n"
-                "  \"takeaways\": \"...\",      // main conclusions\n"
-                "  \"points\": [...],           // numeric scores for each metric\n"
-                "  \"explanations\": [...]      // explanation for each score\n"
-                "}\n\n"
-                "Only output valid JSON with these three keys.\n\n"
-                "IMPORTANT: To avoid hallucinations, strictly adhere to these guidelines:\n"
-                "1. Only include conclusions that are directly supported by the interviewee's statements\n"
-                "2. Do not infer opinions, beliefs, or information that wasn't explicitly mentioned\n"
-                "3. If the interviewee's response was minimal or off-topic for a metric, reflect this in your scoring and explanations\n"
-                "4. Maintain factual accuracy - your summary must be grounded in the actual transcript\n"
-                "5. Use direct quotes or paraphrases when possible to support your conclusions\n"
-                "6. If certain metrics cannot be evaluated due to lack of relevant response, score them lower rather than fabricating an assessment"
-            )
-        },
-        {
-            "role": "user",
-            "content": (
-                f"访谈大纲: {interview_outline}\n"
-                f"访谈完整记录:\n{conversation_text}\n\n"
-                f"评分指标列表:\n{rating_metrics_str}\n\n"
-                "请根据以上信息，对受访者进行打分。"
-                "将上述总结转换为json字典，第一个键是takeaways，"
-                "值是一个字符串，包含你从访谈中得到的结论；"
-                "第二个键是points，值是一个列表，每个元素是对应的评分指标的分值；"
-                "第三个键是explanations，值是一个列表，对应每个评分指标的解释。"
-                "以文本形式输出这个json字典即可。"
-            )
-        }
-    ]
-    text = tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
-    outputs = llm.generate([text], sampling_params)
-    final_summary_json = outputs[0].outputs[0].text.strip()
+    messages = interview_prompts.final_summary_messages(
+        dialog_history, interview_outline, rating_metrics, digester, grounded=True
+    )
+    final_summary_json = _generate_text(messages, "final_summary")
     output_filename = "interview_summary.json"
     with open(output_filename, "w", encoding="utf-8") as f:
         f.write(final_summary_json)
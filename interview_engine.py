@@ -0,0 +1,261 @@
+###########################
+# 访谈状态机配置
+###########################
+# 背景问题最多问几次（含第一次）；每个话题最多问几次（含关键问题本身），超过后直接过渡到下一话题
+MAX_BG_QUESTIONS = 3
+MAX_QUESTIONS_PER_TOPIC = 8
+# 受访者回答这些词时结束访谈（生成总结）；回答 “继续” 时跳过当前话题，不再判断这句回答。
+# 两种回答在背景阶段、关键问题和追问中处理方式相同（与 Streamlit 的 “结束访谈” 按钮一样，任何时候结束都生成总结）
+EXIT_WORDS = ("exit", "quit", "结束")
+SKIP_WORD = "继续"
+
+# 动作类型
+CALL_MODEL = "llm"       # 需要调用模型：action.task(*action.args)，结果交给 engine.resolve()（取值与已保存的会话状态兼容）
+WAIT = "wait"            # 等待受访者回答，交给 engine.answer()；action.text 不为空时先展示它（关键问题原文）
+SUMMARIZE = "summarize"  # 访谈结束，用 engine.dialog_history 生成最终总结
+
+# 输出是访谈员说的话的任务：结果会记入对话记录，驱动方应当展示（流式）给受访者
+SPOKEN_TASKS = ("background_question", "deeper_question", "unanswerable_followup", "transition")
+
+# 阶段
+PHASE_START = "start"
+PHASE_BACKGROUND = "background"
+PHASE_TOPIC = "topic"
+PHASE_FINISHED = "finished"
+
+STATE_VERSION = 1
+
+
+class Action:
+    """
+    引擎要求驱动方做的下一件事。kind 为 CALL_MODEL / WAIT / SUMMARIZE；
+    CALL_MODEL 动作的 task 与参数 args 对应 final_model / interview_logic 中的函数：
+      background_question     generate_overall_background_question(interview_outline)
+      evaluate_response       evaluate_response(question, answer)（背景阶段只判断深度）
+      assess_turn             assess_turn(question, answer)
+      deeper_question         generate_deeper_question(question, answer)
+      unanswerable_followup   handle_unanswerable_response(question)
+      transition              generate_transition(previous_question, next_question)，topic 为结束的话题
+    """
+
+    def __init__(self, kind, task=None, args=(), text=None, topic=None):
+        self.kind = kind
+        self.task = task
+        self.args = tuple(args)
+        self.text = text
+        self.topic = topic
+
+    @property
+    def spoken(self):
+        return self.kind == CALL_MODEL and self.task in SPOKEN_TASKS
+
+    def to_dict(self):
+        data = {"kind": self.kind, "task": self.task, "args": list(self.args)}
+        if self.topic is not None:
+            data["topic"] = self.topic
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["kind"], data.get("task"), data.get("args", ()), topic=data.get("topic"))
+
+    def __repr__(self):
+        return f"Action({self.kind!r}, task={self.task!r})"
+
+
+class InterviewEngine:
+    """
+    访谈流程的状态机（不做任何 I/O，也不调用模型）：命令行的 conduct_interview 和 Streamlit 界面都由它决定下一步。
+
+    驱动方的循环：
+        action = engine.start()
+        while action.kind != SUMMARIZE:
+            if action.kind == WAIT:
+                action = engine.answer(受访者的回答)
+            else:
+                action = engine.resolve(执行 action.task(*action.args) 的结果)
+    状态只有当前阶段、话题序号、追问次数、背景追问次数、等待中的模型调用和对话记录，
+    to_dict() / from_dict() 可以原样存取；空闲的会话只是一份状态，不占线程。
+    等待中的模型调用（pending）也会保存，恢复后 next_action() 返回它，由驱动方重新执行。
+    """
+
+    def __init__(self, interview_outline, key_questions):
+        self.interview_outline = interview_outline
+        self.key_questions = list(key_questions)
+        self.dialog_history = []
+        self.phase = PHASE_START
+        self.question_idx = 0
+        self.subquestion_count = 1
+        self.bg_count = 1
+        self.bg_question = None
+        # 受访者正在回答的那句提问（背景阶段按它判断深度）
+        self.asked = None
+        self.pending = None
+
+    ###########################
+    # 状态查询
+    ###########################
+    @property
+    def finished(self):
+        return self.phase == PHASE_FINISHED
+
+    @property
+    def waiting(self):
+        """是否在等受访者回答"""
+        return self.pending is None and self.phase in (PHASE_BACKGROUND, PHASE_TOPIC)
+
+    @property
+    def question_index(self):
+        """当前关键问题的序号；背景阶段、结束后为 None"""
+        return self.question_idx if self.phase == PHASE_TOPIC else None
+
+    @property
+    def current_question(self):
+        """当前话题：背景阶段为背景问题，正式访谈为关键问题"""
+        if self.phase == PHASE_TOPIC:
+            return self.key_questions[self.question_idx]
+        return self.bg_question
+
+    def _next_topic(self):
+        """当前话题之后的关键问题（没有时为 None）"""
+        idx = 0 if self.phase == PHASE_BACKGROUND else self.question_idx + 1
+        return self.key_questions[idx] if idx < len(self.key_questions) else None
+
+    def next_action(self):
+        """当前该做的事：恢复保存的状态后用它继续"""
+        if self.phase == PHASE_START:
+            return self.start()
+        if self.pending is not None:
+            return self.pending
+        if self.finished:
+            return Action(SUMMARIZE)
+        return Action(WAIT)
+
+    ###########################
+    # 状态转移
+    ###########################
+    def start(self):
+        if self.phase != PHASE_START:
+            raise ValueError(f"interview already started (phase={self.phase})")
+        self.phase = PHASE_BACKGROUND
+        return self._llm("background_question", self.interview_outline)
+
+    def answer(self, text):
+        """受访者回答了一句，返回下一步"""
+        if not self.waiting:
+            raise ValueError(f"not waiting for an answer (phase={self.phase}, pending={self.pending!r})")
+        self.dialog_history.append({"role": "interviewee", "content": text})
+        reply = text.strip().lower()
+        if reply in EXIT_WORDS:
+            return self.finish()
+        if reply == SKIP_WORD:
+            return self.skip_topic()
+        if self.phase == PHASE_BACKGROUND:
+            return self._llm("evaluate_response", self.asked, text)
+        return self._llm("assess_turn", self.current_question, text)
+
+    def resolve(self, result):
+        """
+        执行完等待中的模型调用，传入其结果，返回下一步。
+        result 为 evaluate_response 的深度标签、assess_turn 的判断结果，或访谈员说的话（SPOKEN_TASKS）。
+        """
+        if self.pending is None:
+            raise ValueError("no pending model call to resolve")
+        action, self.pending = self.pending, None
+
+        if action.task in SPOKEN_TASKS:
+            self.dialog_history.append({"role": "interviewer", "content": result})
+            if action.task == "transition":
+                return self._enter_next_topic()
+            if action.task == "background_question":
+                self.bg_question = result
+            self.asked = result
+            return Action(WAIT)
+
+        if action.task == "evaluate_response":
+            if result == "ENOUGH" or self.bg_count >= MAX_BG_QUESTIONS:
+                return self._transition()
+            self.bg_count += 1
+            return self._llm("deeper_question", self.bg_question, action.args[1])
+
+        # assess_turn
+        question, answer = action.args
+        if result["unwilling"]:
+            return self._follow_up("unanswerable_followup", question)
+        if result["depth"] == "ENOUGH":
+            return self._transition()
+        return self._follow_up("deeper_question", question, answer)
+
+    def skip_topic(self):
+        """结束当前话题（受访者回答 “继续”，或界面上点了 “下一个问题”），过渡到下一话题"""
+        if self.phase not in (PHASE_BACKGROUND, PHASE_TOPIC):
+            return self.next_action()
+        self.pending = None
+        return self._transition()
+
+    def finish(self):
+        """结束访谈：不再提问，下一步为生成总结"""
+        self.phase = PHASE_FINISHED
+        self.pending = None
+        return Action(SUMMARIZE)
+
+    def _llm(self, task, *args, topic=None):
+        self.pending = Action(CALL_MODEL, task, args, topic=topic)
+        return self.pending
+
+    def _follow_up(self, task, *args):
+        self.subquestion_count += 1
+        if self.subquestion_count > MAX_QUESTIONS_PER_TOPIC:
+            return self._transition()
+        return self._llm(task, *args)
+
+    def _transition(self):
+        current = self.current_question
+        return self._llm("transition", current, self._next_topic(), topic=current)
+
+    def _enter_next_topic(self):
+        if self.phase == PHASE_BACKGROUND:
+            self.phase = PHASE_TOPIC
+            self.question_idx = 0
+        else:
+            self.question_idx += 1
+        if self.question_idx >= len(self.key_questions):
+            return self.finish()
+        self.subquestion_count = 1
+        question = self.key_questions[self.question_idx]
+        self.dialog_history.append({"role": "interviewer", "content": question})
+        self.asked = question
+        return Action(WAIT, text=question)
+
+    ###########################
+    # 序列化
+    ###########################
+    def to_dict(self):
+        return {
+            "v": STATE_VERSION,
+            "interview_outline": self.interview_outline,
+            "key_questions": self.key_questions,
+            "dialog_history": self.dialog_history,
+            "phase": self.phase,
+            "question_idx": self.question_idx,
+            "subquestion_count": self.subquestion_count,
+            "bg_count": self.bg_count,
+            "bg_question": self.bg_question,
+            "asked": self.asked,
+            "pending": self.pending.to_dict() if self.pending is not None else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get("v") != STATE_VERSION:
+            raise ValueError(f"unsupported interview state version: {data.get('v')!r}")
+        engine = cls(data["interview_outline"], data["key_questions"])
+        engine.dialog_history = list(data["dialog_history"])
+        engine.phase = data["phase"]
+        engine.question_idx = data["question_idx"]
+        engine.subquestion_count = data["subquestion_count"]
+        engine.bg_count = data["bg_count"]
+        engine.bg_question = data["bg_question"]
+        engine.asked = data["asked"]
+        engine.pending = Action.from_dict(data["pending"]) if data["pending"] is not None else None
+        return engine
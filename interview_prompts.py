@@ -0,0 +1,383 @@
+import json
+
+from llm_client import LLMError
+import task_profiles
+import llm_classify
+from chat_prompt import ChatPrompt
+from transcript_digest import TranscriptDigester, format_turns, render_transcript
+from prompt_budget import fit
+from prompt_layout import build_messages, outline_block, qa_block
+
+###########################
+# 访谈提示词与调用封装
+###########################
+# 命令行（final_model.py）和 Streamlit（interview_app/interview_logic.py）共用这里的提示词、兜底输出和分类逻辑，
+# 两端只各自持有适配层实例（llm / allm、sampling_params）和去标点的规则，改提示词时只改这一份。
+
+# 接口重试用尽仍失败时各任务的兜底输出，避免把 "Connection Error: ..." 当成问题展示给受访者
+# （提问类的兜底文本由各端按自己的规则去掉标点后再显示）
+FALLBACK_OUTPUTS = {
+    "check_unanswerable": "NO",
+    # 判断不了深度时直接进入下一话题，而不是在故障期间反复追问
+    "evaluate_response": "ENOUGH",
+    "assess_turn": json.dumps({"unwilling": False, "depth": "ENOUGH", "confidence": 0.0}),
+    "background_question": "请先简单介绍一下您自己，以及您和这个主题有什么联系？",
+    "transition": "好的，我们接下来聊聊下一个话题。",
+    "deeper_question": "能再具体谈谈您这样想的原因和亲身经历吗？",
+    "unanswerable_followup": "没关系，我们换个角度，您身边的人是怎么看待这个问题的？",
+    "analysis": "",
+    # 摘要失败时最终总结改用该话题的原文
+    "transcript_digest": "",
+    "final_summary": json.dumps({"error": "Failed to generate valid JSON summary"}),
+}
+
+
+def output_text(result, task):
+    """取出一条 CompletionResult 的文本（去掉首尾空白）；调用失败时返回该任务的兜底输出"""
+    output = result.outputs[0]
+    if output.error is not None:
+        return FALLBACK_OUTPUTS.get(task, "")
+    return output.text.strip()
+
+
+def _emit_fallback(task, on_token):
+    fallback = FALLBACK_OUTPUTS.get(task, "")
+    if fallback:
+        on_token(fallback)
+    return fallback
+
+
+def generate_text(adapter, sampling_params, messages, task, on_token=None):
+    """
+    同步调用：把 messages 包装成 ChatPrompt 交给 adapter.generate，返回去掉首尾空白的文本。
+    task 为任务名（决定是否走回复缓存，见 llm_cache.CACHEABLE_TASKS；失败时的兜底见 FALLBACK_OUTPUTS）。
+    传入 on_token 时改用流式接口，每收到一段文本就回调一次（用于边生成边显示）。
+    """
+    prompt = ChatPrompt(messages)
+    if on_token is None:
+        return output_text(adapter.generate([prompt], sampling_params, task=task)[0], task)
+
+    pieces = []
+    try:
+        for delta in adapter.generate_stream(prompt, sampling_params, task=task):
+            if not pieces:
+                # 跳过开头的空白，与非流式的 strip() 保持一致
+                delta = delta.lstrip()
+                if not delta:
+                    continue
+            pieces.append(delta)
+            on_token(delta)
+    except LLMError:
+        # 已经显示了一部分就保留这部分，否则用兜底文本
+        if not pieces:
+            return _emit_fallback(task, on_token)
+    return "".join(pieces).strip()
+
+
+async def generate_text_async(adapter, sampling_params, messages, task, on_token=None):
+    """异步调用：与 generate_text 相同，adapter 为 AsyncAPIAdapter"""
+    prompt = ChatPrompt(messages)
+    if on_token is None:
+        return output_text((await adapter.generate([prompt], sampling_params, task=task))[0], task)
+
+    pieces = []
+    try:
+        async for delta in adapter.generate_stream(prompt, sampling_params, task=task):
+            if not pieces:
+                delta = delta.lstrip()
+                if not delta:
+                    continue
+            pieces.append(delta)
+            on_token(delta)
+    except LLMError:
+        if not pieces:
+            return _emit_fallback(task, on_token)
+    return "".join(pieces).strip()
+
+
+def classify(adapter, sampling_params, messages, task):
+    """
+    分类任务：logprobs 模式下只解码 1 个 token 给各标签打分，返回带 confidence 的 Decision；
+    接口不支持 logprobs（不可重试的错误，之后的调用不再尝试）或候选 token 对应不到任何标签时，退回生成文本再解析标签。
+    """
+    labels = task_profiles.get_profile(task).labels
+    if llm_classify.use_logprobs():
+        try:
+            top = adapter.top_logprobs(ChatPrompt(messages), sampling_params, task=task)
+            decision = llm_classify.score_labels(top, labels)
+            if decision is not None:
+                return decision
+        except LLMError as e:
+            if e.retryable:
+                return llm_classify.Decision(FALLBACK_OUTPUTS[task])
+            llm_classify.mark_logprobs_unsupported()
+    text = generate_text(adapter, sampling_params, messages, task)
+    return llm_classify.parse_label(text, labels, FALLBACK_OUTPUTS[task])
+
+
+async def classify_async(adapter, sampling_params, messages, task):
+    """classify 的异步版本"""
+    labels = task_profiles.get_profile(task).labels
+    if llm_classify.use_logprobs():
+        try:
+            top = await adapter.top_logprobs(ChatPrompt(messages), sampling_params, task=task)
+            decision = llm_classify.score_labels(top, labels)
+            if decision is not None:
+                return decision
+        except LLMError as e:
+            if e.retryable:
+                return llm_classify.Decision(FALLBACK_OUTPUTS[task])
+            llm_classify.mark_logprobs_unsupported()
+    text = await generate_text_async(adapter, sampling_params, messages, task)
+    return llm_classify.parse_label(text, labels, FALLBACK_OUTPUTS[task])
+
+
+###########################
+# ---- 提问阶段的提示词 ----
+###########################
+def check_unanswerable_messages(current_question, user_response):
+    return build_messages(
+        "You are an expert in analyzing user responses. The user might be reluctant or uncomfortable answering. "
+        "We want a YES/NO decision: \n"
+        " - YES: The user is unwilling, reluctant, or implicitly refusing to answer. \n"
+        " - NO: Otherwise.\n"
+        "Only output 'YES' or 'NO'.\n"
+        "请判断：该用户是否不愿回答当前问题？",
+        qa_block("check_unanswerable", current_question, user_response, answer_label="用户回答")
+    )
+
+
+def background_question_messages(interview_outline):
+    return build_messages(
+        "You are a skilled interviewer. Generate a short introductory question to learn about "
+        "the interviewee's overall background or personal connection with the interview theme.\n"
+        "请生成一个简短的问题，引导受访者谈谈与这个大纲相关的个人背景、经历或看法。",
+        outline_block(interview_outline, task="background_question")
+    )
+
+
+def transition_messages(previous_question, next_question=None):
+    return build_messages(
+        "You are a skilled interviewer. Generate smooth, natural, and engaging transition statements.\n"
+        "请根据上一话题和下一话题生成一个自然的过渡语句，使访谈流畅，不要显得死板或机械；"
+        "下一话题为（无）时，生成一个自然的结束语。",
+        f"上一话题: {fit('transition', 'question', previous_question)}\n"
+        f"下一话题: {fit('transition', 'question', next_question) or '（无）'}"
+    )
+
+
+def evaluate_response_messages(current_question, user_response):
+    return build_messages(
+        "You are an expert in qualitative interviews. "
+        "Your task is to analyze the depth of the interviewee's response "
+        "based on four key criteria:\n"
+        "1. Multiple Perspectives\n"
+        "2. Personal Relevance\n"
+        "3. Impact or Future Outlook\n"
+        "4. Logical & Organized\n\n"
+        "Return 'SURFACE' if the response is lacking in detail.\n"
+        "Return 'DEEPER' if it is somewhat detailed but can be further explored.\n"
+        "Return 'ENOUGH' if it meets at least 3 out of 4 criteria above.\n"
+        "请基于上述标准给出判断：'SURFACE'，'DEEPER' 或 'ENOUGH'。",
+        qa_block("evaluate_response", current_question, user_response)
+    )
+
+
+def assess_turn_messages(current_question, user_response):
+    return build_messages(
+        "You are an expert in qualitative interviews. Assess the interviewee's response in one pass:\n"
+        "1. unwilling: true if the interviewee is unwilling, reluctant, or implicitly refusing to answer; "
+        "otherwise false.\n"
+        "2. depth: analyze the depth of the response based on four key criteria "
+        "(Multiple Perspectives, Personal Relevance, Impact or Future Outlook, Logical & Organized). "
+        "'SURFACE' if it is lacking in detail, 'DEEPER' if it is somewhat detailed but can be further "
+        "explored, 'ENOUGH' if it meets at least 3 out of 4 criteria.\n"
+        "3. confidence: how confident you are in this assessment, a number between 0 and 1.\n"
+        "Only output a JSON object: "
+        "{\"unwilling\": true|false, \"depth\": \"SURFACE\"|\"DEEPER\"|\"ENOUGH\", \"confidence\": 0~1}",
+        qa_block("assess_turn", current_question, user_response)
+    )
+
+
+def parse_turn_assessment(text):
+    """解析 assess_turn 的输出；解析不了时返回 None，由调用方退回两次单独的分类"""
+    labels = task_profiles.get_profile("evaluate_response").labels
+    return llm_classify.parse_turn_assessment(text, labels)
+
+
+def turn_assessment(unwilling, depth):
+    """由两个单独的分类结果拼出 assess_turn 的返回值（置信度取本次起决定作用的那个判断）"""
+    if unwilling == "YES":
+        return {"unwilling": True, "depth": "SURFACE", "confidence": unwilling.confidence or 0.0}
+    return {"unwilling": False, "depth": str(depth), "confidence": depth.confidence or 0.0}
+
+
+def deeper_question_messages(current_question, user_response):
+    return build_messages(
+        "You are a skilled qualitative researcher. Generate one open-ended question "
+        "to explore deeper. Ask about motivations, emotions, long-term impact, or alternative perspectives. "
+        "Do NOT generate yes/no questions.\n"
+        "请生成一个更深入的问题，引导受访者适度反思和阐述。",
+        qa_block("deeper_question", current_question, user_response)
+    )
+
+
+def unanswerable_followup_messages(current_question):
+    return build_messages(
+        "You are a professional interviewer. "
+        "The interviewee is unable or unwilling to answer the current question. "
+        "Generate a new, related question that explores the same topic from a different angle.\n"
+        "受访者无法回答，请生成一个不同但仍然相关且可能更容易回答的问题。",
+        qa_block("unanswerable_followup", current_question)
+    )
+
+
+###########################
+# ---- 分析阶段（多步）----
+###########################
+# 修改下面的分析提示词或评分指标的解析方式时递增，已存储的旧分析结果随之失效（见 analysis_store）
+ANALYSIS_PROMPT_VERSION = 2
+
+ANALYSIS_INSTRUCTIONS = (
+    "You are in the 'analysis state'. You will be given an interview outline with its key questions, "
+    "followed by the analysis step to perform. "
+    "Do NOT produce final output for the user; only analyze."
+)
+
+
+def analysis_steps(interview_outline, key_questions):
+    """
+    多步分析的提示词，按执行顺序返回 (结果键名, messages)：
+      Step 1) 理解每一个关键主题
+      Step 2) 预测访谈走向
+      Step 3) 提出问题框架
+      Step 4) 提出评分指标
+    四步共用同一段 system 和大纲块，只有末尾的步骤要求不同，前缀可以被服务端缓存复用
+    """
+    block = outline_block(interview_outline, key_questions, task="analysis")
+
+    def step(instruction):
+        return build_messages(ANALYSIS_INSTRUCTIONS, block, instruction)
+
+    return [
+        # --- Step 1: 理解每一个关键主题 ---
+        ("topics_interpretation", step(
+            "Step 1: Please interpret each key topic from the interview outline in detail.\n"
+            "请对以上主题进行理解和解读，谈谈它们代表的含义。"
+        )),
+        # --- Step 2: 预测访谈走向 ---
+        ("possible_directions", step(
+            "Step 2: Predict the possible directions or scenarios that may emerge during the interview. "
+            "Focus on potential follow-up angles or sensitive points.\n"
+            "请预测该访谈可能的走向与潜在话题分支。"
+        )),
+        # --- Step 3: 提出问题框架 ---
+        ("question_framework", step(
+            "Step 3: Propose a question framework or structure for the interview. "
+            "Be specific, but do not reveal it to the user directly, we only need it for internal reference.\n"
+            "请提出一个可行的提问框架，仅供内部参考。"
+        )),
+        # --- Step 4: 提出评分指标（重点）---
+        ("rating_metrics", step(
+            "Step 4: Based on the interview outline, propose a list of rating metrics. "
+            "These metrics will be used later to evaluate how well the interviewee meets certain criteria. "
+            "Only output them in plain text, one metric per line or a simple list.\n"
+            "请提出与访谈主题相关的评分指标（数量与主题相近，或稍多）。"
+        )),
+    ]
+
+
+def rating_metrics_from(steps, results):
+    """
+    由 analysis_steps 的各步结果（CompletionResult，顺序与 steps 相同）取出评分指标列表。
+    其余几步的结果不需要输出（不打印），只在这里留存；超时或失败的那步结果为空字符串
+    """
+    analysis_data = {}
+    for (name, _), result in zip(steps, results):
+        analysis_data[name] = output_text(result, "analysis")
+
+    # 注意：step4_result 可能是文字段落，需要我们做简单的分行或解析：
+    # 比如如果模型输出:
+    # "1. 对主题A的理解\n2. 对主题B的经验\n3. 态度..."
+    # 可以把它拆分成列表
+    rating_metrics_list = []
+    for line in analysis_data["rating_metrics"].splitlines():
+        line = line.strip()
+        # 简单判断一下是否是空行或编号
+        if line and not line.lower().startswith("step") and not line.startswith("---"):
+            rating_metrics_list.append(line)
+    return rating_metrics_list
+
+
+###########################
+# ---- 访谈记录摘要 ----
+###########################
+def transcript_digest_messages(interview_outline, topic, turns):
+    return build_messages(
+        "You are writing a transcript digest: compress the part of an interview about one topic "
+        "so that the whole interview can be scored later from the digests.\n"
+        "请把这个话题下的对话压缩成一段摘要：保留受访者的观点、理由、提到的事实和亲身经历，关键的说法尽量保留原话；"
+        "受访者拒绝回答或回答很浅的也要写明。不要加入对话中没有的推断。只输出摘要本身，不超过200字。",
+        outline_block(interview_outline, task="transcript_digest"),
+        f"话题: {fit('transcript_digest', 'question', topic)}\n"
+        f"对话记录:\n{fit('transcript_digest', 'transcript', format_turns(turns))}"
+    )
+
+
+def new_transcript_digester(generate_digest, interview_outline, key_questions, state=None):
+    """
+    一场访谈的滚动摘要（见 transcript_digest.TranscriptDigester），话题结束时调用 close_topic()；
+    generate_digest(interview_outline, topic, turns) 为各端生成单个话题摘要的函数，
+    state 为之前 to_dict() 保存的状态（恢复会话时）
+    """
+    summarize = lambda topic, turns: generate_digest(interview_outline, topic, turns)
+    final_topic = key_questions[-1] if key_questions else None
+    if state is not None:
+        return TranscriptDigester.from_dict(summarize, state, final_topic)
+    return TranscriptDigester(summarize, final_topic=final_topic)
+
+
+###########################
+# ---- 最终总结阶段 ----
+###########################
+# Streamlit 端的最终总结额外要求结论必须有原话支撑（命令行端沿用原来较短的提示词）
+FINAL_SUMMARY_GROUNDING = (
+    "IMPORTANT: To avoid hallucinations, strictly adhere to these guidelines:\n"
+    "1. Only include conclusions that are directly supported by the interviewee's statements\n"
+    "2. Do not infer opinions, beliefs, or information that wasn't explicitly mentioned\n"
+    "3. If the interviewee's response was minimal or off-topic for a metric, reflect this in your scoring and explanations\n"
+    "4. Maintain factual accuracy - your summary must be grounded in the actual transcript\n"
+    "5. Use direct quotes or paraphrases when possible to support your conclusions\n"
+    "6. If certain metrics cannot be evaluated due to lack of relevant response, score them lower rather than fabricating an assessment\n"
+)
+
+
+def final_summary_messages(dialog_history, interview_outline, rating_metrics, digester=None, grounded=False):
+    """grounded=True 时在输出格式之后加上 FINAL_SUMMARY_GROUNDING"""
+    # 将对话转成文本（已结束的话题有摘要时用摘要代替原文），超出预算时省略中间部分
+    conversation_text = fit("final_summary", "transcript", render_transcript(dialog_history, digester))
+
+    # 将评分指标也传给大模型（评分指标只取决于大纲，放在访谈记录之前）
+    rating_metrics_str = "\n".join(f"- {m}" for m in rating_metrics)
+
+    return build_messages(
+        "You are now in the '总结状态'. You have the entire interview transcript. "
+        "You also have a set of rating metrics. "
+        "You will produce a final summary in JSON format with the structure:\n\n"
+        "{\n"
+        "  \"takeaways\": \"...\",      // main conclusions\n"
+        "  \"points\": [...],           // numeric scores for each metric\n"
+        "  \"explanations\": [...]      // explanation for each score\n"
+        "}\n\n"
+        "Only output valid JSON with these three keys.\n"
+        + ("\n" + FINAL_SUMMARY_GROUNDING if grounded else "") +
+        "请根据访谈大纲、评分指标和访谈完整记录（较早的话题可能以“[话题摘要]”的形式给出），对受访者进行打分。"
+        "将上述总结转换为json字典，第一个键是takeaways，"
+        "值是一个字符串，包含你从访谈中得到的结论；"
+        "第二个键是points，值是一个列表，每个元素是对应的评分指标的分值；"
+        "第三个键是explanations，值是一个列表，对应每个评分指标的解释。"
+        "以文本形式输出这个json字典即可。",
+        outline_block(interview_outline, task="final_summary"),
+        f"评分指标列表:\n{rating_metrics_str}\n",
+        f"访谈完整记录:\n{conversation_text}"
+    )
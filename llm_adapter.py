@@ -0,0 +1,204 @@
+import json
+
+from llm_client import MAX_CONCURRENCY, LLMError, get_client, get_async_client
+import llm_cache
+import task_profiles
+import llm_classify
+from chat_prompt import ChatPrompt, to_messages
+from prompt_layout import record_prompt
+
+###########################
+# vLLM 风格的适配层
+###########################
+# final_model.py 和 interview_app/interview_logic.py 共用：各自创建 llm = APIAdapter() 与 sampling_params，
+# 访谈函数仍按原来调用 vLLM 的写法 llm.generate([prompt], sampling_params) 取结果
+
+class CompletionOutput:
+    def __init__(self, text, error=None):
+        self.text = text
+        # 调用失败（重试用尽）时为错误信息；为兼容旧调用方，text 中仍是 "API Error: ..." 文本
+        self.error = error
+
+
+class CompletionResult:
+    def __init__(self, outputs):
+        self.outputs = outputs  # outputs应该是CompletionOutput实例的列表
+
+
+# 请求通过 llm_client 共享的连接池客户端发出（接口地址、模型名等配置也在 llm_client）
+class APIAdapter:
+    # 一个批次内同时在途的最大请求数，可按需调整或在调用时通过 max_concurrency 覆盖
+    max_concurrency = MAX_CONCURRENCY
+
+    @staticmethod
+    def generate(prompts, sampling_params, max_concurrency=None, task=None):
+        """
+        替换原有的vLLM generate方法（批量时并发请求，结果保持输入顺序）。
+        task 为调用方的任务名，可缓存的任务先查 llm_cache，只把未命中的 prompt 发给接口。
+        """
+        # prompts 中的每一项可以是 ChatPrompt（直接使用其 messages），
+        # 也可以是旧的 apply_chat_template 文本（兼容路径，解析回 messages）
+        messages_list = [to_messages(prompt) for prompt in prompts]
+        data, keys, results = llm_cache.lookup(task, messages_list, APIAdapter._sampling_data(sampling_params, task))
+
+        pending = [i for i, result in enumerate(results) if result is None]
+        if pending:
+            if max_concurrency is None:
+                max_concurrency = APIAdapter.max_concurrency
+            for i in pending:
+                record_prompt(task, messages_list[i])
+            fetched = get_client().chat_batch(
+                [messages_list[i] for i in pending],
+                data,
+                max_concurrency=max_concurrency,
+                deadline=task_profiles.task_deadline(task),
+                task=task
+            )
+            llm_cache.store([keys[i] for i in pending], fetched)
+            for i, result in zip(pending, fetched):
+                results[i] = result
+        return APIAdapter._wrap_results(results)
+
+    @staticmethod
+    def generate_stream(prompt, sampling_params, task=None):
+        """
+        流式版本：逐段产出模型输出的增量文本（单条 prompt）；缓存命中时一次性产出整段。
+        重试用尽后抛出 LLMError，由调用方决定如何兜底。
+        """
+        messages = to_messages(prompt)
+        data, keys, results = llm_cache.lookup(task, [messages], APIAdapter._sampling_data(sampling_params, task))
+        if results[0] is not None:
+            yield results[0]
+            return
+
+        record_prompt(task, messages)
+        pieces = []
+        for delta in get_client().chat_stream(messages, data, task=task):
+            pieces.append(delta)
+            yield delta
+        llm_cache.store(keys, ["".join(pieces)])
+
+    @staticmethod
+    def top_logprobs(prompt, sampling_params, task=None):
+        """
+        分类任务的单步打分：只解码 1 个 token，返回第一个位置的候选 [(token, logprob), ...]。
+        失败时抛出 LLMError。
+        """
+        messages = to_messages(prompt)
+        data = llm_classify.logprob_params(APIAdapter._sampling_data(sampling_params, task))
+        data, keys, results = llm_cache.lookup(task, [messages], data)
+        if results[0] is not None:
+            return json.loads(results[0])
+        record_prompt(task, messages)
+        top = get_client().chat_logprobs(messages, data, task=task)
+        llm_cache.store(keys, [json.dumps(top, ensure_ascii=False)])
+        return top
+
+    @staticmethod
+    def _sampling_data(sampling_params, task=None):
+        """SamplingParams 转成请求参数，再叠加该任务在 task_profiles 中的配置（长度、温度、约束输出等）"""
+        return task_profiles.request_params(task, {
+            "temperature": sampling_params.temperature,
+            "top_p": sampling_params.top_p,
+            "repetition_penalty": sampling_params.repetition_penalty,
+            "max_tokens": sampling_params.max_tokens
+        })
+
+    @staticmethod
+    def _wrap_results(results):
+        """把 chat_batch 的结果（文本或异常）包装成 vLLM 风格的 CompletionResult 列表"""
+        responses = []
+        for result in results:
+            if isinstance(result, Exception):
+                responses.append([CompletionOutput(APIAdapter._error_text(result), error=str(result))])
+            else:
+                # 关键修改：将输出包装为列表
+                responses.append([CompletionOutput(result)])  # <- 注意这里变成二维列表
+
+        # 结构调整：每个返回项对应一个CompletionResult
+        return [CompletionResult(outputs) for outputs in responses]
+
+    @staticmethod
+    def _error_text(error):
+        if isinstance(error, LLMError) and error.status_code is not None:
+            return f"API Error: {error.status_code}"
+        return f"Connection Error: {str(error)}"
+
+    @staticmethod
+    def _parse_template_text(text):
+        """兼容旧调用方式：逆向解析apply_chat_template生成的文本（保留全部轮次）"""
+        return ChatPrompt.from_template_text(text).messages
+
+
+class AsyncAPIAdapter:
+    """APIAdapter 的异步版本，请求经由当前事件循环的 aiohttp 客户端发出"""
+    max_concurrency = MAX_CONCURRENCY
+
+    @staticmethod
+    async def generate(prompts, sampling_params, max_concurrency=None, task=None):
+        messages_list = [to_messages(prompt) for prompt in prompts]
+        data, keys, results = llm_cache.lookup(task, messages_list, APIAdapter._sampling_data(sampling_params, task))
+
+        pending = [i for i, result in enumerate(results) if result is None]
+        if pending:
+            if max_concurrency is None:
+                max_concurrency = AsyncAPIAdapter.max_concurrency
+            for i in pending:
+                record_prompt(task, messages_list[i])
+            fetched = await get_async_client().chat_batch(
+                [messages_list[i] for i in pending],
+                data,
+                max_concurrency=max_concurrency,
+                deadline=task_profiles.task_deadline(task),
+                task=task
+            )
+            llm_cache.store([keys[i] for i in pending], fetched)
+            for i, result in zip(pending, fetched):
+                results[i] = result
+        return APIAdapter._wrap_results(results)
+
+    @staticmethod
+    async def generate_stream(prompt, sampling_params, task=None):
+        messages = to_messages(prompt)
+        data, keys, results = llm_cache.lookup(task, [messages], APIAdapter._sampling_data(sampling_params, task))
+        if results[0] is not None:
+            yield results[0]
+            return
+
+        record_prompt(task, messages)
+        pieces = []
+        async for delta in get_async_client().chat_stream(messages, data, task=task):
+            pieces.append(delta)
+            yield delta
+        llm_cache.store(keys, ["".join(pieces)])
+
+    @staticmethod
+    async def top_logprobs(prompt, sampling_params, task=None):
+        messages = to_messages(prompt)
+        data = llm_classify.logprob_params(APIAdapter._sampling_data(sampling_params, task))
+        data, keys, results = llm_cache.lookup(task, [messages], data)
+        if results[0] is not None:
+            return json.loads(results[0])
+        record_prompt(task, messages)
+        top = await get_async_client().chat_logprobs(messages, data, task=task)
+        llm_cache.store(keys, [json.dumps(top, ensure_ascii=False)])
+        return top
+
+
+class DummyTokenizer:
+    @staticmethod
+    def apply_chat_template(messages, tokenize=False, add_generation_prompt=True):
+        """模拟原tokenizer的模板生成逻辑（仅供旧调用方式使用，访谈函数已直接传 ChatPrompt）"""
+        return ChatPrompt(messages).to_template_text(add_generation_prompt)
+
+
+class SamplingParams:
+    def __init__(self, 
+                 temperature=0.6,
+                 top_p=0.9,
+                 repetition_penalty=1.02,
+                 max_tokens=512):
+        self.temperature = temperature
+        self.top_p = top_p
+        self.repetition_penalty = repetition_penalty
+        self.max_tokens = max_tokens
@@ -0,0 +1,177 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+import tracing
+
+###########################
+# 缓存配置
+###########################
+CACHE_ENABLED = os.environ.get("INTERVIEW_CACHE", "1") != "0"
+CACHE_MAX_ENTRIES = int(os.environ.get("INTERVIEW_CACHE_MAX_ENTRIES", "2048"))
+# 按回复文本的 UTF-8 字节数粗略限制内存占用
+CACHE_MAX_BYTES = int(os.environ.get("INTERVIEW_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+CACHE_TTL = float(os.environ.get("INTERVIEW_CACHE_TTL", "3600"))
+
+# 可缓存的请求会固定 seed 发给 vLLM：同样的 prompt + 参数 + seed 得到的就是同一个采样结果，
+# 因此缓存里的回答与重新请求的回答等价，而不是“随机抽中的某一次”
+CACHE_SEED = int(os.environ.get("INTERVIEW_CACHE_SEED", "2024"))
+
+# 各任务是否允许缓存（按任务名逐个开启）
+CACHEABLE_TASKS = {
+    # 生成类：只依赖大纲 / 话题，对同一份大纲的所有受访者都相同
+    "background_question": True,
+    "transition": True,
+    "analysis": True,
+    # 分类类：同一问答对的判断可以复用
+    "check_unanswerable": True,
+    "evaluate_response": True,
+    "assess_turn": True,
+    # 依赖受访者的具体回答或整段对话，每次都重新生成
+    "deeper_question": False,
+    "unanswerable_followup": False,
+    "transcript_digest": False,
+    "final_summary": False,
+}
+
+
+def is_cacheable(task):
+    return CACHE_ENABLED and CACHEABLE_TASKS.get(task, False)
+
+
+def seeded_params(params):
+    """给可缓存的请求加上固定 seed（确定性模式）"""
+    return {**params, "seed": CACHE_SEED}
+
+
+def normalize_messages(messages):
+    """统一换行符、去掉每行首尾空白，避免 \r\n 或多余空格造成缓存未命中"""
+    normalized = []
+    for msg in messages:
+        content = msg["content"].replace("\r\n", "\n").replace("\r", "\n")
+        content = "\n".join(line.strip() for line in content.strip().split("\n"))
+        normalized.append({"role": msg["role"], "content": content})
+    return normalized
+
+
+def make_cache_key(messages, params):
+    """缓存键 = 规范化后的 messages + 采样参数 的哈希"""
+    raw = json.dumps(
+        {"messages": normalize_messages(messages), "params": params},
+        ensure_ascii=False,
+        sort_keys=True
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+###########################
+# LRU + TTL 缓存
+###########################
+class ResponseCache:
+    """
+    进程内的回复缓存：
+      - 按最近使用顺序淘汰（LRU），同时受条目数和总字节数限制
+      - 每条记录有过期时间（TTL），过期后视为未命中
+      - 线程安全，记录命中 / 未命中 / 淘汰 / 过期次数
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES, ttl=CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (过期时间, 回复文本, 字节数)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value, size = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self._bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[key] = (time.monotonic() + self.ttl, value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+_response_cache = ResponseCache()
+
+
+def get_response_cache():
+    """进程内共享的回复缓存"""
+    return _response_cache
+
+
+###########################
+# 适配层使用的辅助函数
+###########################
+def lookup(task, messages_list, params):
+    """
+    批量查缓存，返回 (实际请求参数, 缓存键列表, 结果列表)：
+      - 可缓存任务的请求参数会带上固定 seed
+      - 不可缓存的任务缓存键为 None；未命中的位置结果为 None
+    """
+    if not is_cacheable(task):
+        return params, [None] * len(messages_list), [None] * len(messages_list)
+    params = seeded_params(params)
+    cache = get_response_cache()
+    with tracing.span("cache.lookup", task=task) as span:
+        keys = [make_cache_key(messages, params) for messages in messages_list]
+        results = [cache.get(key) for key in keys]
+        span.set_attributes(requests=len(keys), hits=sum(result is not None for result in results))
+    return params, keys, results
+
+
+def store(keys, results):
+    """把成功的回复写回缓存；失败的结果（异常对象）不缓存"""
+    cache = get_response_cache()
+    for key, result in zip(keys, results):
+        if key is not None and isinstance(result, str):
+            cache.put(key, result)
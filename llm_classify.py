@@ -0,0 +1,124 @@
+import os
+import re
+import json
+import math
+
+###########################
+# 分类模式配置
+###########################
+# logprobs：只解码 1 个 token，按各标签首 token 的概率打分；generate：生成文本后解析标签
+CLASSIFY_MODE = os.environ.get("INTERVIEW_CLASSIFY_MODE", "logprobs")
+# 每次返回的候选 token 数（vLLM 默认上限为 20）
+TOP_LOGPROBS = int(os.environ.get("INTERVIEW_TOP_LOGPROBS", "10"))
+
+# 接口以不可重试的错误拒绝过 logprobs 请求后置为 False，进程内之后的分类直接走生成模式
+_logprobs_supported = True
+
+
+class Decision(str):
+    """
+    分类结果：本身就是标签字符串，可以直接和 "YES"、"ENOUGH" 等比较；
+    另带 confidence（所选标签的概率，文本解析得到时为 None）和 scores（每个标签的概率）。
+    概率以返回的全部候选 token 为分母：首 token 大多落在标签之外时 confidence 也低，调用方可以按阈值决定是否采信。
+    """
+
+    def __new__(cls, label, confidence=None, scores=None):
+        decision = super().__new__(cls, label)
+        decision.confidence = confidence
+        decision.scores = scores or {}
+        return decision
+
+    @property
+    def label(self):
+        return str(self)
+
+    def __repr__(self):
+        return f"Decision({str(self)!r}, confidence={self.confidence!r})"
+
+
+def use_logprobs():
+    """是否按 logprobs 模式分类：配置为 logprobs，且接口没有拒绝过 logprobs 请求"""
+    return CLASSIFY_MODE == "logprobs" and _logprobs_supported
+
+
+def mark_logprobs_unsupported():
+    """接口不支持 logprobs（请求被不可重试的错误拒绝）：之后不再尝试，避免每次分类都多一次往返"""
+    global _logprobs_supported
+    _logprobs_supported = False
+
+
+def logprob_params(data, top_logprobs=TOP_LOGPROBS):
+    """
+    把普通请求参数改成单步打分请求：贪心解码 1 个 token 并返回 top_logprobs。
+    不带 guided_choice / stop：需要的是模型原始的候选分布。
+    """
+    data = {k: v for k, v in data.items() if k not in ("stop", "guided_choice", "guided_json")}
+    data.update(max_tokens=1, temperature=0.0, logprobs=True, top_logprobs=top_logprobs)
+    return data
+
+
+def _normalize_token(token):
+    return token.strip().strip("'\"`*").upper()
+
+
+def score_labels(top_logprobs, labels):
+    """
+    按首 token 给各标签打分：候选 token 是某个标签的前缀（如 "SUR" 之于 "SURFACE"）就把它的概率计入该标签；
+    同时是多个标签前缀的 token 无法区分，忽略。没有任何候选对应到标签时返回 None。
+    分母是全部候选的概率之和（含对应不到标签的 token），例如首 token "I" 占 0.9、"NO" 占 0.01 时
+    NO 的 confidence 约为 0.01 而不是 1。
+    """
+    mass = {label: 0.0 for label in labels}
+    total = 0.0
+    for token, logprob in top_logprobs:
+        prob = math.exp(logprob)
+        total += prob
+        normalized = _normalize_token(token)
+        if not normalized:
+            continue
+        matched = [label for label in labels if label.startswith(normalized)]
+        if len(matched) == 1:
+            mass[matched[0]] += prob
+
+    if sum(mass.values()) <= 0:
+        return None
+    scores = {label: value / total for label, value in mass.items()}
+    best = max(labels, key=lambda label: scores[label])
+    return Decision(best, confidence=scores[best], scores=scores)
+
+
+def parse_label(text, labels, default):
+    """
+    从生成的文本中取出最先出现的标签（前后不能紧挨字母，避免 "NOT" 被当成 "NO"）。
+    "NO, YES..." 取 NO；一个标签都没有时返回 default。
+    """
+    text = text.upper()
+    found = None
+    for label in labels:
+        match = re.search(rf"(?<![A-Z]){re.escape(label)}(?![A-Z])", text)
+        if match and (found is None or match.start() < found[0]):
+            found = (match.start(), label)
+    return Decision(found[1] if found else default)
+
+
+def parse_turn_assessment(text, depth_labels):
+    """
+    解析 assess_turn 输出的 JSON：{"unwilling": bool, "depth": 标签, "confidence": 0~1}。
+    允许外面包着 ```json 代码块；字段缺失或取值不对时返回 None。
+    """
+    match = re.search(r"\{.*\}", text, re.DOTALL)
+    if not match:
+        return None
+    try:
+        data = json.loads(match.group(0))
+        confidence = float(data.get("confidence", 0.0))
+    except (ValueError, TypeError, AttributeError):
+        return None
+    depth = str(data.get("depth", "")).upper()
+    if depth not in depth_labels or not isinstance(data.get("unwilling"), bool):
+        return None
+    return {
+        "unwilling": data["unwilling"],
+        "depth": depth,
+        "confidence": min(1.0, max(0.0, confidence)),
+    }
@@ -0,0 +1,721 @@
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, TimeoutError as FutureTimeoutError, wait
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+from llm_router import EndpointRouter
+from llm_metrics import CallRecord, error_status
+from tracing import bind_context
+
+###########################
+# API 连接配置
+###########################
+API_URL = os.environ.get("INTERVIEW_API_URL", "http://10.77.110.129:8000/v1/chat/completions")
+# 多个 vLLM 节点时用逗号分隔，请求按 llm_router 的策略在节点间分发；未设置时只用 API_URL
+API_URLS = [
+    url.strip()
+    for url in os.environ.get("INTERVIEW_API_URLS", API_URL).split(",")
+    if url.strip()
+]
+HEADERS = {"Content-Type": "application/json"}
+MODEL_NAME = os.environ.get(
+    "INTERVIEW_MODEL_NAME",
+    "/home/zhangyuheng/.cache/modelscope/hub/Qwen/Qwen2.5-7B-Instruct"
+)
+
+# 建连超时与读超时分开设置：建连很快就该完成，生成则可能需要较长时间
+CONNECT_TIMEOUT = float(os.environ.get("INTERVIEW_CONNECT_TIMEOUT", "3.05"))
+READ_TIMEOUT = float(os.environ.get("INTERVIEW_READ_TIMEOUT", "30"))
+
+# 连接池大小：pool_connections 为缓存的主机数，pool_maxsize 为每个主机保留的长连接数
+POOL_CONNECTIONS = int(os.environ.get("INTERVIEW_POOL_CONNECTIONS", "4"))
+POOL_MAXSIZE = int(os.environ.get("INTERVIEW_POOL_MAXSIZE", "32"))
+
+# 批量请求时的最大并发数（不应超过 POOL_MAXSIZE，否则多出的请求拿不到长连接）
+MAX_CONCURRENCY = int(os.environ.get("INTERVIEW_MAX_CONCURRENCY", "8"))
+
+# 重试与截止时间：一次调用（含所有重试）最多耗时 CALL_DEADLINE 秒
+MAX_ATTEMPTS = int(os.environ.get("INTERVIEW_MAX_ATTEMPTS", "3"))
+BACKOFF_BASE = float(os.environ.get("INTERVIEW_BACKOFF_BASE", "0.25"))
+BACKOFF_MAX = float(os.environ.get("INTERVIEW_BACKOFF_MAX", "4"))
+CALL_DEADLINE = float(os.environ.get("INTERVIEW_CALL_DEADLINE", "45"))
+
+# 对冲请求：第一个请求超过观测到的 p95 延迟仍未返回时，再发一份相同请求，取先返回的
+HEDGE_ENABLED = os.environ.get("INTERVIEW_HEDGE", "0") == "1"
+HEDGE_MIN_SAMPLES = int(os.environ.get("INTERVIEW_HEDGE_MIN_SAMPLES", "20"))
+HEDGE_MIN_DELAY = float(os.environ.get("INTERVIEW_HEDGE_MIN_DELAY", "0.05"))
+
+# 流式请求带上 stream_options.include_usage，让服务端在最后一个分片里返回 usage（较老的后端不支持时设为 0）
+STREAM_USAGE = os.environ.get("INTERVIEW_STREAM_USAGE", "1") != "0"
+
+# 这些状态码说明服务端暂时不可用，值得重试；其余 4xx 重试也不会成功
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """LLM 接口调用失败（连接异常或非 200 状态码）"""
+
+    def __init__(self, message, status_code=None, retryable=None, endpoint=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.endpoint = endpoint  # 出错的节点地址，重试时尽量换一个节点
+        if retryable is None:
+            # 连接 / 超时类错误（没有状态码）以及 5xx、429 等可以重试
+            retryable = status_code is None or status_code in RETRYABLE_STATUS
+        self.retryable = retryable
+
+
+class RetryPolicy:
+    """指数退避 + 全抖动（full jitter）：第 n 次重试前等待 uniform(0, min(max, base * 2^n)) 秒"""
+
+    def __init__(self, max_attempts=MAX_ATTEMPTS, base_delay=BACKOFF_BASE, max_delay=BACKOFF_MAX):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class LatencyTracker:
+    """记录最近若干次成功请求的耗时，按 max_tokens 分桶估计 p95（生成长度不同，延迟分布差别很大）"""
+
+    def __init__(self, window=200):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, bucket, seconds):
+        with self._lock:
+            samples = self._samples.get(bucket)
+            if samples is None:
+                samples = self._samples[bucket] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def percentile(self, bucket, q=0.95, min_samples=HEDGE_MIN_SAMPLES):
+        """样本不足时返回 None"""
+        with self._lock:
+            samples = sorted(self._samples.get(bucket, ()))
+        if len(samples) < min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+###########################
+# 带连接池的客户端
+###########################
+class _BaseLLMClient:
+    """同步/异步客户端共用的配置、重试策略与请求体、响应体处理"""
+
+    def __init__(self,
+                 api_url=None,
+                 api_urls=None,
+                 router=None,
+                 model_name=MODEL_NAME,
+                 connect_timeout=CONNECT_TIMEOUT,
+                 read_timeout=READ_TIMEOUT,
+                 pool_connections=POOL_CONNECTIONS,
+                 pool_maxsize=POOL_MAXSIZE,
+                 retry_policy=None,
+                 call_deadline=CALL_DEADLINE,
+                 hedge=HEDGE_ENABLED):
+        if router is None:
+            # 未指定地址时与其他客户端共用默认路由器，节点健康状态在进程内共享
+            if api_url is None and api_urls is None:
+                router = get_router()
+            else:
+                router = EndpointRouter(api_urls or [api_url])
+        self.router = router
+        self.api_url = router.endpoints[0].url
+        self.model_name = model_name
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.call_deadline = call_deadline
+        self.hedge = hedge
+        self.latency = LatencyTracker()
+        self.retries = 0
+        self.hedged_requests = 0
+        self._session = None
+
+    def build_payload(self, messages, params):
+        """拼装请求体，params 为采样参数字典"""
+        return {
+            "model": self.model_name,
+            "messages": messages,
+            **params
+        }
+
+    def build_stream_payload(self, messages, params):
+        data = self.build_payload(messages, {**params, "stream": True})
+        if STREAM_USAGE:
+            data["stream_options"] = {"include_usage": True}
+        return data
+
+    @staticmethod
+    def extract_content(body):
+        """从 chat-completions 响应体中取出回复文本"""
+        try:
+            return body["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError) as e:
+            raise LLMError(f"malformed response: {e!r}", retryable=False) from e
+
+    @staticmethod
+    def extract_top_logprobs(body):
+        """
+        从请求了 logprobs / top_logprobs 的响应中取出第一个生成位置的候选，
+        返回 [(token, logprob), ...]（按接口返回的顺序）
+        """
+        try:
+            candidates = body["choices"][0]["logprobs"]["content"][0]["top_logprobs"]
+            return [(item["token"], item["logprob"]) for item in candidates]
+        except (KeyError, IndexError, TypeError) as e:
+            raise LLMError(f"response has no logprobs: {e!r}", retryable=False) from e
+
+    @staticmethod
+    def parse_stream_event(line):
+        """
+        解析流式响应（SSE）中的一行，返回 (是否结束, 增量文本, 该分片携带的 usage)。
+        非 data 行（空行、注释、event 行）返回 (False, "", None)；分片不是合法的 JSON 时抛出 LLMError。
+        """
+        try:
+            if isinstance(line, bytes):
+                line = line.decode("utf-8")
+            line = line.strip()
+            if not line.startswith("data:"):
+                return False, "", None
+            payload = line[len("data:"):].strip()
+            if payload == "[DONE]":
+                return True, "", None
+            chunk = json.loads(payload)
+            choices = chunk.get("choices") or [{}]
+            delta = choices[0].get("delta") or {}
+            return False, delta.get("content") or "", chunk.get("usage")
+        except (ValueError, AttributeError, TypeError, IndexError) as e:
+            raise LLMError(f"malformed stream chunk: {e!r}", retryable=False) from e
+
+    def _stop_at(self, deadline):
+        return time.monotonic() + (deadline if deadline is not None else self.call_deadline)
+
+    def _next_backoff(self, error, attempt, stop_at):
+        """
+        判断失败后是否还要重试：返回需要等待的秒数，不再重试时返回 None。
+        不可重试的错误、次数用尽、或等待后会超过截止时间，都不再重试。
+        """
+        if not error.retryable or attempt >= self.retry_policy.max_attempts:
+            return None
+        delay = self.retry_policy.backoff(attempt)
+        if time.monotonic() + delay >= stop_at:
+            return None
+        self.retries += 1
+        return delay
+
+    @staticmethod
+    def _tag_endpoint(error, endpoint):
+        if error.endpoint is None:
+            error.endpoint = endpoint.url
+        return error
+
+    def _hedge_delay(self, data, remaining):
+        """开启对冲且样本足够时，返回发出备份请求前等待的秒数；否则返回 None"""
+        if not self.hedge:
+            return None
+        p95 = self.latency.percentile(data.get("max_tokens"))
+        if p95 is None:
+            return None
+        delay = max(p95, HEDGE_MIN_DELAY)
+        return delay if delay < remaining else None
+
+
+class LLMClient(_BaseLLMClient):
+    """
+    chat-completions 接口的共享客户端：
+      - 内部持有一个 keep-alive 的 requests.Session，并挂载带连接池的 HTTPAdapter
+      - urllib3 连接池本身是线程安全的，多个 Streamlit 会话可共用同一个客户端
+      - 建连超时与读超时分开配置
+      - 可重试的错误按抖动指数退避重试，整次调用受 call_deadline 限制；可选对冲请求
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._lock = threading.Lock()
+        self._hedge_executor = None
+
+    @property
+    def session(self):
+        """懒加载 Session，保证并发首次调用时只创建一个"""
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(
+                        pool_connections=max(self.pool_connections, len(self.router.endpoints)),
+                        pool_maxsize=self.pool_maxsize
+                    )
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    session.headers.update(HEADERS)
+                    self._session = session
+        return self._session
+
+    def _timeout(self, remaining):
+        return (min(self.connect_timeout, remaining), min(self.read_timeout, remaining))
+
+    def _post_once(self, url, data, remaining, stream=False):
+        """向指定节点发一次请求（不重试），返回 200 的 response；失败时抛出 LLMError"""
+        try:
+            response = self.session.post(
+                url,
+                json=data,
+                timeout=self._timeout(remaining),
+                stream=stream
+            )
+        except requests.RequestException as e:
+            raise LLMError(str(e)) from e
+        if response.status_code != 200:
+            response.close()
+            raise LLMError(f"status {response.status_code}", status_code=response.status_code)
+        return response
+
+    def _complete_once(self, endpoint, data, remaining, extract, record=None):
+        """
+        在 router.acquire() 选出的节点上完成一次请求，结束后向路由器报告成败；extract 从响应体中取结果。
+        record（llm_metrics.CallRecord）记下成功的节点和响应中的 usage。
+        """
+        started = time.monotonic()
+        failed = False
+        try:
+            response = self._post_once(endpoint.url, data, remaining)
+            try:
+                body = response.json()
+            except ValueError as e:
+                raise LLMError(f"invalid json: {e}") from e
+            content = extract(body)
+        except LLMError as e:
+            failed = e.retryable
+            raise self._tag_endpoint(e, endpoint)
+        finally:
+            self.router.release(endpoint, failed)
+        self.latency.record(data.get("max_tokens"), time.monotonic() - started)
+        if record is not None:
+            record.endpoint = endpoint.url
+            record.usage(body.get("usage"))
+        return content
+
+    def _complete_hedged(self, data, remaining, hedge_delay, exclude, extract, record=None):
+        """先发主请求；超过 hedge_delay 仍未返回就向另一个节点再发一份，取先成功的结果"""
+        if self._hedge_executor is None:
+            with self._lock:
+                if self._hedge_executor is None:
+                    self._hedge_executor = ThreadPoolExecutor(
+                        max_workers=self.pool_maxsize, thread_name_prefix="llm-hedge"
+                    )
+        endpoint = self.router.acquire(exclude)
+        primary = self._hedge_executor.submit(self._complete_once, endpoint, data, remaining, extract, record)
+        try:
+            return primary.result(timeout=hedge_delay)
+        except FutureTimeoutError:
+            pass
+
+        self.hedged_requests += 1
+        backup = self._hedge_executor.submit(
+            self._complete_once,
+            self.router.acquire({endpoint.url, *exclude}),
+            data,
+            remaining - hedge_delay,
+            extract,
+            record
+        )
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    return future.result()
+                except LLMError as e:
+                    error = e
+        raise error
+
+    def chat(self, messages, params, deadline=None, task=None, queued_at=None):
+        """
+        发送一次对话请求并返回回复文本；失败时抛出 LLMError。
+        deadline 为整次调用（含重试、对冲）的最长耗时，默认 call_deadline。
+        task 为调用方的任务名，queued_at 为调用被提交的时间（批量调用时用来计算排队时间），只用于指标。
+        """
+        record = CallRecord(task, queued_at)
+        return self._request(self.build_payload(messages, params), deadline, self.extract_content, record)
+
+    def chat_logprobs(self, messages, params, deadline=None, task=None):
+        """
+        发送一次请求并返回第一个生成位置的候选 token 及其对数概率 [(token, logprob), ...]。
+        params 中应带上 logprobs=True、top_logprobs=k（通常配合 max_tokens=1），重试语义同 chat。
+        """
+        record = CallRecord(task)
+        return self._request(self.build_payload(messages, params), deadline, self.extract_top_logprobs, record)
+
+    def _request(self, data, deadline, extract, record):
+        stop_at = self._stop_at(deadline)
+        attempt = 0
+        exclude = ()
+        record.start()
+        while True:
+            remaining = stop_at - time.monotonic()
+            if remaining <= 0:
+                record.finish("deadline")
+                raise LLMError("deadline exceeded")
+            try:
+                hedge_delay = self._hedge_delay(data, remaining)
+                if hedge_delay is None:
+                    result = self._complete_once(self.router.acquire(exclude), data, remaining, extract, record)
+                else:
+                    result = self._complete_hedged(data, remaining, hedge_delay, exclude, extract, record)
+                record.finish("ok")
+                return result
+            except LLMError as e:
+                exclude = (e.endpoint,)
+                attempt += 1
+                delay = self._next_backoff(e, attempt, stop_at)
+                if delay is None:
+                    record.finish(error_status(e), e.endpoint)
+                    raise
+                record.retry()
+                time.sleep(delay)
+
+    def chat_stream(self, messages, params, deadline=None, task=None):
+        """
+        以 stream=True 请求接口，逐段产出增量文本；失败时抛出 LLMError。
+        只在拿到第一段文本之前重试（已经显示给用户的内容无法撤回），流式请求不做对冲。
+        """
+        data = self.build_stream_payload(messages, params)
+        stop_at = self._stop_at(deadline)
+        attempt = 0
+        exclude = ()
+        record = CallRecord(task)
+        record.start()
+        while True:
+            remaining = stop_at - time.monotonic()
+            if remaining <= 0:
+                record.finish("deadline")
+                raise LLMError("deadline exceeded")
+            endpoint = self.router.acquire(exclude)
+            try:
+                response = self._post_once(endpoint.url, data, remaining, stream=True)
+                break
+            except LLMError as e:
+                self.router.release(endpoint, e.retryable)
+                exclude = (endpoint.url,)
+                attempt += 1
+                delay = self._next_backoff(e, attempt, stop_at)
+                if delay is None:
+                    record.finish(error_status(e), endpoint.url)
+                    raise self._tag_endpoint(e, endpoint)
+                record.retry()
+                time.sleep(delay)
+
+        failed = False
+        completed = False
+        try:
+            with response:
+                try:
+                    # 读到 [DONE] 后不提前 break，把响应读完才能让连接回到连接池
+                    for line in response.iter_lines():
+                        done, text, usage = self.parse_stream_event(line)
+                        record.usage(usage)
+                        if text and not done:
+                            record.first_token()
+                            yield text
+                    completed = True
+                except requests.RequestException as e:
+                    failed = True
+                    record.finish("error", endpoint.url)
+                    raise LLMError(str(e), endpoint=endpoint.url) from e
+                except LLMError as e:
+                    # 分片解析失败
+                    record.finish(error_status(e), endpoint.url)
+                    raise self._tag_endpoint(e, endpoint)
+        finally:
+            self.router.release(endpoint, failed)
+            # 调用方提前关闭生成器时记为 cancelled
+            record.finish("ok" if completed else "cancelled", endpoint.url)
+
+    def chat_batch(self, messages_list, params, max_concurrency=MAX_CONCURRENCY, deadline=None, task=None):
+        """
+        并发发送多组对话，结果按输入顺序返回。
+        单条失败不影响其他条目：失败的位置上放的是对应的异常对象而不是文本。
+        deadline 作用于每一条（超时的那条放 LLMError，不影响其他条目）。
+        """
+        queued_at = time.monotonic()
+
+        def run_one(messages):
+            try:
+                return self.chat(messages, params, deadline=deadline, task=task, queued_at=queued_at)
+            except Exception as e:
+                return e
+
+        if len(messages_list) <= 1 or max_concurrency <= 1:
+            return [run_one(messages) for messages in messages_list]
+
+        workers = min(max_concurrency, len(messages_list))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(bind_context(run_one), messages_list))
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+            if self._hedge_executor is not None:
+                self._hedge_executor.shutdown(wait=False)
+                self._hedge_executor = None
+
+
+_default_router = None
+_default_router_lock = threading.Lock()
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_router():
+    """进程内共享的默认路由器（节点列表来自 API_URLS），同步和异步客户端共用同一份健康状态"""
+    global _default_router
+    if _default_router is None:
+        with _default_router_lock:
+            if _default_router is None:
+                _default_router = EndpointRouter(API_URLS)
+    return _default_router
+
+
+def get_client():
+    """进程内共享的默认客户端（单例）"""
+    global _default_client
+    if _default_client is None:
+        with _default_client_lock:
+            if _default_client is None:
+                _default_client = LLMClient()
+    return _default_client
+
+
+###########################
+# 异步客户端（aiohttp）
+###########################
+class AsyncLLMClient(_BaseLLMClient):
+    """
+    非阻塞版本的客户端，配置项与重试 / 对冲语义与 LLMClient 相同。
+    aiohttp 的 ClientSession 绑定创建它的事件循环，因此应通过 get_async_client()
+    按事件循环取用实例，而不是跨循环共享。
+    """
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_maxsize * len(self.router.endpoints),
+                limit_per_host=self.pool_maxsize
+            )
+            timeout = aiohttp.ClientTimeout(
+                sock_connect=self.connect_timeout,
+                sock_read=self.read_timeout
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=timeout,
+                headers=HEADERS
+            )
+        return self._session
+
+    async def _complete_once(self, endpoint, data, remaining, extract, record=None):
+        """在 router.acquire() 选出的节点上完成一次请求，结束后向路由器报告成败（被取消不算失败）"""
+        started = time.monotonic()
+        session = self._get_session()
+        failed = False
+        try:
+            async with session.post(endpoint.url, json=data, timeout=aiohttp.ClientTimeout(
+                    total=remaining, sock_connect=self.connect_timeout, sock_read=self.read_timeout)) as response:
+                if response.status != 200:
+                    raise LLMError(f"status {response.status}", status_code=response.status)
+                body = await response.json(content_type=None)
+            content = extract(body)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            failed = True
+            raise LLMError(str(e) or type(e).__name__, endpoint=endpoint.url) from e
+        except LLMError as e:
+            failed = e.retryable
+            raise self._tag_endpoint(e, endpoint)
+        finally:
+            self.router.release(endpoint, failed)
+        self.latency.record(data.get("max_tokens"), time.monotonic() - started)
+        if record is not None:
+            record.endpoint = endpoint.url
+            record.usage(body.get("usage"))
+        return content
+
+    async def _complete_hedged(self, data, remaining, hedge_delay, exclude, extract, record=None):
+        """先发主请求；超过 hedge_delay 仍未返回就向另一个节点再发一份，取先成功的结果并取消另一个"""
+        endpoint = self.router.acquire(exclude)
+        primary = asyncio.ensure_future(self._complete_once(endpoint, data, remaining, extract, record))
+        done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+        if done:
+            return primary.result()
+
+        self.hedged_requests += 1
+        backup = asyncio.ensure_future(self._complete_once(
+            self.router.acquire({endpoint.url, *exclude}), data, remaining - hedge_delay, extract, record
+        ))
+        pending = {primary, backup}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        return task.result()
+                    except LLMError as e:
+                        error = e
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def chat(self, messages, params, deadline=None, task=None, queued_at=None):
+        """发送一次对话请求并返回回复文本；失败时抛出 LLMError（重试、截止时间、指标同 LLMClient.chat）"""
+        record = CallRecord(task, queued_at)
+        return await self._request(self.build_payload(messages, params), deadline, self.extract_content, record)
+
+    async def chat_logprobs(self, messages, params, deadline=None, task=None):
+        """LLMClient.chat_logprobs 的异步版本"""
+        record = CallRecord(task)
+        return await self._request(self.build_payload(messages, params), deadline, self.extract_top_logprobs, record)
+
+    async def _request(self, data, deadline, extract, record):
+        stop_at = self._stop_at(deadline)
+        attempt = 0
+        exclude = ()
+        record.start()
+        while True:
+            remaining = stop_at - time.monotonic()
+            if remaining <= 0:
+                record.finish("deadline")
+                raise LLMError("deadline exceeded")
+            try:
+                hedge_delay = self._hedge_delay(data, remaining)
+                if hedge_delay is None:
+                    result = await self._complete_once(self.router.acquire(exclude), data, remaining, extract, record)
+                else:
+                    result = await self._complete_hedged(data, remaining, hedge_delay, exclude, extract, record)
+                record.finish("ok")
+                return result
+            except LLMError as e:
+                exclude = (e.endpoint,)
+                attempt += 1
+                delay = self._next_backoff(e, attempt, stop_at)
+                if delay is None:
+                    record.finish(error_status(e), e.endpoint)
+                    raise
+                record.retry()
+                await asyncio.sleep(delay)
+
+    async def chat_stream(self, messages, params, deadline=None, task=None):
+        """LLMClient.chat_stream 的异步版本（异步生成器），同样只在第一段文本之前重试"""
+        data = self.build_stream_payload(messages, params)
+        stop_at = self._stop_at(deadline)
+        session = self._get_session()
+        attempt = 0
+        exclude = ()
+        record = CallRecord(task)
+        record.start()
+        while True:
+            remaining = stop_at - time.monotonic()
+            if remaining <= 0:
+                record.finish("deadline")
+                raise LLMError("deadline exceeded")
+            yielded = False
+            completed = False
+            error = None
+            endpoint = self.router.acquire(exclude)
+            try:
+                async with session.post(endpoint.url, json=data, timeout=aiohttp.ClientTimeout(
+                        total=remaining, sock_connect=self.connect_timeout, sock_read=self.read_timeout)) as response:
+                    if response.status != 200:
+                        raise LLMError(f"status {response.status}", status_code=response.status)
+                    async for line in response.content:
+                        done, text, usage = self.parse_stream_event(line)
+                        record.usage(usage)
+                        if text and not done:
+                            yielded = True
+                            record.first_token()
+                            yield text
+                    completed = True
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = LLMError(str(e) or type(e).__name__)
+            except LLMError as e:
+                error = e
+            finally:
+                # 正常读完、调用方提前关闭生成器都不算节点失败
+                self.router.release(endpoint, error is not None and error.retryable)
+                if error is None:
+                    record.finish("ok" if completed else "cancelled", endpoint.url)
+            if error is None:
+                return
+            self._tag_endpoint(error, endpoint)
+            exclude = (endpoint.url,)
+            if yielded:
+                record.finish(error_status(error), endpoint.url)
+                raise error
+            attempt += 1
+            delay = self._next_backoff(error, attempt, stop_at)
+            if delay is None:
+                record.finish(error_status(error), endpoint.url)
+                raise error
+            record.retry()
+            await asyncio.sleep(delay)
+
+    async def chat_batch(self, messages_list, params, max_concurrency=MAX_CONCURRENCY, deadline=None, task=None):
+        """与 LLMClient.chat_batch 语义一致：按输入顺序返回，失败的位置放异常对象"""
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        queued_at = time.monotonic()
+
+        async def run_one(messages):
+            async with semaphore:
+                return await self.chat(messages, params, deadline=deadline, task=task, queued_at=queued_at)
+
+        return await asyncio.gather(
+            *(run_one(messages) for messages in messages_list),
+            return_exceptions=True
+        )
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client():
+    """当前事件循环共享的异步客户端（每个循环一个实例）"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = AsyncLLMClient()
+        _async_clients[loop] = client
+    return client
+
+
+async def close_async_client():
+    """关闭当前事件循环的异步客户端；用 asyncio.run 驱动时应在退出前调用"""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
+
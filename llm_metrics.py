@@ -0,0 +1,286 @@
+import os
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import tracing
+
+###########################
+# 指标配置
+###########################
+# 设置后在该端口提供 Prometheus 文本格式的 /metrics（命令行和 Streamlit 进程各自启动，端口被占用时跳过）
+METRICS_PORT = os.environ.get("INTERVIEW_METRICS_PORT", "")
+METRICS_HOST = os.environ.get("INTERVIEW_METRICS_HOST", "0.0.0.0")
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+
+class _Metric:
+    """一个指标族：按标签值分别累计，标签名在创建时固定"""
+
+    type_name = None
+
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def _format_labels(self, key, extra=()):
+        pairs = list(zip(self.label_names, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return dict(self._values)
+
+    def render(self):
+        return [f"{self.name}{self._format_labels(key)} {_number(value)}" for key, value in sorted(self.samples().items())]
+
+
+class Histogram(_Metric):
+    """累积分桶的直方图（与 Prometheus 的 histogram 语义一致：各桶计数为 <= 上界的样本数）"""
+
+    type_name = "histogram"
+
+    def __init__(self, name, help_text, label_names, buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["buckets"][i] += 1
+            state["sum"] += value
+            state["count"] += 1
+
+    def samples(self):
+        with self._lock:
+            return {
+                key: {"buckets": list(state["buckets"]), "sum": state["sum"], "count": state["count"]}
+                for key, state in self._values.items()
+            }
+
+    def render(self):
+        lines = []
+        for key, state in sorted(self.samples().items()):
+            for bound, count in zip(self.buckets, state["buckets"]):
+                lines.append(f"{self.name}_bucket{self._format_labels(key, [('le', _number(bound))])} {count}")
+            lines.append(f"{self.name}_bucket{self._format_labels(key, [('le', '+Inf')])} {state['count']}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {_number(state['sum'])}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {state['count']}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, label_names=()):
+        return self.register(Counter(name, help_text, label_names))
+
+    def histogram(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help_text, label_names, buckets))
+
+    def render(self):
+        """Prometheus 文本格式（text/plain; version=0.0.4）"""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """{指标名: {标签值元组: 值}}，供基准测试等直接读取"""
+        with self._lock:
+            metrics = list(self._metrics)
+        return {metric.name: metric.samples() for metric in metrics}
+
+
+REGISTRY = MetricsRegistry()
+
+###########################
+# LLM 调用指标
+###########################
+LLM_REQUESTS = REGISTRY.counter(
+    "interview_llm_requests_total",
+    "LLM calls by task, endpoint and final status (ok, HTTP status code, error, deadline, cancelled)",
+    ("task", "endpoint", "status"))
+LLM_RETRIES = REGISTRY.counter(
+    "interview_llm_retries_total", "Retried attempts of LLM calls", ("task",))
+LLM_QUEUE_WAIT = REGISTRY.histogram(
+    "interview_llm_queue_wait_seconds", "Time a call waited for a concurrency slot before being sent", ("task",))
+LLM_TTFT = REGISTRY.histogram(
+    "interview_llm_ttft_seconds", "Time to first streamed token (streaming calls only)", ("task", "endpoint"))
+LLM_LATENCY = REGISTRY.histogram(
+    "interview_llm_latency_seconds", "Total LLM call latency including retries", ("task", "endpoint", "status"))
+LLM_PROMPT_TOKENS = REGISTRY.histogram(
+    "interview_llm_prompt_tokens", "Prompt tokens per call (from the usage block)", ("task",), TOKEN_BUCKETS)
+LLM_COMPLETION_TOKENS = REGISTRY.histogram(
+    "interview_llm_completion_tokens", "Completion tokens per call (from the usage block)", ("task",), TOKEN_BUCKETS)
+
+
+class CallRecord:
+    """
+    一次 LLM 调用（含重试、对冲）的记录，由 llm_client 在调用过程中填写，finish() 时写入上面的指标：
+      task        调用方的任务名（check_unanswerable、transition 等），未传时为 unknown
+      queued_at   调用被提交的时间（批量调用时为整批提交的时间），到 start() 之间为排队等待
+      endpoint    最终处理请求的节点
+      usage       响应中的 usage（prompt_tokens / completion_tokens）
+    开启追踪时，start() 到 finish() 之间同时记为一个 llm.<task> span（当前 span 的子 span）
+    """
+
+    def __init__(self, task=None, queued_at=None):
+        self.task = task or "unknown"
+        self.queued_at = queued_at if queued_at is not None else time.monotonic()
+        self.started_at = None
+        self.first_token_at = None
+        self.endpoint = ""
+        self.retries = 0
+        self.prompt_tokens = None
+        self.completion_tokens = None
+        self.status = None
+        self.span = tracing.NOOP_SPAN
+
+    def start(self):
+        self.started_at = time.monotonic()
+        LLM_QUEUE_WAIT.observe(self.started_at - self.queued_at, task=self.task)
+        self.span = tracing.span(f"llm.{self.task}", tracing.SPAN_KIND_CLIENT, task=self.task)
+
+    def retry(self):
+        self.retries += 1
+        LLM_RETRIES.inc(task=self.task)
+
+    def first_token(self):
+        if self.first_token_at is None:
+            self.first_token_at = time.monotonic()
+
+    def usage(self, usage):
+        if usage:
+            self.prompt_tokens = usage.get("prompt_tokens")
+            self.completion_tokens = usage.get("completion_tokens")
+
+    def finish(self, status="ok", endpoint=None):
+        """写入指标；同一条记录只写一次"""
+        if self.status is not None:
+            return
+        self.status = status
+        if endpoint:
+            self.endpoint = endpoint
+        started_at = self.started_at if self.started_at is not None else self.queued_at
+        LLM_REQUESTS.inc(task=self.task, endpoint=self.endpoint, status=status)
+        LLM_LATENCY.observe(time.monotonic() - started_at, task=self.task, endpoint=self.endpoint, status=status)
+        if self.first_token_at is not None:
+            LLM_TTFT.observe(self.first_token_at - started_at, task=self.task, endpoint=self.endpoint)
+        if self.prompt_tokens is not None:
+            LLM_PROMPT_TOKENS.observe(self.prompt_tokens, task=self.task)
+        if self.completion_tokens is not None:
+            LLM_COMPLETION_TOKENS.observe(self.completion_tokens, task=self.task)
+
+        self.span.set_attributes(
+            endpoint=self.endpoint, status=status, retries=self.retries,
+            queue_wait_s=started_at - self.queued_at,
+            ttft_s=self.first_token_at - started_at if self.first_token_at is not None else None,
+            prompt_tokens=self.prompt_tokens, completion_tokens=self.completion_tokens,
+        )
+        if status not in ("ok", "cancelled"):
+            self.span.set_error(status)
+        self.span.end()
+
+
+def error_status(error):
+    """LLMError 对应的 status 标签：有状态码时为状态码，截止时间用尽为 deadline，其余为 error"""
+    if getattr(error, "status_code", None) is not None:
+        return str(error.status_code)
+    if str(error) == "deadline exceeded":
+        return "deadline"
+    return "error"
+
+
+###########################
+# /metrics 导出
+###########################
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0].rstrip("/") != "/metrics":
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        data = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+_metrics_server = None
+_metrics_server_lock = threading.Lock()
+
+
+def start_metrics_server(port=None, host=METRICS_HOST):
+    """
+    在后台线程启动 /metrics 服务（进程内只启动一次，Streamlit 重复执行脚本时直接返回已有的）。
+    未传 port 时读取 INTERVIEW_METRICS_PORT，未配置则不启动；端口被占用时返回 None。
+    """
+    global _metrics_server
+    if port is None:
+        if not METRICS_PORT:
+            return None
+        port = int(METRICS_PORT)
+    if _metrics_server is None:
+        with _metrics_server_lock:
+            if _metrics_server is None:
+                try:
+                    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+                except OSError as e:
+                    print(f"[llm_metrics] 无法在端口 {port} 上启动 /metrics: {e}")
+                    return None
+                server.daemon_threads = True
+                threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+                _metrics_server = server
+    return _metrics_server
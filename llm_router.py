@@ -0,0 +1,207 @@
+import os
+import time
+import random
+import threading
+
+###########################
+# 路由配置
+###########################
+# least_outstanding：选当前在途请求最少的节点；p2c：随机取两个节点，选在途请求少的那个
+ROUTING_STRATEGY = os.environ.get("INTERVIEW_ROUTING", "least_outstanding")
+
+# 被动健康检查：同一节点连续失败 FAILURE_THRESHOLD 次后摘除（熔断），EJECT_COOLDOWN 秒后放一个探测请求
+FAILURE_THRESHOLD = int(os.environ.get("INTERVIEW_EJECT_FAILURES", "3"))
+EJECT_COOLDOWN = float(os.environ.get("INTERVIEW_EJECT_COOLDOWN", "10"))
+
+# 慢启动：节点恢复后的 SLOW_START 秒内权重从 SLOW_START_MIN_WEIGHT 线性升到 1，避免刚恢复就被打满
+SLOW_START = float(os.environ.get("INTERVIEW_SLOW_START", "30"))
+SLOW_START_MIN_WEIGHT = 0.1
+
+# 节点状态（熔断器的三种状态）
+HEALTHY = "healthy"    # 正常接收请求
+EJECTED = "ejected"    # 已摘除，冷却中
+PROBING = "probing"    # 冷却结束，只允许一个探测请求
+
+
+class Endpoint:
+    """一个 OpenAI 兼容接口节点及其被动健康状态"""
+
+    def __init__(self, url):
+        self.url = url
+        self.state = HEALTHY
+        self.outstanding = 0          # 在途请求数
+        self.consecutive_failures = 0
+        self.ejected_at = None
+        self.recovered_at = None      # 最近一次恢复的时间，慢启动期间不为 None
+        self.probe_in_flight = False
+        self.requests = 0
+        self.failures = 0
+        self.ejections = 0
+
+    def __repr__(self):
+        return f"Endpoint({self.url!r}, state={self.state}, outstanding={self.outstanding})"
+
+
+class Lease:
+    """
+    acquire() 的返回值：选中的节点，以及这个请求是不是该节点的探测请求，请求结束后交给 release()。
+    只有探测请求本身的结果决定节点是否恢复；全部节点都在探测中时发到探测节点上的普通请求不影响熔断状态。
+    """
+
+    def __init__(self, endpoint, probe=False):
+        self.endpoint = endpoint
+        self.probe = probe
+        self.released = False
+
+    @property
+    def url(self):
+        return self.endpoint.url
+
+    def __repr__(self):
+        return f"Lease({self.endpoint.url!r}, probe={self.probe})"
+
+
+class EndpointRouter:
+    """
+    在多个 vLLM 节点之间分发请求：
+      - acquire() 选出节点并计入在途请求，返回 Lease；请求结束后必须用它调用 release() 报告成败
+      - 连续失败的节点被摘除，冷却后用单个探测请求判断是否恢复，恢复后慢启动
+      - 所有节点都被摘除时不直接报错，而是提前探测最早被摘除的节点
+    clock / rng 可以注入，便于在测试里控制时间和随机选择。
+    """
+
+    def __init__(self, urls,
+                 strategy=ROUTING_STRATEGY,
+                 failure_threshold=FAILURE_THRESHOLD,
+                 cooldown=EJECT_COOLDOWN,
+                 slow_start=SLOW_START,
+                 clock=time.monotonic,
+                 rng=None):
+        if not urls:
+            raise ValueError("at least one endpoint url is required")
+        if strategy not in ("least_outstanding", "p2c"):
+            raise ValueError(f"unknown routing strategy: {strategy}")
+        self.endpoints = [Endpoint(url) for url in urls]
+        self.strategy = strategy
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.slow_start = slow_start
+        self.clock = clock
+        self.rng = rng or random.Random()
+        self._lock = threading.Lock()
+
+    def _weight(self, endpoint, now):
+        """慢启动权重：刚恢复时为 SLOW_START_MIN_WEIGHT，slow_start 秒后回到 1"""
+        if endpoint.recovered_at is None:
+            return 1.0
+        elapsed = now - endpoint.recovered_at
+        if self.slow_start <= 0 or elapsed >= self.slow_start:
+            endpoint.recovered_at = None
+            return 1.0
+        return max(SLOW_START_MIN_WEIGHT, elapsed / self.slow_start)
+
+    def _available(self, endpoint, now):
+        """节点当前能否接收请求；冷却结束的节点在这里转为探测状态"""
+        if endpoint.state == EJECTED and now - endpoint.ejected_at >= self.cooldown:
+            endpoint.state = PROBING
+        if endpoint.state == PROBING:
+            return not endpoint.probe_in_flight
+        return endpoint.state == HEALTHY
+
+    def _score(self, endpoint, now):
+        return (endpoint.outstanding + 1) / self._weight(endpoint, now)
+
+    def _pick(self, candidates, now):
+        # 冷却结束的节点优先拿到探测请求，否则低流量时它永远没有机会恢复
+        for endpoint in candidates:
+            if endpoint.state == PROBING:
+                return endpoint
+        if self.strategy == "p2c" and len(candidates) > 2:
+            candidates = self.rng.sample(candidates, 2)
+        best = min(self._score(endpoint, now) for endpoint in candidates)
+        return self.rng.choice([e for e in candidates if self._score(e, now) == best])
+
+    def acquire(self, exclude=()):
+        """
+        选出一个节点并把它的在途请求数加一，返回 Lease（.url 为节点地址）。
+        exclude 中的节点（如刚失败的节点）尽量避开，但没有其他可用节点时仍会选它。
+        """
+        with self._lock:
+            now = self.clock()
+            available = [e for e in self.endpoints if self._available(e, now)]
+            candidates = [e for e in available if e.url not in exclude] or available
+            if candidates:
+                endpoint = self._pick(candidates, now)
+            else:
+                # 全部被摘除：提前探测最早被摘除的节点；都在探测中则选在途请求最少的
+                ejected = [e for e in self.endpoints if e.state == EJECTED]
+                if ejected:
+                    endpoint = min(ejected, key=lambda e: e.ejected_at)
+                    endpoint.state = PROBING
+                else:
+                    endpoint = min(self.endpoints, key=lambda e: e.outstanding)
+            probe = endpoint.state == PROBING and not endpoint.probe_in_flight
+            if probe:
+                endpoint.probe_in_flight = True
+            endpoint.outstanding += 1
+            return Lease(endpoint, probe)
+
+    def release(self, lease, failed):
+        """
+        请求结束后用 acquire() 返回的 Lease 报告结果（同一个 Lease 只计一次）。
+        failed 只应对说明节点不健康的错误（连接失败、超时、5xx 等）为 True，
+        参数错误之类的 4xx 说明节点能正常应答，按成功计。
+        """
+        with self._lock:
+            if lease.released:
+                return
+            lease.released = True
+            endpoint = lease.endpoint
+            now = self.clock()
+            endpoint.outstanding -= 1
+            endpoint.requests += 1
+            if failed:
+                endpoint.failures += 1
+
+            if lease.probe:
+                endpoint.probe_in_flight = False
+                if endpoint.state != PROBING:
+                    return
+                if failed:
+                    endpoint.state = EJECTED
+                    endpoint.ejected_at = now
+                else:
+                    endpoint.state = HEALTHY
+                    endpoint.consecutive_failures = 0
+                    endpoint.recovered_at = now
+                return
+
+            if endpoint.state != HEALTHY:
+                # 摘除前发出的请求陆续返回，结果不影响熔断状态
+                return
+            if not failed:
+                endpoint.consecutive_failures = 0
+                return
+            endpoint.consecutive_failures += 1
+            if endpoint.consecutive_failures >= self.failure_threshold:
+                endpoint.state = EJECTED
+                endpoint.ejected_at = now
+                endpoint.recovered_at = None
+                endpoint.ejections += 1
+
+    def snapshot(self):
+        """各节点的当前状态，便于日志输出或在界面上展示"""
+        with self._lock:
+            now = self.clock()
+            return [
+                {
+                    "url": e.url,
+                    "state": e.state,
+                    "outstanding": e.outstanding,
+                    "weight": round(self._weight(e, now), 3),
+                    "requests": e.requests,
+                    "failures": e.failures,
+                    "ejections": e.ejections,
+                }
+                for e in self.endpoints
+            ]
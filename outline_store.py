@@ -0,0 +1,193 @@
+import os
+import json
+import time
+import argparse
+import threading
+from datetime import datetime
+
+import tracing
+import sqlite_util
+
+###########################
+# 访谈大纲存储配置
+###########################
+# pre-interview 提交的大纲追加写入 SQLite（每次提交一条 INSERT，按 id 主键和提交时间索引），
+# 访谈端按 id 读取；两个应用默认用仓库根目录下的同一个库文件
+OUTLINE_STORE_PATH = os.environ.get(
+    "INTERVIEW_OUTLINE_STORE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "interview_outlines.sqlite3")
+)
+# 没有指定大纲、存储里也还没有提交过大纲时读取的旧文件（相对当前目录）
+DEFAULT_OUTLINE_FILE = "interview_outline.json"
+
+
+class OutlineNotFound(KeyError):
+    """没有这个 id 的大纲"""
+
+
+def read_outline_file(path):
+    """
+    读取旧的 interview_outline.json：单条记录（{"interview_outline": ..., "key_questions": [...]}），
+    或旧版 pre-interview 追加写出的记录列表（取最后一条）。返回 (大纲, 关键问题)
+    """
+    with tracing.span("file.read", path=path), open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        if not data:
+            raise ValueError(f"{path} contains no outline")
+        data = data[-1]
+    return data["interview_outline"], data["key_questions"]
+
+
+class OutlineStore:
+    """
+    访谈大纲的存储：只追加（提交一次 INSERT 一行，不读不改已有记录），
+    按 id 取一条走主键，按时间列出最近的走 created_at 索引，与已有记录的条数无关。
+    与 AnalysisStore 一样每次操作单独开连接（WAL 模式，多个进程可同时读写）。
+    """
+
+    def __init__(self, path=OUTLINE_STORE_PATH):
+        self.path = path
+        self._init_db()
+
+    def _connect(self):
+        return sqlite_util.connect(self.path)
+
+    def _init_db(self):
+        sqlite_util.init_schema(
+            self.path,
+            "CREATE TABLE IF NOT EXISTS interview_outlines ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " interview_outline TEXT NOT NULL,"
+            " key_questions TEXT NOT NULL,"
+            " created_at REAL NOT NULL)",
+            "CREATE INDEX IF NOT EXISTS interview_outlines_created_at ON interview_outlines (created_at)"
+        )
+
+    def add(self, interview_outline, key_questions, created_at=None):
+        """追加一份大纲，返回它的 id"""
+        conn = self._connect()
+        try:
+            with conn:
+                cursor = conn.execute(
+                    "INSERT INTO interview_outlines (interview_outline, key_questions, created_at) VALUES (?, ?, ?)",
+                    (interview_outline, json.dumps(list(key_questions), ensure_ascii=False),
+                     created_at if created_at is not None else time.time())
+                )
+            return cursor.lastrowid
+        finally:
+            conn.close()
+
+    def get(self, outline_id):
+        """返回 (大纲, 关键问题)；没有这个 id 时抛 OutlineNotFound"""
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT interview_outline, key_questions FROM interview_outlines WHERE id = ?", (int(outline_id),)
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            raise OutlineNotFound(outline_id)
+        return row[0], json.loads(row[1])
+
+    def latest_id(self):
+        """最近提交的大纲的 id；存储为空时为 None"""
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT id FROM interview_outlines ORDER BY created_at DESC, id DESC LIMIT 1"
+            ).fetchone()
+        finally:
+            conn.close()
+        return row[0] if row is not None else None
+
+    def recent(self, limit=50, before=None):
+        """
+        按提交时间倒序列出大纲（before 为时间戳，只列更早的，用于翻页），
+        每条为 {"id", "interview_outline", "key_questions", "timestamp"}
+        """
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT id, interview_outline, key_questions, created_at FROM interview_outlines"
+                " WHERE created_at < ? ORDER BY created_at DESC, id DESC LIMIT ?",
+                (before if before is not None else float("inf"), limit)
+            ).fetchall()
+        finally:
+            conn.close()
+        return [
+            {
+                "id": outline_id,
+                "interview_outline": interview_outline,
+                "key_questions": json.loads(key_questions),
+                "timestamp": datetime.fromtimestamp(created_at).isoformat(),
+            }
+            for outline_id, interview_outline, key_questions, created_at in rows
+        ]
+
+
+_outline_store = None
+_outline_store_lock = threading.Lock()
+
+
+def get_outline_store():
+    """进程内共享的大纲存储（首次使用时建表）"""
+    global _outline_store
+    if _outline_store is None:
+        with _outline_store_lock:
+            if _outline_store is None:
+                _outline_store = OutlineStore()
+    return _outline_store
+
+
+def save_outline(interview_outline, key_questions):
+    """保存一份新提交的大纲，返回它的 id"""
+    with tracing.span("outline_store.add"):
+        return get_outline_store().add(interview_outline, key_questions)
+
+
+def load_outline(outline_id=None, path=None):
+    """
+    命令行和 Streamlit 两个访谈端共用的大纲选择规则，返回 (大纲, 关键问题)：
+      指定 outline_id  从存储按 id 读取（没有这个 id 时抛 OutlineNotFound）
+      指定 path        读取这个 JSON 文件（单条记录或记录列表）
+      都没有指定       取最近提交的一份；还没有提交过时读 DEFAULT_OUTLINE_FILE
+    """
+    if outline_id is None and path is not None:
+        return read_outline_file(path)
+    store = get_outline_store()
+    with tracing.span("outline_store.get", outline_id=outline_id) as span:
+        if outline_id is None:
+            outline_id = store.latest_id()
+            span.set_attribute("outline_id", outline_id)
+        if outline_id is not None:
+            return store.get(outline_id)
+    return read_outline_file(DEFAULT_OUTLINE_FILE)
+
+
+def import_outline_file(path):
+    """把旧的 interview_outline.json（单条或记录列表）导入存储，保留原来的提交时间，返回导入的 id 列表"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    records = data if isinstance(data, list) else [data]
+    store = get_outline_store()
+    ids = []
+    for record in records:
+        created_at = None
+        if record.get("timestamp"):
+            created_at = datetime.fromisoformat(record["timestamp"]).timestamp()
+        ids.append(store.add(record["interview_outline"], record["key_questions"], created_at))
+    return ids
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="访谈大纲存储：导入旧的 JSON 文件 / 列出最近的大纲")
+    parser.add_argument("--import-file", help="导入旧的 interview_outline.json（单条或记录列表）")
+    parser.add_argument("--limit", type=int, default=20, help="列出最近多少份大纲")
+    args = parser.parse_args()
+    if args.import_file:
+        print(f"已导入 {len(import_outline_file(args.import_file))} 份大纲")
+    for outline in get_outline_store().recent(args.limit):
+        print(f"#{outline['id']}  {outline['timestamp']}  {outline['interview_outline'].strip()[:40]}"
+              f"  （{len(outline['key_questions'])} 个关键问题）")
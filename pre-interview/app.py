@@ -1,44 +1,25 @@
 import streamlit as st
 import json
 import os
+import sys
 import pandas as pd
-from datetime import datetime
+
+# 与访谈端共用仓库根目录下的大纲存储
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from outline_store import save_outline
 
 # 获取当前工作目录
 current_dir = os.getcwd()
 # 获取上一级目录
 parent_dir = os.path.dirname(current_dir)
 
-def save_to_json(interview_outline, key_questions):
-    """Save the interview data to a JSON file"""
-    interview_record = {
-        'interview_outline': interview_outline,
-        'key_questions': key_questions,
-        'timestamp': datetime.now().isoformat()
-    }
-    
+def save_outline_record(interview_outline, key_questions):
+    """Append the interview outline to the outline store; returns its id, or None on failure"""
     try:
-        # Try to read existing data
-        try:
-            with open('interview_outline.json', 'r', encoding='utf-8') as file:
-                data = json.load(file)
-                if not isinstance(data, list):
-                    data = [data]
-        except (FileNotFoundError, json.JSONDecodeError):
-            data = []
-        
-        # Append new record
-        data.append(interview_record)
-        
-        # Write back to file
-        with open('interview_outline.json', 'w', encoding='utf-8') as file:
-            json.dump(data, file, ensure_ascii=False, indent=4)
-            
+        return save_outline(interview_outline, key_questions)
     except Exception as e:
         st.error(f"保存数据时出错: {str(e)}")
-        return False
-    
-    return True
+        return None
 
 
 #输入主题页面
@@ -84,8 +65,9 @@ def page_input():
             return
             
         # 保存数据
-        if save_to_json(interview_outline, key_questions):
-            st.success("感谢您的提交！访谈大纲和问题已成功接收。")
+        outline_id = save_outline_record(interview_outline, key_questions)
+        if outline_id is not None:
+            st.success(f"感谢您的提交！访谈大纲和问题已成功接收（大纲编号：{outline_id}）。")
             
             # 清空表单
             st.session_state.questions = [""]
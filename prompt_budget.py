@@ -0,0 +1,131 @@
+import os
+import re
+
+import task_profiles
+from llm_metrics import REGISTRY
+
+###########################
+# 提示词预算配置
+###########################
+# 受访者的回答、大纲等可变内容在拼进提示词之前按 token 预算截断（保留开头和结尾，省略中间），
+# 避免超长输入拖慢 prefill 或超出上下文窗口；INTERVIEW_PROMPT_BUDGET=0 关闭
+BUDGET_ENABLED = os.environ.get("INTERVIEW_PROMPT_BUDGET", "1") != "0"
+
+# 各字段的默认预算（token 数，按 count_tokens 的估算），任务可以在 TaskProfile.input_budgets 中单独覆盖
+DEFAULT_INPUT_BUDGETS = {
+    "question": int(os.environ.get("INTERVIEW_QUESTION_TOKEN_BUDGET", "256")),
+    "answer": int(os.environ.get("INTERVIEW_ANSWER_TOKEN_BUDGET", "1024")),
+    "outline": int(os.environ.get("INTERVIEW_OUTLINE_TOKEN_BUDGET", "512")),
+    "key_questions": int(os.environ.get("INTERVIEW_KEY_QUESTIONS_TOKEN_BUDGET", "1024")),
+    "transcript": int(os.environ.get("INTERVIEW_TRANSCRIPT_TOKEN_BUDGET", "12000")),
+}
+
+ELISION_MARKER = "……（中间省略约{tokens}个token）……"
+
+PROMPT_TRUNCATIONS = REGISTRY.counter(
+    "interview_prompt_truncations_total", "Prompt fields elided to fit the input token budget", ("task", "field"))
+PROMPT_TRUNCATED_TOKENS = REGISTRY.counter(
+    "interview_prompt_truncated_tokens_total", "Estimated tokens removed from prompt fields", ("task", "field"))
+
+
+###########################
+# 近似 token 计数
+###########################
+# 按 Qwen2.5 这类 BPE 分词器的大致规律估算，不需要下载分词器，宁多勿少：
+#   汉字、假名、韩文、全角标点   每个 1 个（常用词实际会合并，偏保守）
+#   英文单词                     每 4 个字母 1 个
+#   数字                         每位 1 个（Qwen 把数字逐位切分）
+#   含换行的空白                 1 个；其余空白并入后面的词，不单独计
+#   其他符号                     每个 1 个
+# 预算截断、前缀复用估算（prompt_layout）和模拟服务（benchmarks/mock_vllm.py）都用这一套切分
+_TOKEN_PATTERN = re.compile(
+    r"(?P<cjk>[\u3000-\u303f\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef])"
+    r"|(?P<word>[A-Za-z]+)"
+    r"|(?P<digits>\d+)"
+    r"|(?P<space>\s+)"
+    r"|(?P<other>.)",
+    re.S
+)
+
+
+def _token_spans(text):
+    """
+    按上面的规则把 text 切成近似 token，返回每个 token 的 (起点, 终点)。
+    各段首尾相接、覆盖整个 text：不含换行的空白并入后面的 token（在末尾时并入最后一个）
+    """
+    spans = []
+    pending = None
+    for match in _TOKEN_PATTERN.finditer(text):
+        kind = match.lastgroup
+        start, end = match.span()
+        if kind == "space" and "\n" not in match.group():
+            pending = start
+            continue
+        step = 4 if kind == "word" else 1 if kind == "digits" else end - start
+        for piece in range(start, end, step):
+            spans.append((piece, min(piece + step, end)))
+        if pending is not None:
+            first = len(spans) - (end - start + step - 1) // step
+            spans[first] = (pending, spans[first][1])
+            pending = None
+    if pending is not None and spans:
+        spans[-1] = (spans[-1][0], len(text))
+    return spans
+
+
+def approx_tokens(text):
+    """text 切成的近似 token 列表（拼起来就是 text）"""
+    return [text[start:end] for start, end in _token_spans(text)]
+
+
+def count_tokens(text):
+    """text 的近似 token 数"""
+    return len(_token_spans(text))
+
+
+def elide_middle(text, max_tokens):
+    """
+    超过 max_tokens 时保留开头和结尾各一半、中间换成省略标记（只在 token 边界处切开，
+    超长的英文单词、数字串也按 token 切开），返回 (截断后的文本, 省略的 token 数)；没有超出时原样返回、省略数为 0
+    """
+    spans = _token_spans(text)
+    total = len(spans)
+    if total <= max_tokens:
+        return text, 0
+
+    keep = max(0, max_tokens - count_tokens(ELISION_MARKER.format(tokens=total)))
+    head = keep // 2
+    tail = keep - head
+    head_end = spans[head - 1][1] if head else 0
+    tail_start = spans[total - tail][0] if tail else len(text)
+    dropped = total - head - tail
+    return text[:head_end] + ELISION_MARKER.format(tokens=dropped) + text[tail_start:], dropped
+
+
+###########################
+# 按任务预算截断
+###########################
+def input_budget(task, field):
+    """task 的 field 字段的预算；TaskProfile.input_budgets 没有覆盖时用 DEFAULT_INPUT_BUDGETS"""
+    profile = task_profiles.get_profile(task)
+    if profile is not None and profile.input_budgets and field in profile.input_budgets:
+        return profile.input_budgets[field]
+    return DEFAULT_INPUT_BUDGETS.get(field)
+
+
+def fit(task, field, text):
+    """
+    提示词构造函数在拼接可变内容前调用：超出预算的文本省略中间部分，并记入
+    interview_prompt_truncations_total / interview_prompt_truncated_tokens_total。
+    """
+    if not BUDGET_ENABLED or not text:
+        return text
+    budget = input_budget(task, field)
+    # 每个 token 至少占一个字符，字符数不超过预算时不必计数
+    if budget is None or len(text) <= budget:
+        return text
+    trimmed, dropped = elide_middle(text, budget)
+    if dropped:
+        PROMPT_TRUNCATIONS.inc(task=task or "unknown", field=field)
+        PROMPT_TRUNCATED_TOKENS.inc(dropped, task=task or "unknown", field=field)
+    return trimmed
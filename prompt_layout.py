@@ -0,0 +1,147 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+from chat_prompt import ChatPrompt
+from prompt_budget import fit, approx_tokens
+
+###########################
+# 提示词布局与前缀复用估算配置
+###########################
+# vLLM 的自动前缀缓存按 KV block 复用：两个请求从开头起完全相同的整块 token 可以跳过 prefill。
+# 这里在本地按同样的方式估算每个任务能共享的前缀长度（只是估算：分词是近似的，也不知道服务端的淘汰情况）。
+# 估算要对每个 prompt 重新分词、算哈希，默认关闭，调整提示词布局或跑基准测试时用 INTERVIEW_PREFIX_STATS=1 打开
+PREFIX_STATS_ENABLED = os.environ.get("INTERVIEW_PREFIX_STATS", "0") == "1"
+# 与服务端的 --block-size 保持一致（vLLM 默认 16）
+PREFIX_BLOCK_SIZE = int(os.environ.get("INTERVIEW_PREFIX_BLOCK_SIZE", "16"))
+# 本地记住的 block 数上限（按最近使用淘汰），大致对应服务端可用于缓存的 KV 容量
+PREFIX_CACHE_BLOCKS = int(os.environ.get("INTERVIEW_PREFIX_CACHE_BLOCKS", "8192"))
+
+
+###########################
+# 提示词布局
+###########################
+# 所有提示词统一按 “越稳定越靠前” 排列：
+#   system：任务的静态指令（同一任务的所有调用完全相同）
+#   user：  大纲块（同一份大纲的所有会话相同）-> 本轮内容（当前问题、回答、访谈记录等）
+# 变化的内容一旦出现，后面的 token 就无法再被前缀缓存复用，所以静态的要求、输出格式都写进 system。
+# 大纲、问题、回答等可变内容按任务的 token 预算截断（prompt_budget.fit），task 用于查预算和记指标。
+
+def outline_block(interview_outline, key_questions=None, task=None):
+    """大纲块：放在 user 消息最前面，同一份大纲的各次调用共享"""
+    lines = [f"访谈大纲: {fit(task, 'outline', interview_outline)}"]
+    if key_questions is not None:
+        lines.append(f"关键问题: {fit(task, 'key_questions', str(key_questions))}")
+    return "\n".join(lines)
+
+
+def qa_block(task, current_question, user_response=None, answer_label="受访者的回答"):
+    """当前问题 + 受访者的回答（回答可省略）"""
+    lines = [f"当前问题: {fit(task, 'question', current_question)}"]
+    if user_response is not None:
+        lines.append(f"{answer_label}: {fit(task, 'answer', user_response)}")
+    return "\n".join(lines)
+
+
+def build_messages(instructions, *blocks):
+    """
+    instructions 为 system 中的静态指令；blocks 按稳定程度从高到低排列，依次拼进 user 消息（None / 空串跳过）
+    """
+    return [
+        {"role": "system", "content": instructions},
+        {"role": "user", "content": "\n".join(block for block in blocks if block)},
+    ]
+
+
+###########################
+# 前缀复用估算
+###########################
+class PrefixCacheEstimator:
+    """
+    模拟服务端的前缀缓存：把渲染后的 prompt 切成定长 block，每个 block 的哈希链接上前一个 block 的哈希
+    （与 vLLM 一样，只有从开头起连续相同的 block 才能复用）。
+    observe() 返回该 prompt 开头有多少 token 落在之前见过的 block 里，并按任务累计。
+    """
+
+    def __init__(self, block_size=PREFIX_BLOCK_SIZE, capacity=PREFIX_CACHE_BLOCKS):
+        self.block_size = block_size
+        self.capacity = capacity
+        self._blocks = OrderedDict()
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _block_hashes(self, messages):
+        tokens = approx_tokens(ChatPrompt(messages).to_template_text())
+        hashes = []
+        parent = b""
+        for start in range(0, len(tokens) - self.block_size + 1, self.block_size):
+            block = "\x00".join(tokens[start:start + self.block_size])
+            parent = hashlib.sha1(parent + block.encode("utf-8")).digest()
+            hashes.append(parent)
+        return len(tokens), hashes
+
+    def observe(self, task, messages):
+        prompt_tokens, hashes = self._block_hashes(messages)
+        with self._lock:
+            shared_blocks = 0
+            for block_hash in hashes:
+                if block_hash not in self._blocks:
+                    break
+                shared_blocks += 1
+            for block_hash in hashes:
+                self._blocks[block_hash] = True
+                self._blocks.move_to_end(block_hash)
+            while len(self._blocks) > self.capacity:
+                self._blocks.popitem(last=False)
+
+            shared_tokens = shared_blocks * self.block_size
+            stats = self._stats.setdefault(task, {"requests": 0, "prompt_tokens": 0, "shared_tokens": 0})
+            stats["requests"] += 1
+            stats["prompt_tokens"] += prompt_tokens
+            stats["shared_tokens"] += shared_tokens
+        return shared_tokens
+
+    def stats(self):
+        """{任务名: {"requests", "prompt_tokens", "shared_tokens", "shared_ratio"}}"""
+        with self._lock:
+            result = {}
+            for task, stats in self._stats.items():
+                result[task] = dict(stats)
+                result[task]["shared_ratio"] = (
+                    stats["shared_tokens"] / stats["prompt_tokens"] if stats["prompt_tokens"] else 0.0
+                )
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._blocks.clear()
+            self._stats.clear()
+
+
+_estimator = None
+_estimator_lock = threading.Lock()
+
+
+def get_prefix_estimator():
+    """进程内共享的前缀复用估算器"""
+    global _estimator
+    if _estimator is None:
+        with _estimator_lock:
+            if _estimator is None:
+                _estimator = PrefixCacheEstimator()
+    return _estimator
+
+
+def record_prompt(task, messages):
+    """适配层在真正发出请求前调用（回复缓存命中的不算）；关闭统计时什么也不做"""
+    if PREFIX_STATS_ENABLED:
+        get_prefix_estimator().observe(task, messages)
+
+
+def prefix_stats():
+    return get_prefix_estimator().stats()
+
+
+def reset_prefix_stats():
+    get_prefix_estimator().reset()
@@ -0,0 +1,247 @@
+import os
+import json
+import time
+import abc
+import zlib
+import sqlite3
+import threading
+
+import tracing
+import sqlite_util
+
+###########################
+# 会话存储配置
+###########################
+# Streamlit 的访谈进度（状态机、评分指标、总结等）每轮结束后写入会话存储，重连、换到其他 worker、
+# 服务重启后按 session_id 恢复。INTERVIEW_SESSION_BACKEND 选择后端（sqlite / memory，
+# 也可以用 register_session_backend 注册其他后端）；sqlite 后端的库文件为 INTERVIEW_SESSION_STORE
+SESSION_BACKEND = os.environ.get("INTERVIEW_SESSION_BACKEND", "sqlite")
+SESSION_STORE_PATH = os.environ.get(
+    "INTERVIEW_SESSION_STORE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "interview_sessions.sqlite3")
+)
+# 超过这个时长没有更新的会话在存储创建时清理；0 为不清理
+SESSION_TTL_HOURS = float(os.environ.get("INTERVIEW_SESSION_TTL_HOURS", "72"))
+# 状态序列化为紧凑 JSON 后用 zlib 压缩（中文对话记录大约能压到一半）
+SESSION_COMPRESS_LEVEL = int(os.environ.get("INTERVIEW_SESSION_COMPRESS_LEVEL", "6"))
+
+
+def encode_state(state):
+    """会话状态（可 JSON 序列化的字典）-> 压缩后的字节串"""
+    raw = json.dumps(state, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return zlib.compress(raw, SESSION_COMPRESS_LEVEL)
+
+
+def decode_state(data):
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+
+class SessionConflict(Exception):
+    """保存时会话已被其他 worker 更新（版本号对不上）"""
+
+    def __init__(self, session_id, expected_version):
+        super().__init__(f"session {session_id} was updated elsewhere (expected version {expected_version})")
+        self.session_id = session_id
+        self.expected_version = expected_version
+
+
+class SessionStore(abc.ABC):
+    """
+    会话存储的接口。每个会话保存一份状态和一个版本号，版本号每次保存加一：
+      load(session_id)                          -> (状态, 版本号)，没有记录时为 (None, 0)
+      save(session_id, state, expected_version) -> 新版本号；expected_version 与存储中的不一致时抛 SessionConflict
+                                                   （0 表示新建会话，None 表示不检查直接覆盖）
+      delete(session_id)
+      purge(max_age_s)                          -> 清理超过 max_age_s 秒未更新的会话，返回清理条数
+    两个 worker 同时处理同一会话时，后保存的一方会得到 SessionConflict，应当重新 load 再继续，而不是覆盖对方的进度。
+    """
+
+    @abc.abstractmethod
+    def load(self, session_id):
+        ...
+
+    @abc.abstractmethod
+    def save(self, session_id, state, expected_version=None):
+        ...
+
+    @abc.abstractmethod
+    def delete(self, session_id):
+        ...
+
+    @abc.abstractmethod
+    def purge(self, max_age_s):
+        ...
+
+
+class MemorySessionStore(SessionStore):
+    """进程内存储：只用于单进程部署或测试，重启后丢失。同样保存编码后的字节串，与 sqlite 后端行为一致"""
+
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def load(self, session_id):
+        with self._lock:
+            record = self._sessions.get(session_id)
+        if record is None:
+            return None, 0
+        data, version, _ = record
+        return decode_state(data), version
+
+    def save(self, session_id, state, expected_version=None):
+        data = encode_state(state)
+        with self._lock:
+            current = self._sessions.get(session_id, (None, 0, 0))[1]
+            if expected_version is not None and expected_version != current:
+                raise SessionConflict(session_id, expected_version)
+            self._sessions[session_id] = (data, current + 1, time.time())
+            return current + 1
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def purge(self, max_age_s):
+        cutoff = time.time() - max_age_s
+        with self._lock:
+            expired = [key for key, (_, _, updated_at) in self._sessions.items() if updated_at < cutoff]
+            for key in expired:
+                del self._sessions[key]
+        return len(expired)
+
+
+class SqliteSessionStore(SessionStore):
+    """
+    SQLite 存储（WAL 模式，同一台机器上的多个 worker 进程可同时读写）。
+    与 AnalysisStore 一样每次操作单独开连接；版本检查在一条 UPDATE 里完成，不需要额外加锁。
+    """
+
+    def __init__(self, path=SESSION_STORE_PATH):
+        self.path = path
+        self._init_db()
+
+    def _connect(self):
+        return sqlite_util.connect(self.path)
+
+    def _init_db(self):
+        sqlite_util.init_schema(
+            self.path,
+            "CREATE TABLE IF NOT EXISTS interview_sessions ("
+            " session_id TEXT PRIMARY KEY,"
+            " state BLOB NOT NULL,"
+            " version INTEGER NOT NULL,"
+            " updated_at REAL NOT NULL)",
+            "CREATE INDEX IF NOT EXISTS interview_sessions_updated_at ON interview_sessions (updated_at)"
+        )
+
+    def load(self, session_id):
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT state, version FROM interview_sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None, 0
+        return decode_state(row[0]), row[1]
+
+    def save(self, session_id, state, expected_version=None):
+        data = encode_state(state)
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                if expected_version is None:
+                    conn.execute(
+                        "INSERT INTO interview_sessions (session_id, state, version, updated_at) VALUES (?, ?, 1, ?)"
+                        " ON CONFLICT(session_id) DO UPDATE SET"
+                        " state = excluded.state, version = version + 1, updated_at = excluded.updated_at",
+                        (session_id, data, now)
+                    )
+                elif expected_version == 0:
+                    try:
+                        conn.execute(
+                            "INSERT INTO interview_sessions (session_id, state, version, updated_at) VALUES (?, ?, 1, ?)",
+                            (session_id, data, now)
+                        )
+                    except sqlite3.IntegrityError:
+                        raise SessionConflict(session_id, expected_version) from None
+                else:
+                    cursor = conn.execute(
+                        "UPDATE interview_sessions SET state = ?, version = version + 1, updated_at = ?"
+                        " WHERE session_id = ? AND version = ?",
+                        (data, now, session_id, expected_version)
+                    )
+                    if cursor.rowcount == 0:
+                        raise SessionConflict(session_id, expected_version)
+                row = conn.execute(
+                    "SELECT version FROM interview_sessions WHERE session_id = ?", (session_id,)
+                ).fetchone()
+        finally:
+            conn.close()
+        return row[0]
+
+    def delete(self, session_id):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM interview_sessions WHERE session_id = ?", (session_id,))
+        finally:
+            conn.close()
+
+    def purge(self, max_age_s):
+        conn = self._connect()
+        try:
+            with conn:
+                cursor = conn.execute(
+                    "DELETE FROM interview_sessions WHERE updated_at < ?", (time.time() - max_age_s,)
+                )
+        finally:
+            conn.close()
+        return cursor.rowcount
+
+
+# 后端名 -> 无参数的工厂函数
+SESSION_BACKENDS = {
+    "sqlite": lambda: SqliteSessionStore(SESSION_STORE_PATH),
+    "memory": MemorySessionStore,
+}
+
+
+def register_session_backend(name, factory):
+    """注册其他后端（例如 Redis），之后设置 INTERVIEW_SESSION_BACKEND=name 即可使用"""
+    SESSION_BACKENDS[name] = factory
+
+
+_session_store = None
+_session_store_lock = threading.Lock()
+
+
+def get_session_store():
+    """进程内共享的会话存储（首次使用时按 INTERVIEW_SESSION_BACKEND 创建，并清理过期会话）"""
+    global _session_store
+    if _session_store is None:
+        with _session_store_lock:
+            if _session_store is None:
+                if SESSION_BACKEND not in SESSION_BACKENDS:
+                    raise ValueError(f"unknown session backend: {SESSION_BACKEND}")
+                store = SESSION_BACKENDS[SESSION_BACKEND]()
+                if SESSION_TTL_HOURS > 0:
+                    store.purge(SESSION_TTL_HOURS * 3600)
+                _session_store = store
+    return _session_store
+
+
+def load_session(session_id):
+    """读取会话，返回 (状态, 版本号)；没有记录时为 (None, 0)"""
+    with tracing.span("session_store.load", session_id=session_id) as span:
+        state, version = get_session_store().load(session_id)
+        span.set_attributes(hit=state is not None, version=version)
+    return state, version
+
+
+def save_session(session_id, state, expected_version=None):
+    """保存会话，返回新的版本号；会话已被其他 worker 更新时抛 SessionConflict"""
+    with tracing.span("session_store.save", session_id=session_id, expected_version=expected_version):
+        return get_session_store().save(session_id, state, expected_version)
@@ -0,0 +1,26 @@
+import sqlite3
+
+###########################
+# SQLite 连接
+###########################
+# analysis_store / session_store / outline_store 共用：每次操作单独开连接，不在线程间共享 sqlite3 连接；
+# WAL 模式下同一台机器上的多个进程可同时读写
+
+
+def connect(path, timeout=10):
+    """打开一个连接：WAL 模式，synchronous=NORMAL（WAL 下只在检查点时 fsync，断电最多丢最近的事务，不会损坏库文件）"""
+    conn = sqlite3.connect(path, timeout=timeout)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def init_schema(path, *statements):
+    """在一个事务里执行建表、建索引语句（都应带 IF NOT EXISTS，可重复执行）"""
+    conn = connect(path)
+    try:
+        with conn:
+            for statement in statements:
+                conn.execute(statement)
+    finally:
+        conn.close()
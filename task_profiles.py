@@ -0,0 +1,131 @@
+import os
+
+###########################
+# 任务配置
+###########################
+# guided_choice / guided_json 是 vLLM 对 OpenAI 接口的扩展字段；换成不支持的后端时可设为 0 关闭
+GUIDED_DECODING = os.environ.get("INTERVIEW_GUIDED_DECODING", "1") != "0"
+
+# 大纲分析每一步的超时（秒）：超时的那一步按失败处理，不拖住整个分析阶段
+ANALYSIS_STEP_TIMEOUT = float(os.environ.get("INTERVIEW_ANALYSIS_STEP_TIMEOUT", "30"))
+
+# 最终总结的 JSON 结构，与 _final_summary_messages 中要求的三个键一致
+FINAL_SUMMARY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "takeaways": {"type": "string"},
+        "points": {"type": "array", "items": {"type": "number"}},
+        "explanations": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["takeaways", "points", "explanations"],
+}
+
+# 单轮评估（assess_turn）的 JSON 结构：是否不愿回答 + 回答深度 + 置信度
+ASSESS_TURN_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "unwilling": {"type": "boolean"},
+        "depth": {"type": "string", "enum": ["SURFACE", "DEEPER", "ENOUGH"]},
+        "confidence": {"type": "number", "minimum": 0, "maximum": 1},
+    },
+    "required": ["unwilling", "depth", "confidence"],
+}
+
+
+class TaskProfile:
+    """
+    单个任务的采样配置。值为 None 的字段沿用调用方传入的 SamplingParams，
+    其余字段覆盖之；guided_choice / guided_json 让模型只能输出给定的标签或符合 schema 的 JSON。
+    labels 为分类任务的候选标签：生成模式下作为 guided_choice 发送，logprobs 模式下用来打分（见 llm_classify）。
+    deadline 为单次调用（含重试）的超时秒数，None 时用 llm_client 的 CALL_DEADLINE。
+    input_budgets 按字段覆盖提示词中可变内容的 token 预算（如 {"answer": 512}，见 prompt_budget）。
+    """
+
+    def __init__(self, name,
+                 max_tokens=None,
+                 temperature=None,
+                 top_p=None,
+                 stop=None,
+                 labels=None,
+                 guided_json=None,
+                 deadline=None,
+                 input_budgets=None):
+        self.name = name
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.top_p = top_p
+        self.stop = stop
+        self.labels = labels
+        self.guided_json = guided_json
+        self.deadline = deadline
+        self.input_budgets = input_budgets
+
+    def apply(self, data):
+        """把本任务的配置叠加到请求参数字典上，返回新字典"""
+        data = dict(data)
+        for field in ("max_tokens", "temperature", "top_p", "stop"):
+            value = getattr(self, field)
+            if value is not None:
+                data[field] = value
+        if GUIDED_DECODING:
+            if self.labels is not None:
+                data["guided_choice"] = list(self.labels)
+            if self.guided_json is not None:
+                data["guided_json"] = self.guided_json
+        return data
+
+    def __repr__(self):
+        return f"TaskProfile({self.name!r})"
+
+
+# 提问、过渡语都是一两句话，遇到空行说明模型开始额外解释，直接截断
+_QUESTION_STOP = ["\n\n"]
+
+TASK_PROFILES = {
+    # 分类任务：贪心解码，只允许输出标签本身
+    "check_unanswerable": TaskProfile(
+        "check_unanswerable", max_tokens=2, temperature=0.0, labels=["YES", "NO"],
+        # 判断是否拒答只需要看回答的开头和结尾
+        input_budgets={"answer": 512}
+    ),
+    "evaluate_response": TaskProfile(
+        "evaluate_response", max_tokens=4, temperature=0.0, labels=["SURFACE", "DEEPER", "ENOUGH"]
+    ),
+    # 一次调用同时给出上面两个判断，输出很短的 JSON
+    "assess_turn": TaskProfile(
+        "assess_turn", max_tokens=48, temperature=0.0, guided_json=ASSESS_TURN_SCHEMA
+    ),
+    # 生成提问 / 过渡语
+    "background_question": TaskProfile("background_question", max_tokens=128, stop=_QUESTION_STOP),
+    "transition": TaskProfile("transition", max_tokens=128, stop=_QUESTION_STOP),
+    # 追问要引用回答里的细节，回答的预算放宽一些
+    "deeper_question": TaskProfile(
+        "deeper_question", max_tokens=128, stop=_QUESTION_STOP, input_budgets={"answer": 1536}
+    ),
+    "unanswerable_followup": TaskProfile("unanswerable_followup", max_tokens=128, stop=_QUESTION_STOP),
+    # 大纲分析的各步输出较长，沿用默认采样参数；各步并发执行，每步单独限时
+    "analysis": TaskProfile("analysis", deadline=ANALYSIS_STEP_TIMEOUT),
+    # 话题结束后在后台压缩该话题的对话，摘要限制在两三百字
+    "transcript_digest": TaskProfile(
+        "transcript_digest", max_tokens=384, temperature=0.3, input_budgets={"transcript": 4096}
+    ),
+    # 总结要输出完整 JSON，给足长度并约束结构
+    "final_summary": TaskProfile("final_summary", max_tokens=1024, guided_json=FINAL_SUMMARY_SCHEMA),
+}
+
+
+def get_profile(task):
+    """按任务名取配置；未登记的任务（或 task=None）返回 None，即完全沿用 SamplingParams"""
+    return TASK_PROFILES.get(task)
+
+
+def task_deadline(task):
+    """该任务单次调用的超时；未登记或未设置时返回 None"""
+    profile = get_profile(task)
+    return profile.deadline if profile is not None else None
+
+
+def request_params(task, data):
+    """适配层入口：SamplingParams 转成的请求参数 + 任务配置"""
+    profile = get_profile(task)
+    return profile.apply(data) if profile is not None else data
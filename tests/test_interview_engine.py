@@ -0,0 +1,256 @@
+"""
+interview_engine 的单元测试：状态机不做 I/O，直接喂入模型结果和受访者回答，验证各阶段的转移、
+追问上限、结束词与 “继续” 在各阶段的处理，以及 to_dict / from_dict 在任意时刻存取后能原样继续。
+
+在仓库根目录运行：
+    python -m pytest -q tests
+"""
+import os
+import sys
+import json
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import interview_engine
+from interview_engine import InterviewEngine, Action, CALL_MODEL, WAIT, SUMMARIZE, MAX_BG_QUESTIONS
+
+OUTLINE = "未来人工智能的发展趋势"
+KEY_QUESTIONS = ["你认为当前 AI 发展的最大挑战是什么？", "AI 在未来 10 年可能会如何影响人类社会？"]
+
+ENOUGH = {"unwilling": False, "depth": "ENOUGH", "confidence": 0.9}
+DEEPER = {"unwilling": False, "depth": "DEEPER", "confidence": 0.9}
+UNWILLING = {"unwilling": True, "depth": "SURFACE", "confidence": 0.9}
+
+
+def new_engine():
+    return InterviewEngine(OUTLINE, KEY_QUESTIONS)
+
+
+def enter_first_topic(engine):
+    """背景问题一次答够，进入第一个关键问题"""
+    engine.start()
+    engine.resolve("背景问题")
+    engine.answer("我是一名工程师")
+    engine.resolve("ENOUGH")
+    return engine.resolve("过渡语")
+
+
+def round_trip(engine):
+    """经过 JSON 存取后恢复的引擎（与会话存储的保存方式相同）"""
+    return InterviewEngine.from_dict(json.loads(json.dumps(engine.to_dict(), ensure_ascii=False)))
+
+
+class TransitionTest(unittest.TestCase):
+
+    def test_full_interview(self):
+        engine = new_engine()
+        action = engine.start()
+        self.assertEqual((action.kind, action.task, action.args), (CALL_MODEL, "background_question", (OUTLINE,)))
+        self.assertTrue(action.spoken)
+
+        self.assertEqual(engine.resolve("背景问题").kind, WAIT)
+        action = engine.answer("我是一名工程师")
+        # 背景阶段只判断深度
+        self.assertEqual((action.task, action.args), ("evaluate_response", ("背景问题", "我是一名工程师")))
+        action = engine.resolve("ENOUGH")
+        self.assertEqual((action.task, action.args, action.topic), ("transition", ("背景问题", KEY_QUESTIONS[0]), "背景问题"))
+
+        action = engine.resolve("过渡语")
+        self.assertEqual((action.kind, action.text), (WAIT, KEY_QUESTIONS[0]))
+        self.assertEqual(engine.question_index, 0)
+
+        action = engine.answer("数据和算力")
+        self.assertEqual((action.task, action.args), ("assess_turn", (KEY_QUESTIONS[0], "数据和算力")))
+        action = engine.resolve(ENOUGH)
+        self.assertEqual(action.args, (KEY_QUESTIONS[0], KEY_QUESTIONS[1]))
+        self.assertEqual(engine.resolve("过渡语").text, KEY_QUESTIONS[1])
+
+        engine.answer("改变工作方式")
+        action = engine.resolve(ENOUGH)
+        # 最后一个话题之后没有下一话题，生成结束语
+        self.assertEqual(action.args, (KEY_QUESTIONS[1], None))
+        self.assertEqual(engine.resolve("结束语").kind, SUMMARIZE)
+        self.assertTrue(engine.finished)
+        self.assertEqual(
+            [turn["role"] for turn in engine.dialog_history],
+            ["interviewer", "interviewee", "interviewer", "interviewer", "interviewee",
+             "interviewer", "interviewer", "interviewee", "interviewer"]
+        )
+
+    def test_follow_ups(self):
+        engine = new_engine()
+        enter_first_topic(engine)
+        engine.answer("不太清楚")
+        action = engine.resolve(UNWILLING)
+        self.assertEqual((action.task, action.args), ("unanswerable_followup", (KEY_QUESTIONS[0],)))
+        engine.resolve("换个角度的问题")
+        engine.answer("可能是数据")
+        action = engine.resolve(DEEPER)
+        # 追问的依据是当前关键问题，而不是上一句追问
+        self.assertEqual((action.task, action.args), ("deeper_question", (KEY_QUESTIONS[0], "可能是数据")))
+
+    def test_background_follow_ups_are_capped(self):
+        engine = new_engine()
+        engine.start()
+        engine.resolve("背景问题")
+        for count in range(1, MAX_BG_QUESTIONS):
+            engine.answer(f"回答{count}")
+            action = engine.resolve("SURFACE")
+            self.assertEqual((action.task, action.args), ("deeper_question", ("背景问题", f"回答{count}")))
+            engine.resolve(f"追问{count}")
+        action = engine.answer("最后的回答")
+        # 追问之后按追问本身判断深度
+        self.assertEqual(action.args, (f"追问{MAX_BG_QUESTIONS - 1}", "最后的回答"))
+        self.assertEqual(engine.resolve("SURFACE").task, "transition")
+
+    def test_topic_follow_ups_are_capped(self):
+        engine = new_engine()
+        enter_first_topic(engine)
+        for count in range(1, interview_engine.MAX_QUESTIONS_PER_TOPIC):
+            engine.answer(f"回答{count}")
+            self.assertEqual(engine.resolve(DEEPER).task, "deeper_question")
+            engine.resolve(f"追问{count}")
+        engine.answer("还是很浅")
+        self.assertEqual(engine.resolve(DEEPER).task, "transition")
+
+    def test_no_key_questions(self):
+        engine = InterviewEngine(OUTLINE, [])
+        engine.start()
+        engine.resolve("背景问题")
+        engine.answer("我是一名工程师")
+        action = engine.resolve("ENOUGH")
+        self.assertEqual(action.args, ("背景问题", None))
+        self.assertEqual(engine.resolve("结束语").kind, SUMMARIZE)
+
+    def test_misuse_raises(self):
+        engine = new_engine()
+        with self.assertRaises(ValueError):
+            engine.answer("还没开始")
+        engine.start()
+        with self.assertRaises(ValueError):
+            engine.start()
+        # 等待模型调用期间不接受回答
+        with self.assertRaises(ValueError):
+            engine.answer("太早了")
+        engine.resolve("背景问题")
+        with self.assertRaises(ValueError):
+            engine.resolve("没有等待中的调用")
+
+
+class ExitAndSkipTest(unittest.TestCase):
+    """结束词与 “继续” 在各阶段的处理相同：不调用模型判断，结束时一律生成总结"""
+
+    def test_exit_during_background(self):
+        engine = new_engine()
+        engine.start()
+        engine.resolve("背景问题")
+        self.assertEqual(engine.answer("结束").kind, SUMMARIZE)
+        self.assertTrue(engine.finished)
+        self.assertEqual(engine.dialog_history[-1], {"role": "interviewee", "content": "结束"})
+
+    def test_exit_during_follow_up(self):
+        engine = new_engine()
+        enter_first_topic(engine)
+        engine.answer("数据")
+        engine.resolve(DEEPER)
+        engine.resolve("追问")
+        # 大小写、首尾空白不影响
+        self.assertEqual(engine.answer("  Exit ").kind, SUMMARIZE)
+        self.assertIsNone(engine.pending)
+
+    def test_exit_words(self):
+        for word in interview_engine.EXIT_WORDS:
+            engine = new_engine()
+            enter_first_topic(engine)
+            self.assertEqual(engine.answer(word).kind, SUMMARIZE, word)
+
+    def test_skip_during_background(self):
+        engine = new_engine()
+        engine.start()
+        engine.resolve("背景问题")
+        action = engine.answer("继续")
+        self.assertEqual((action.task, action.args), ("transition", ("背景问题", KEY_QUESTIONS[0])))
+        self.assertEqual(engine.resolve("过渡语").text, KEY_QUESTIONS[0])
+
+    def test_skip_during_follow_up(self):
+        engine = new_engine()
+        enter_first_topic(engine)
+        engine.answer("不想说")
+        engine.resolve(UNWILLING)
+        engine.resolve("换个角度的问题")
+        # 不再判断这句回答，直接过渡到下一话题
+        action = engine.answer("继续")
+        self.assertEqual((action.task, action.topic), ("transition", KEY_QUESTIONS[0]))
+
+    def test_skip_last_topic_finishes(self):
+        engine = new_engine()
+        enter_first_topic(engine)
+        engine.skip_topic()
+        engine.resolve("过渡语")
+        action = engine.answer("继续")
+        self.assertEqual(action.args, (KEY_QUESTIONS[1], None))
+        self.assertEqual(engine.resolve("结束语").kind, SUMMARIZE)
+
+    def test_skip_while_model_call_pending(self):
+        # 界面上点 “下一个问题” 时可能还有未执行的追问：丢弃它，改为过渡
+        engine = new_engine()
+        enter_first_topic(engine)
+        engine.answer("数据")
+        self.assertEqual(engine.skip_topic().task, "transition")
+
+
+class SerializationTest(unittest.TestCase):
+
+    def test_round_trip_keeps_pending_call(self):
+        engine = new_engine()
+        enter_first_topic(engine)
+        engine.answer("数据和算力")
+        restored = round_trip(engine)
+        self.assertEqual(restored.to_dict(), engine.to_dict())
+        # 恢复后 next_action() 返回保存时等待中的模型调用，由驱动方重新执行
+        action = restored.next_action()
+        self.assertEqual((action.kind, action.task, action.args), (CALL_MODEL, "assess_turn", (KEY_QUESTIONS[0], "数据和算力")))
+        self.assertEqual(restored.resolve(ENOUGH).topic, KEY_QUESTIONS[0])
+
+    def test_round_trip_at_every_step(self):
+        """每一步都存取一次，走完的结果与不存取时相同"""
+        script = ["背景问题", "我是一名工程师", "SURFACE", "背景追问", "我做机器学习", "ENOUGH", "过渡语",
+                  "数据和算力", DEEPER, "追问", "更具体的回答", ENOUGH, "过渡语", "改变工作方式", ENOUGH, "结束语"]
+
+        def play(engine, restore):
+            action = engine.start()
+            for step in script:
+                if restore:
+                    engine = round_trip(engine)
+                    self.assertEqual(engine.next_action().to_dict(), action.to_dict())
+                action = engine.answer(step) if action.kind == WAIT else engine.resolve(step)
+            return engine, action
+
+        plain, last = play(new_engine(), restore=False)
+        restored, restored_last = play(new_engine(), restore=True)
+        self.assertEqual(last.kind, SUMMARIZE)
+        self.assertEqual(restored_last.kind, SUMMARIZE)
+        self.assertEqual(restored.to_dict(), plain.to_dict())
+
+    def test_next_action_before_start_and_after_finish(self):
+        engine = new_engine()
+        self.assertEqual(engine.next_action().task, "background_question")
+        engine.finish()
+        self.assertEqual(round_trip(engine).next_action().kind, SUMMARIZE)
+
+    def test_action_round_trip(self):
+        action = Action(CALL_MODEL, "transition", ("上一话题", None), topic="上一话题")
+        restored = Action.from_dict(action.to_dict())
+        self.assertEqual((restored.kind, restored.task, restored.args, restored.topic),
+                         (CALL_MODEL, "transition", ("上一话题", None), "上一话题"))
+
+    def test_unknown_version_rejected(self):
+        state = new_engine().to_dict()
+        state["v"] = interview_engine.STATE_VERSION + 1
+        with self.assertRaises(ValueError):
+            InterviewEngine.from_dict(state)
+
+
+if __name__ == "__main__":
+    unittest.main()
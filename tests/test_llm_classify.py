@@ -0,0 +1,147 @@
+"""
+llm_classify 的单元测试：按 logprobs 给标签打分、从生成文本解析标签和 assess_turn 的 JSON，
+以及 interview_prompts.classify 在接口失败、不支持 logprobs 时的兜底（用假的适配层，不发请求）。
+
+在仓库根目录运行：
+    python -m pytest -q tests
+"""
+import os
+import sys
+import math
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import llm_classify
+import interview_prompts
+from llm_classify import Decision, parse_label, parse_turn_assessment, score_labels
+from llm_adapter import CompletionOutput, CompletionResult, SamplingParams
+from llm_client import LLMError
+
+DEPTH = ("SURFACE", "DEEPER", "ENOUGH")
+MESSAGES = [{"role": "user", "content": "问题：你怎么看？\n回答：不想说"}]
+
+
+class ParseLabelTest(unittest.TestCase):
+
+    def test_first_label_wins(self):
+        self.assertEqual(parse_label("NO, YES if you insist", ("YES", "NO"), "NO"), "NO")
+        self.assertEqual(parse_label("答案是 yes。", ("YES", "NO"), "NO"), "YES")
+
+    def test_label_inside_word_ignored(self):
+        self.assertEqual(parse_label("NOT SURE", ("YES", "NO"), "YES"), "YES")
+        self.assertEqual(parse_label("ENOUGHS", DEPTH, "DEEPER"), "DEEPER")
+
+    def test_default_when_missing(self):
+        decision = parse_label("无法判断", DEPTH, "ENOUGH")
+        self.assertEqual(decision, "ENOUGH")
+        self.assertIsNone(decision.confidence)
+
+
+class ScoreLabelsTest(unittest.TestCase):
+
+    def test_prefix_tokens_count_towards_label(self):
+        top = [("SUR", math.log(0.6)), ("ENOUGH", math.log(0.3)), (" deep", math.log(0.1))]
+        decision = score_labels(top, DEPTH)
+        self.assertEqual(decision, "SURFACE")
+        self.assertAlmostEqual(decision.confidence, 0.6)
+        self.assertAlmostEqual(decision.scores["DEEPER"], 0.1)
+
+    def test_unmatched_tokens_lower_confidence(self):
+        top = [("I", math.log(0.9)), ("NO", math.log(0.01))]
+        decision = score_labels(top, ("YES", "NO"))
+        self.assertEqual(decision, "NO")
+        self.assertLess(decision.confidence, 0.02)
+
+    def test_ambiguous_prefix_ignored(self):
+        # 规范化后为空的 token、同时是多个标签前缀的 token 都不计入任何标签
+        self.assertIsNone(score_labels([("", 0.0), ("'", 0.0)], DEPTH))
+        self.assertIsNone(score_labels([("D", 0.0)], ("DEEPER", "DONE")))
+
+
+class TurnAssessmentTest(unittest.TestCase):
+
+    def test_code_block(self):
+        text = '```json\n{"unwilling": false, "depth": "deeper", "confidence": 1.7}\n```'
+        self.assertEqual(parse_turn_assessment(text, DEPTH), {"unwilling": False, "depth": "DEEPER", "confidence": 1.0})
+
+    def test_invalid(self):
+        for text in ("ENOUGH", '{"unwilling": "no", "depth": "ENOUGH"}', '{"unwilling": true, "depth": "MAYBE"}',
+                     '{"unwilling": true, "depth": "ENOUGH", "confidence": "high"}', "{not json}"):
+            self.assertIsNone(parse_turn_assessment(text, DEPTH), text)
+
+
+class FakeAdapter:
+    """按预设返回 top_logprobs / generate 结果的适配层，记录调用次数"""
+
+    def __init__(self, top=None, top_error=None, text="", generate_error=None):
+        self.top = top or []
+        self.top_error = top_error
+        self.text = text
+        self.generate_error = generate_error
+        self.calls = []
+
+    def top_logprobs(self, prompt, sampling_params, task=None):
+        self.calls.append("top_logprobs")
+        if self.top_error is not None:
+            raise self.top_error
+        return self.top
+
+    def generate(self, prompts, sampling_params, max_concurrency=None, task=None):
+        self.calls.append("generate")
+        return [CompletionResult([CompletionOutput(self.text, error=self.generate_error)]) for _ in prompts]
+
+
+class ClassifyFallbackTest(unittest.TestCase):
+
+    def setUp(self):
+        mode, supported = llm_classify.CLASSIFY_MODE, llm_classify._logprobs_supported
+        llm_classify.CLASSIFY_MODE = "logprobs"
+        llm_classify._logprobs_supported = True
+
+        def restore():
+            llm_classify.CLASSIFY_MODE, llm_classify._logprobs_supported = mode, supported
+        self.addCleanup(restore)
+
+    def classify(self, adapter, task="check_unanswerable"):
+        return interview_prompts.classify(adapter, SamplingParams(), MESSAGES, task)
+
+    def test_logprobs_decision(self):
+        adapter = FakeAdapter(top=[("YES", math.log(0.8)), ("NO", math.log(0.2))])
+        decision = self.classify(adapter)
+        self.assertEqual(decision, "YES")
+        self.assertAlmostEqual(decision.confidence, 0.8)
+        self.assertEqual(adapter.calls, ["top_logprobs"])
+
+    def test_unmatched_logprobs_fall_back_to_text(self):
+        adapter = FakeAdapter(top=[("我", 0.0)], text="答案：NO")
+        self.assertEqual(self.classify(adapter), "NO")
+        self.assertEqual(adapter.calls, ["top_logprobs", "generate"])
+        self.assertTrue(llm_classify.use_logprobs())
+
+    def test_retryable_error_uses_fallback_output(self):
+        # 重试用尽仍失败：不再多发一次生成请求，直接用兜底标签
+        adapter = FakeAdapter(top_error=LLMError("timeout", retryable=True))
+        decision = self.classify(adapter, "evaluate_response")
+        self.assertEqual(decision, interview_prompts.FALLBACK_OUTPUTS["evaluate_response"])
+        self.assertEqual(adapter.calls, ["top_logprobs"])
+        self.assertTrue(llm_classify.use_logprobs())
+
+    def test_unsupported_logprobs_switch_to_generate(self):
+        adapter = FakeAdapter(top_error=LLMError("logprobs not supported", retryable=False), text="DEEPER")
+        self.assertEqual(self.classify(adapter, "evaluate_response"), "DEEPER")
+        self.assertFalse(llm_classify.use_logprobs())
+        # 之后的分类直接生成文本
+        self.classify(adapter, "evaluate_response")
+        self.assertEqual(adapter.calls, ["top_logprobs", "generate", "generate"])
+
+    def test_failed_generate_uses_fallback_output(self):
+        llm_classify._logprobs_supported = False
+        adapter = FakeAdapter(generate_error="Connection Error")
+        decision = self.classify(adapter)
+        self.assertIsInstance(decision, Decision)
+        self.assertEqual(decision, interview_prompts.FALLBACK_OUTPUTS["check_unanswerable"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,230 @@
+"""
+llm_router 的单元测试：注入假时钟与固定种子的随机数，验证选点策略、摘除、探测与慢启动；
+最后用 benchmarks/mock_vllm.py 起两个模拟节点（其中一个总是 503），验证客户端经路由器绕开坏节点。
+
+在仓库根目录运行：
+    python -m pytest -q tests
+"""
+import os
+import sys
+import random
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from llm_router import EndpointRouter, HEALTHY, EJECTED, PROBING, SLOW_START_MIN_WEIGHT
+
+URLS = ["http://a", "http://b", "http://c"]
+
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+def make_router(strategy="least_outstanding", urls=URLS, **kwargs):
+    clock = FakeClock()
+    kwargs.setdefault("failure_threshold", 2)
+    kwargs.setdefault("cooldown", 10)
+    kwargs.setdefault("slow_start", 20)
+    router = EndpointRouter(urls, strategy=strategy, clock=clock, rng=random.Random(0), **kwargs)
+    return router, clock
+
+
+def endpoint(router, url):
+    return next(e for e in router.endpoints if e.url == url)
+
+
+def eject(router, url):
+    """让 url 连续失败到阈值，被摘除"""
+    for _ in range(router.failure_threshold):
+        lease = router.acquire(exclude=[u for u in URLS if u != url])
+        assert lease.url == url
+        router.release(lease, failed=True)
+
+
+class RoutingTest(unittest.TestCase):
+
+    def test_least_outstanding_spreads_load(self):
+        router, _ = make_router()
+        leases = [router.acquire() for _ in range(6)]
+        self.assertEqual(sorted(e.outstanding for e in router.endpoints), [2, 2, 2])
+        # a 上的请求结束后，下一个请求一定落到 a
+        for lease in leases:
+            if lease.url == "http://a":
+                router.release(lease, failed=False)
+        self.assertEqual(router.acquire().url, "http://a")
+
+    def test_p2c_never_picks_the_busier_of_two(self):
+        router, _ = make_router("p2c")
+        busy = endpoint(router, "http://a")
+        busy.outstanding = 100
+        picked = [router.acquire() for _ in range(50)]
+        # 每次随机抽两个不同的节点比较，抽到的两个里有 a 时总是选另一个
+        self.assertNotIn("http://a", {lease.url for lease in picked})
+        for lease in picked:
+            router.release(lease, failed=False)
+        self.assertEqual(busy.outstanding, 100)
+
+    def test_exclude_falls_back_when_nothing_else_available(self):
+        router, _ = make_router(urls=["http://a"])
+        self.assertEqual(router.acquire(exclude=["http://a"]).url, "http://a")
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def test_ejected_after_consecutive_failures(self):
+        router, _ = make_router()
+        a = endpoint(router, "http://a")
+        router.release(router.acquire(exclude=["http://b", "http://c"]), failed=True)
+        self.assertEqual(a.state, HEALTHY)
+        router.release(router.acquire(exclude=["http://b", "http://c"]), failed=True)
+        self.assertEqual(a.state, EJECTED)
+        self.assertEqual(a.ejections, 1)
+        self.assertNotIn("http://a", {router.acquire().url for _ in range(10)})
+
+    def test_success_resets_failure_count(self):
+        router, _ = make_router()
+        others = ["http://b", "http://c"]
+        router.release(router.acquire(exclude=others), failed=True)
+        router.release(router.acquire(exclude=others), failed=False)
+        router.release(router.acquire(exclude=others), failed=True)
+        self.assertEqual(endpoint(router, "http://a").state, HEALTHY)
+
+    def test_late_results_do_not_affect_ejected_endpoint(self):
+        router, _ = make_router()
+        others = ["http://b", "http://c"]
+        in_flight = router.acquire(exclude=others)
+        eject(router, "http://a")
+        router.release(in_flight, failed=False)
+        a = endpoint(router, "http://a")
+        self.assertEqual(a.state, EJECTED)
+        self.assertEqual(a.outstanding, 0)
+
+    def test_probe_success_restores_with_slow_start(self):
+        router, clock = make_router()
+        eject(router, "http://a")
+        clock.advance(10)
+        probe = router.acquire()
+        self.assertEqual(probe.url, "http://a")
+        self.assertTrue(probe.probe)
+        a = endpoint(router, "http://a")
+        self.assertEqual(a.state, PROBING)
+        # 探测期间不再给 a 分配请求
+        self.assertNotIn("http://a", {router.acquire().url for _ in range(10)})
+        router.release(probe, failed=False)
+        self.assertEqual(a.state, HEALTHY)
+        self.assertEqual(a.recovered_at, clock.now)
+
+    def test_probe_failure_ejects_again(self):
+        router, clock = make_router()
+        eject(router, "http://a")
+        clock.advance(10)
+        probe = router.acquire()
+        router.release(probe, failed=True)
+        a = endpoint(router, "http://a")
+        self.assertEqual(a.state, EJECTED)
+        self.assertEqual(a.ejected_at, clock.now)
+        # 重新冷却后才会再次探测
+        clock.advance(5)
+        self.assertNotIn("http://a", {router.acquire().url for _ in range(10)})
+
+    def test_only_the_probe_settles_the_breaker(self):
+        router, clock = make_router(urls=["http://a"])
+        for _ in range(2):
+            router.release(router.acquire(), failed=True)
+        a = router.endpoints[0]
+        self.assertEqual(a.state, EJECTED)
+        clock.advance(10)
+        probe = router.acquire()
+        # 唯一的节点在探测中：兜底把普通请求也发给它，但它不是探测请求
+        fallback = router.acquire()
+        self.assertTrue(probe.probe)
+        self.assertFalse(fallback.probe)
+        router.release(fallback, failed=False)
+        self.assertEqual(a.state, PROBING)
+        self.assertTrue(a.probe_in_flight)
+        router.release(probe, failed=True)
+        self.assertEqual(a.state, EJECTED)
+        self.assertFalse(a.probe_in_flight)
+        self.assertEqual(a.outstanding, 0)
+
+    def test_release_is_counted_once(self):
+        router, _ = make_router()
+        lease = router.acquire()
+        router.release(lease, failed=True)
+        router.release(lease, failed=True)
+        a = endpoint(router, lease.url)
+        self.assertEqual((a.outstanding, a.requests, a.failures), (0, 1, 1))
+
+
+class SlowStartTest(unittest.TestCase):
+
+    def test_weight_ramps_up_after_recovery(self):
+        router, clock = make_router()
+        eject(router, "http://a")
+        clock.advance(10)
+        router.release(router.acquire(), failed=False)
+        a = endpoint(router, "http://a")
+        self.assertEqual(router._weight(a, clock.now), SLOW_START_MIN_WEIGHT)
+        clock.advance(10)
+        self.assertAlmostEqual(router._weight(a, clock.now), 0.5)
+        clock.advance(10)
+        self.assertEqual(router._weight(a, clock.now), 1.0)
+        self.assertIsNone(a.recovered_at)
+
+    def test_recovering_endpoint_gets_less_traffic(self):
+        router, clock = make_router()
+        eject(router, "http://a")
+        clock.advance(10)
+        router.release(router.acquire(), failed=False)
+        clock.advance(5)
+        leases = [router.acquire() for _ in range(30)]
+        counts = {url: sum(lease.url == url for lease in leases) for url in URLS}
+        self.assertLess(counts["http://a"], counts["http://b"])
+        self.assertGreater(counts["http://a"], 0)
+
+
+class MockServerTest(unittest.TestCase):
+
+    def test_client_routes_around_failing_endpoint(self):
+        from mock_vllm import MockConfig, start_mock_server
+        from llm_client import LLMClient, RetryPolicy
+
+        good = start_mock_server(MockConfig(ttft=0, tpot=0))
+        bad = start_mock_server(MockConfig(ttft=0, tpot=0, error_rate=1.0))
+        try:
+            clock = FakeClock()
+            router = EndpointRouter([bad.url, good.url], failure_threshold=2, cooldown=10, slow_start=20,
+                                    clock=clock, rng=random.Random(0))
+            client = LLMClient(router=router, retry_policy=RetryPolicy(base_delay=0, max_delay=0), hedge=False)
+            messages = [{"role": "user", "content": "你好"}]
+            for _ in range(20):
+                self.assertTrue(client.chat(messages, {"max_tokens": 8}))
+            bad_endpoint = endpoint(router, bad.url)
+            self.assertEqual(bad_endpoint.state, EJECTED)
+            self.assertEqual(bad_endpoint.failures, 2)
+            self.assertEqual(bad.stats.snapshot()["faults"]["error"], 2)
+
+            # 冷却结束后下一个请求去探测坏节点，探测失败后重新摘除，请求本身重试到好节点
+            clock.advance(10)
+            self.assertTrue(client.chat(messages, {"max_tokens": 8}))
+            self.assertEqual(bad_endpoint.state, EJECTED)
+            self.assertEqual(bad.stats.snapshot()["faults"]["error"], 3)
+            self.assertEqual(endpoint(router, good.url).outstanding, 0)
+            client.close()
+        finally:
+            good.shutdown()
+            bad.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
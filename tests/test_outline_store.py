@@ -0,0 +1,78 @@
+"""
+outline_store 的单元测试：只追加的大纲存储按 id 读取、按提交时间取最近一份和翻页，
+以及读取旧的 interview_outline.json（单条记录或记录列表）。
+
+在仓库根目录运行：
+    python -m pytest -q tests
+"""
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from outline_store import OutlineStore, OutlineNotFound, read_outline_file
+
+OUTLINE = "未来人工智能的发展趋势"
+KEY_QUESTIONS = ["你认为当前 AI 发展的最大挑战是什么？", "AI 在未来 10 年可能会如何影响人类社会？"]
+
+
+class OutlineStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir, ignore_errors=True)
+        self.store = OutlineStore(os.path.join(self.tmpdir, "outlines.sqlite3"))
+
+    def test_add_and_get(self):
+        outline_id = self.store.add(OUTLINE, KEY_QUESTIONS)
+        self.assertEqual(self.store.get(outline_id), (OUTLINE, KEY_QUESTIONS))
+        # 页面传来的 id 是字符串
+        self.assertEqual(self.store.get(str(outline_id)), (OUTLINE, KEY_QUESTIONS))
+        with self.assertRaises(OutlineNotFound):
+            self.store.get(outline_id + 1)
+
+    def test_latest_by_submission_time(self):
+        self.assertIsNone(self.store.latest_id())
+        newer = self.store.add("新的大纲", [], created_at=200.0)
+        # 导入的旧记录保留原来的提交时间，id 更大也不算最近
+        self.store.add("导入的旧大纲", [], created_at=100.0)
+        self.assertEqual(self.store.latest_id(), newer)
+
+    def test_recent_pages(self):
+        ids = [self.store.add(f"大纲{i}", [f"问题{i}"], created_at=float(i)) for i in range(5)]
+        page = self.store.recent(limit=2)
+        self.assertEqual([outline["id"] for outline in page], [ids[4], ids[3]])
+        self.assertEqual(page[0]["key_questions"], ["问题4"])
+        older = self.store.recent(limit=10, before=3.0)
+        self.assertEqual([outline["id"] for outline in older], [ids[2], ids[1], ids[0]])
+
+
+class ReadOutlineFileTest(unittest.TestCase):
+
+    def write(self, data):
+        fd, path = tempfile.mkstemp(suffix=".json")
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        return path
+
+    def test_single_record(self):
+        path = self.write({"interview_outline": OUTLINE, "key_questions": KEY_QUESTIONS})
+        self.assertEqual(read_outline_file(path), (OUTLINE, KEY_QUESTIONS))
+
+    def test_record_list_uses_last(self):
+        path = self.write([{"interview_outline": "旧的", "key_questions": []},
+                           {"interview_outline": OUTLINE, "key_questions": KEY_QUESTIONS}])
+        self.assertEqual(read_outline_file(path), (OUTLINE, KEY_QUESTIONS))
+
+    def test_empty_list(self):
+        with self.assertRaises(ValueError):
+            read_outline_file(self.write([]))
+
+
+if __name__ == "__main__":
+    unittest.main()
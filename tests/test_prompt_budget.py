@@ -0,0 +1,88 @@
+"""
+prompt_budget 的单元测试：近似 token 切分、elide_middle（含超长英文单词、数字串这类单个 “词” 远超预算的输入）
+以及按任务预算截断的 fit。
+
+在仓库根目录运行：
+    python -m pytest -q tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import prompt_budget
+from prompt_budget import approx_tokens, count_tokens, elide_middle, fit, ELISION_MARKER
+
+
+class TokenCountTest(unittest.TestCase):
+
+    def test_rules(self):
+        self.assertEqual(count_tokens("人工智能"), 4)
+        # 英文每 4 个字母 1 个，数字逐位
+        self.assertEqual(count_tokens("interview"), 3)
+        self.assertEqual(count_tokens("2024"), 4)
+        # 不含换行的空白并入后面的词，换行单独计
+        self.assertEqual(count_tokens("AI is"), 2)
+        self.assertEqual(count_tokens("AI\nis"), 3)
+
+    def test_tokens_cover_text(self):
+        for text in ("你好，world 123\n  next line ", "  前导空白", "x" * 10, ""):
+            self.assertEqual("".join(approx_tokens(text)), text)
+            self.assertEqual(len(approx_tokens(text)), count_tokens(text))
+        # 只有不含换行的空白时没有可并入的 token，不计数
+        self.assertEqual(count_tokens("   "), 0)
+
+
+class ElideMiddleTest(unittest.TestCase):
+
+    def assert_elided(self, text, max_tokens):
+        trimmed, dropped = elide_middle(text, max_tokens)
+        self.assertGreater(dropped, 0)
+        self.assertLessEqual(count_tokens(trimmed), max_tokens)
+        marker = ELISION_MARKER.format(tokens=dropped)
+        self.assertIn(marker, trimmed)
+        head, tail = trimmed.split(marker)
+        self.assertTrue(text.startswith(head))
+        self.assertTrue(text.endswith(tail))
+        # 保留的 token 数 + 省略数 = 原文 token 数
+        self.assertEqual(count_tokens(head) + count_tokens(tail) + dropped, count_tokens(text))
+        return head, tail
+
+    def test_within_budget_unchanged(self):
+        self.assertEqual(elide_middle("短回答", 10), ("短回答", 0))
+
+    def test_chinese_text(self):
+        head, tail = self.assert_elided("我" * 500 + "尾", 100)
+        self.assertTrue(tail.endswith("尾"))
+
+    def test_oversized_word_is_split(self):
+        # 整段只有一个 “词”：也要在 token 边界处切开，不能整个保留或整个丢掉
+        head, tail = self.assert_elided("x" * 3000, 100)
+        self.assertTrue(head)
+        self.assertTrue(tail)
+
+    def test_oversized_number_is_split(self):
+        self.assert_elided("1" * 3000, 50)
+
+    def test_budget_smaller_than_marker(self):
+        trimmed, dropped = elide_middle("我" * 100, 3)
+        self.assertEqual(dropped, 100)
+        self.assertEqual(trimmed, ELISION_MARKER.format(tokens=100))
+
+
+class FitTest(unittest.TestCase):
+
+    def test_fit_uses_default_budget(self):
+        budget = prompt_budget.input_budget("deeper_question", "answer")
+        self.assertEqual(fit("deeper_question", "answer", "简短的回答"), "简短的回答")
+        trimmed = fit("deeper_question", "answer", "长" * (budget * 2))
+        self.assertLessEqual(count_tokens(trimmed), budget)
+
+    def test_empty_text(self):
+        self.assertEqual(fit("deeper_question", "answer", ""), "")
+        self.assertIsNone(fit("transition", "question", None))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+"""
+session_store 的单元测试：内存和 SQLite 两个后端跑同一组用例，验证版本号、过期版本保存时的 SessionConflict、
+删除和按时间清理；SQLite 后端另外验证两个存储对象（相当于两个 worker）共用一个库文件时的冲突检测。
+
+在仓库根目录运行：
+    python -m pytest -q tests
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from session_store import (
+    MemorySessionStore, SqliteSessionStore, SessionConflict, encode_state, decode_state
+)
+
+STATE = {"engine": {"phase": "topic", "dialog_history": [{"role": "interviewee", "content": "我觉得数据是最大的挑战"}]}}
+
+
+class SessionStoreCases:
+    """两个后端共用的用例，子类提供 make_store()"""
+
+    def setUp(self):
+        self.store = self.make_store()
+
+    def test_missing_session(self):
+        self.assertEqual(self.store.load("missing"), (None, 0))
+
+    def test_versions_increase(self):
+        self.assertEqual(self.store.save("s1", STATE, expected_version=0), 1)
+        self.assertEqual(self.store.save("s1", {"step": 2}, expected_version=1), 2)
+        self.assertEqual(self.store.load("s1"), ({"step": 2}, 2))
+
+    def test_stale_version_conflicts(self):
+        self.store.save("s1", STATE, expected_version=0)
+        self.store.save("s1", {"step": 2}, expected_version=1)
+        with self.assertRaises(SessionConflict) as ctx:
+            self.store.save("s1", {"step": "stale"}, expected_version=1)
+        self.assertEqual((ctx.exception.session_id, ctx.exception.expected_version), ("s1", 1))
+        # 冲突的保存不生效
+        self.assertEqual(self.store.load("s1"), ({"step": 2}, 2))
+
+    def test_create_conflicts_with_existing_session(self):
+        self.store.save("s1", STATE, expected_version=0)
+        with self.assertRaises(SessionConflict):
+            self.store.save("s1", {"step": "new"}, expected_version=0)
+        self.assertEqual(self.store.load("s1"), (STATE, 1))
+
+    def test_update_of_missing_session_conflicts(self):
+        with self.assertRaises(SessionConflict):
+            self.store.save("missing", STATE, expected_version=3)
+
+    def test_unchecked_save_overwrites(self):
+        self.assertEqual(self.store.save("s1", STATE), 1)
+        self.assertEqual(self.store.save("s1", {"step": 2}), 2)
+        self.assertEqual(self.store.load("s1"), ({"step": 2}, 2))
+
+    def test_delete(self):
+        self.store.save("s1", STATE)
+        self.store.delete("s1")
+        self.store.delete("s1")
+        self.assertEqual(self.store.load("s1"), (None, 0))
+
+    def test_purge(self):
+        self.store.save("old", STATE)
+        self.assertEqual(self.store.purge(3600), 0)
+        self.assertEqual(self.store.purge(-1), 1)
+        self.assertEqual(self.store.load("old"), (None, 0))
+
+
+class MemorySessionStoreTest(SessionStoreCases, unittest.TestCase):
+
+    def make_store(self):
+        return MemorySessionStore()
+
+
+class SqliteSessionStoreTest(SessionStoreCases, unittest.TestCase):
+
+    def make_store(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir, ignore_errors=True)
+        self.path = os.path.join(self.tmpdir, "sessions.sqlite3")
+        return SqliteSessionStore(self.path)
+
+    def test_two_workers_share_one_file(self):
+        other = SqliteSessionStore(self.path)
+        self.store.save("s1", STATE, expected_version=0)
+        state, version = other.load("s1")
+        self.assertEqual(other.save("s1", {"worker": "other"}, expected_version=version), 2)
+        # 这边还拿着版本 1：保存失败，重新 load 后才能继续
+        with self.assertRaises(SessionConflict):
+            self.store.save("s1", {"worker": "this"}, expected_version=1)
+        self.assertEqual(self.store.load("s1"), ({"worker": "other"}, 2))
+
+
+class EncodingTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        self.assertEqual(decode_state(encode_state(STATE)), STATE)
+
+
+if __name__ == "__main__":
+    unittest.main()
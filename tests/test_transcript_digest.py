@@ -0,0 +1,107 @@
+"""
+transcript_digest 的单元测试：话题结束后在后台压缩对话，最终记录用摘要替换已压缩的话题；
+最后一个话题和过短的话题不压缩；摘要失败时用原文；to_dict / from_dict 只保存已生成好的摘要。
+
+在仓库根目录运行：
+    python -m pytest -q tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import transcript_digest
+from transcript_digest import TranscriptDigester, format_turns, render_transcript
+
+LONG_ANSWER = "我认为最大的挑战是数据质量和算力成本。" * 20
+
+
+def topic_turns(question):
+    return [{"role": "interviewer", "content": question}, {"role": "interviewee", "content": LONG_ANSWER}]
+
+
+def wait_digests(digester):
+    """等后台摘要全部结束（render 本身不等待）"""
+    for _, _, _, future in digester._segments:
+        if future is not None:
+            future.exception()
+
+
+class TranscriptDigesterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+
+    def summarize(self, topic, turns):
+        self.calls.append(topic)
+        return f"{topic}的摘要"
+
+    def test_closed_topics_use_digest(self):
+        digester = TranscriptDigester(self.summarize, final_topic="话题三")
+        history = topic_turns("话题一")
+        digester.close_topic("话题一", history)
+        history += topic_turns("话题二")
+        digester.close_topic("话题二", history)
+        history += [{"role": "interviewer", "content": "话题三"}, {"role": "interviewee", "content": "最后的回答"}]
+        wait_digests(digester)
+
+        rendered = digester.render(history)
+        self.assertEqual(self.calls, ["话题一", "话题二"])
+        self.assertEqual(
+            rendered,
+            "[话题摘要] 话题一\n话题一的摘要\n[话题摘要] 话题二\n话题二的摘要\n" + format_turns(history[4:])
+        )
+
+    def test_final_and_short_topics_not_summarized(self):
+        digester = TranscriptDigester(self.summarize, final_topic="最后的话题")
+        short = [{"role": "interviewer", "content": "短话题"}, {"role": "interviewee", "content": "还好"}]
+        digester.close_topic("短话题", short)
+        history = short + topic_turns("最后的话题")
+        digester.close_topic("最后的话题", history)
+        wait_digests(digester)
+        self.assertEqual(self.calls, [])
+        self.assertEqual(digester.render(history), format_turns(history))
+
+    def test_failed_digest_keeps_original(self):
+        def failing(topic, turns):
+            raise RuntimeError("model unavailable")
+
+        for summarize in (failing, lambda topic, turns: ""):
+            digester = TranscriptDigester(summarize)
+            history = topic_turns("话题一")
+            digester.close_topic("话题一", history)
+            wait_digests(digester)
+            self.assertEqual(digester.render(history), format_turns(history))
+
+    def test_disabled(self):
+        enabled = transcript_digest.DIGEST_ENABLED
+        transcript_digest.DIGEST_ENABLED = False
+        self.addCleanup(setattr, transcript_digest, "DIGEST_ENABLED", enabled)
+        digester = TranscriptDigester(self.summarize)
+        digester.close_topic("话题一", topic_turns("话题一"))
+        self.assertEqual(self.calls, [])
+
+    def test_round_trip(self):
+        digester = TranscriptDigester(self.summarize)
+        history = topic_turns("话题一")
+        digester.close_topic("话题一", history)
+        history += topic_turns("话题二")
+        wait_digests(digester)
+
+        state = digester.to_dict()
+        self.assertEqual(state, {"covered": 2, "segments": [[0, 2, "话题一", "话题一的摘要"]]})
+        restored = TranscriptDigester.from_dict(self.summarize, state)
+        self.assertEqual(restored.render(history), digester.render(history))
+        # 恢复后接着压缩后面的话题
+        restored.close_topic("话题二", history)
+        wait_digests(restored)
+        self.assertEqual(restored.to_dict()["segments"][1], [2, 4, "话题二", "话题二的摘要"])
+
+    def test_without_digester(self):
+        history = topic_turns("话题一")
+        self.assertEqual(render_transcript(history), format_turns(history))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,247 @@
+import os
+import json
+import time
+import random
+import threading
+import contextvars
+
+###########################
+# 追踪配置
+###########################
+# 设置后把 span 逐行写入该 JSONL 文件（每行一个 OTLP JSON 的 {"resourceSpans": [...]}，
+# 可直接交给 OpenTelemetry Collector 的 otlpjsonfile receiver）；为空时关闭追踪，span() 只返回一个空对象
+TRACE_FILE = os.environ.get("INTERVIEW_TRACE_FILE", "")
+TRACE_SERVICE_NAME = os.environ.get("INTERVIEW_TRACE_SERVICE", "ai-interviewer")
+
+# OTLP 的 SpanKind / StatusCode 取值
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_CLIENT = 3
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+# 子 span 自动继承的属性：同一会话、同一轮里的所有 span 都能按这两个字段筛选
+INHERITED_ATTRIBUTES = ("session_id", "question_index")
+
+_current_span = contextvars.ContextVar("interview_current_span", default=None)
+
+
+class Span:
+    """
+    一个 span。时间戳用纳秒墙钟记开始时间，结束时间按单调时钟的差值推算（不受系统时间跳变影响）。
+    attributes 中值为 None 的属性不导出。
+    """
+
+    def __init__(self, name, parent=None, kind=SPAN_KIND_INTERNAL, attributes=None):
+        self.name = name
+        self.kind = kind
+        self.trace_id = parent.trace_id if parent is not None else f"{random.getrandbits(128):032x}"
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_span_id = parent.span_id if parent is not None else ""
+        self.attributes = {}
+        if parent is not None:
+            for key in INHERITED_ATTRIBUTES:
+                if key in parent.attributes:
+                    self.attributes[key] = parent.attributes[key]
+        if attributes:
+            self.attributes.update(attributes)
+        self.status_code = STATUS_OK
+        self.status_message = ""
+        self.start_ns = time.time_ns()
+        self._started = time.monotonic()
+        self._token = None
+        self._ended = False
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes):
+        self.attributes.update(attributes)
+
+    def set_error(self, message):
+        self.status_code = STATUS_ERROR
+        self.status_message = str(message)
+
+    def activate(self):
+        """设为当前 span（之后创建的 span 以它为父），end() 时恢复"""
+        self._token = _current_span.set(self)
+        return self
+
+    def end(self):
+        if self._ended:
+            return
+        self._ended = True
+        if self._token is not None:
+            _current_span.reset(self._token)
+            self._token = None
+        end_ns = self.start_ns + int((time.monotonic() - self._started) * 1e9)
+        _get_exporter().export(self, end_ns)
+
+    def __enter__(self):
+        return self.activate()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None and not isinstance(exc, GeneratorExit):
+            self.set_error(f"{exc_type.__name__}: {exc}")
+        self.end()
+        return False
+
+
+class _NoopSpan:
+    """关闭追踪时的 span：所有操作都是空操作"""
+
+    name = ""
+    attributes = {}
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_attributes(self, **attributes):
+        pass
+
+    def set_error(self, message):
+        pass
+
+    def activate(self):
+        return self
+
+    def end(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def current_span():
+    return _current_span.get()
+
+
+def span(name, kind=SPAN_KIND_INTERNAL, **attributes):
+    """
+    创建当前 span 的子 span（没有当前 span 时新开一条 trace）。两种用法：
+      with tracing.span("interview.turn", session_id=..., question_index=...): ...
+          期间创建的 span 都以它为父；块内抛出的异常记为 ERROR 状态（异常照常抛出）
+      s = tracing.span("llm.transition"); ...; s.end()
+          不改变当前 span，适合跨越多个函数的叶子 span
+    """
+    if not TRACE_FILE:
+        return NOOP_SPAN
+    return Span(name, _current_span.get(), kind, attributes)
+
+
+def bind_context(fn):
+    """把当前的 span 上下文带进其他线程（线程池里的调用默认看不到调用方的当前 span）"""
+    if not TRACE_FILE:
+        return fn
+    context = contextvars.copy_context()
+
+    def wrapper(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+    return wrapper
+
+
+class TurnSpans:
+    """
+    命令行访谈的轮次 span：受访者每回答一次开始一个 interview.turn，到下一次等待输入之前结束，
+    这一轮里的模型调用、缓存查询、文件读写都记在它下面（等待受访者输入的时间不计入）
+    """
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.turn = 0
+        self._span = None
+
+    def answer(self, input_fn, prompt, question_index=None):
+        self.end()
+        reply = input_fn(prompt)
+        self.turn += 1
+        if TRACE_FILE:
+            self._span = span(
+                "interview.turn", session_id=self.session_id, question_index=question_index, turn=self.turn
+            ).activate()
+        return reply
+
+    def end(self):
+        if self._span is not None:
+            self._span.end()
+            self._span = None
+
+
+###########################
+# 导出
+###########################
+def _attribute_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def span_to_otlp(span, end_ns):
+    """OTLP JSON 编码的 Span（trace / span id 为十六进制，64 位整数按字符串编码）"""
+    status = {"code": span.status_code}
+    if span.status_message:
+        status["message"] = span.status_message
+    return {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "parentSpanId": span.parent_span_id,
+        "name": span.name,
+        "kind": span.kind,
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(end_ns),
+        "attributes": [
+            {"key": key, "value": _attribute_value(value)}
+            for key, value in span.attributes.items() if value is not None
+        ],
+        "status": status,
+    }
+
+
+class JsonlSpanExporter:
+    """span 结束时追加一行到文件；多个线程共用一个文件句柄，写入加锁"""
+
+    def __init__(self, path, service_name=TRACE_SERVICE_NAME):
+        self.path = path
+        self._resource = {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]}
+        self._file = None
+        self._lock = threading.Lock()
+
+    def export(self, span, end_ns):
+        record = {"resourceSpans": [{
+            "resource": self._resource,
+            "scopeSpans": [{"scope": {"name": "interview.tracing"}, "spans": [span_to_otlp(span, end_ns)]}],
+        }]}
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def _get_exporter():
+    global _exporter
+    if _exporter is None:
+        with _exporter_lock:
+            if _exporter is None:
+                _exporter = JsonlSpanExporter(TRACE_FILE)
+    return _exporter
@@ -0,0 +1,114 @@
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import tracing
+
+###########################
+# 访谈记录滚动摘要配置
+###########################
+# 每个话题结束时在后台把该话题的对话压缩成摘要，最终总结用 “各话题摘要 + 最近的原文”，
+# prompt 长度不再随访谈轮数线性增长（INTERVIEW_TRANSCRIPT_DIGEST=0 关闭，最终总结使用完整原文）
+DIGEST_ENABLED = os.environ.get("INTERVIEW_TRANSCRIPT_DIGEST", "1") != "0"
+# 话题原文短于这个字数时不值得压缩（摘要本身也有一两百字），直接用原文
+DIGEST_MIN_CHARS = int(os.environ.get("INTERVIEW_DIGEST_MIN_CHARS", "300"))
+DIGEST_WORKERS = int(os.environ.get("INTERVIEW_DIGEST_WORKERS", "4"))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=DIGEST_WORKERS, thread_name_prefix="transcript-digest")
+    return _executor
+
+
+def format_turns(turns):
+    """对话记录的原文格式：每条一行 “role: content”"""
+    return "".join(f"{turn['role']}: {turn['content']}\n" for turn in turns)
+
+
+class TranscriptDigester:
+    """
+    一场访谈的滚动摘要。summarize(topic, turns) 返回该话题的摘要文本（失败时返回空串）。
+
+    访谈流程在每个话题结束时调用 close_topic(topic, dialog_history)：从上一个话题结束的位置到当前末尾的对话
+    作为这个话题的片段，在后台生成摘要。render(dialog_history) 按顺序拼出最终总结用的访谈记录：
+    摘要已经生成好的片段用摘要，没生成好、生成失败或太短的片段用原文，最后接上还没结束的话题的原文。
+    不等待后台任务，所以最终总结的耗时不受摘要影响。
+    final_topic 为最后一个话题：它结束后紧接着就是最终总结，摘要来不及用上，不再压缩（避免与总结争抢服务端）。
+    """
+
+    def __init__(self, summarize, final_topic=None):
+        self._summarize = summarize
+        self.final_topic = final_topic
+        self._segments = []
+        self._covered = 0
+        self._lock = threading.Lock()
+
+    def close_topic(self, topic, dialog_history):
+        with self._lock:
+            start, end = self._covered, len(dialog_history)
+            if end <= start:
+                return
+            self._covered = end
+            turns = list(dialog_history[start:end])
+            future = None
+            if DIGEST_ENABLED and topic != self.final_topic and len(format_turns(turns)) >= DIGEST_MIN_CHARS:
+                future = _get_executor().submit(tracing.bind_context(self._summarize), topic, turns)
+            self._segments.append((start, end, topic, future))
+
+    def render(self, dialog_history):
+        with self._lock:
+            segments = list(self._segments)
+        parts = []
+        position = 0
+        for start, end, topic, future in segments:
+            if end > len(dialog_history):
+                # dialog_history 与记录的片段对不上（被外部改写过），剩下的全部按原文
+                break
+            digest = _ready_digest(future)
+            if digest:
+                parts.append(format_turns(dialog_history[position:start]))
+                parts.append(f"[话题摘要] {topic}\n{digest}\n")
+                position = end
+        parts.append(format_turns(dialog_history[position:]))
+        return "".join(parts)
+
+    def to_dict(self):
+        """可保存的状态：已生成好的摘要原样保存，还在生成或失败的记为 None（恢复后这部分用原文）"""
+        with self._lock:
+            segments = list(self._segments)
+        return {
+            "covered": self._covered,
+            "segments": [[start, end, topic, _ready_digest(future) or None] for start, end, topic, future in segments],
+        }
+
+    @classmethod
+    def from_dict(cls, summarize, data, final_topic=None):
+        digester = cls(summarize, final_topic)
+        digester._covered = data["covered"]
+        for start, end, topic, digest in data["segments"]:
+            future = None
+            if digest:
+                future = Future()
+                future.set_result(digest)
+            digester._segments.append((start, end, topic, future))
+        return digester
+
+
+def _ready_digest(future):
+    if future is None or not future.done() or future.exception() is not None:
+        return ""
+    return (future.result() or "").strip()
+
+
+def render_transcript(dialog_history, digester=None):
+    """最终总结用的访谈记录：有 digester 时用摘要替换已压缩的话题，否则为完整原文"""
+    if digester is None:
+        return format_turns(dialog_history)
+    return digester.render(dialog_history)
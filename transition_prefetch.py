@@ -0,0 +1,152 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import tracing
+from llm_client import MAX_CONCURRENCY
+
+###########################
+# 过渡语预取配置
+###########################
+PREFETCH_ENABLED = os.environ.get("INTERVIEW_PREFETCH_TRANSITIONS", "1") != "0"
+# 最多保留多少份大纲的过渡语表（按最近使用淘汰）
+PREFETCH_MAX_OUTLINES = int(os.environ.get("INTERVIEW_PREFETCH_MAX_OUTLINES", "32"))
+# 每张表最多保留多少条大纲话题以外的过渡语（背景问题到第一个话题的过渡语，每个会话各不相同）
+PREFETCH_MAX_EXTRA = int(os.environ.get("INTERVIEW_PREFETCH_MAX_EXTRA", "64"))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=MAX_CONCURRENCY, thread_name_prefix="transition-prefetch"
+                )
+    return _executor
+
+
+def topic_pairs(key_questions):
+    """相邻话题的 (上一话题, 下一话题) 列表，最后一个话题对应结束语（下一话题为 None）"""
+    return [
+        (question, key_questions[i + 1] if i + 1 < len(key_questions) else None)
+        for i, question in enumerate(key_questions)
+    ]
+
+
+class TransitionTable:
+    """
+    一份大纲的过渡语表：过渡语只取决于相邻两个话题，可以在访谈开始时就在后台并发生成好。
+    generate 为 generate_transition(previous_question, next_question=None, on_token=None)，
+    fallback 为它调用失败时返回的兜底过渡语：后台生成得到兜底文本或空文本时不保存，之后现场生成或重新预取。
+    大纲话题之间的过渡语一直保留；其他的（背景问题到第一个话题）取用一次即丢弃，最多保留 PREFETCH_MAX_EXTRA 条。
+    """
+
+    def __init__(self, generate, fallback=None):
+        self._generate = generate
+        self._fallback = fallback
+        self._futures = {}
+        self._topics = set()
+        self._extra = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _usable(self, future):
+        if not future.done() or future.exception() is not None:
+            return False
+        text = future.result()
+        return bool(text) and text != self._fallback
+
+    def _discard_failed(self, key, future):
+        if self._usable(future):
+            return
+        with self._lock:
+            if self._futures.get(key) is future:
+                del self._futures[key]
+                self._extra.pop(key, None)
+
+    def prefetch(self, previous_question, next_question=None):
+        """在后台生成一条过渡语（已经在生成或已生成的不重复提交；关闭预取时什么也不做）"""
+        if not PREFETCH_ENABLED:
+            return
+        key = (previous_question, next_question)
+        with self._lock:
+            if key in self._futures:
+                return
+            future = self._futures[key] = _get_executor().submit(self._generate, previous_question, next_question)
+            if key not in self._topics:
+                self._extra[key] = None
+                while len(self._extra) > PREFETCH_MAX_EXTRA:
+                    self._futures.pop(self._extra.popitem(last=False)[0], None)
+        # 生成失败（拿到兜底文本）的不留在表里；已经完成时回调在这里同步执行，所以不能持有锁
+        future.add_done_callback(lambda f: self._discard_failed(key, f))
+
+    def prefetch_topics(self, key_questions):
+        pairs = topic_pairs(key_questions)
+        with self._lock:
+            self._topics.update(pairs)
+        for previous_question, next_question in pairs:
+            self.prefetch(previous_question, next_question)
+
+    def ready(self, previous_question, next_question=None):
+        future = self._futures.get((previous_question, next_question))
+        return future is not None and self._usable(future)
+
+    def get(self, previous_question, next_question=None, on_token=None):
+        """
+        取过渡语：预取好的直接返回（传了 on_token 时整段回调一次）；
+        还没生成好或生成失败时现场生成（传了 on_token 则流式显示），不等待后台任务。
+        """
+        key = (previous_question, next_question)
+        with self._lock:
+            future = self._futures.get(key)
+            prefetched = future is not None and self._usable(future)
+            if prefetched and key in self._extra:
+                del self._futures[key]
+                del self._extra[key]
+        with tracing.span("transition.get", prefetched=prefetched):
+            if prefetched:
+                text = future.result()
+                if on_token is not None:
+                    on_token(text)
+                return text
+            return self._generate(previous_question, next_question, on_token=on_token)
+
+
+_tables = OrderedDict()
+_tables_lock = threading.Lock()
+
+
+def _outline_key(generate, interview_outline, key_questions):
+    raw = json.dumps([interview_outline, key_questions], ensure_ascii=False)
+    return (generate.__module__, hashlib.sha256(raw.encode("utf-8")).hexdigest())
+
+
+def start_transition_prefetch(generate, interview_outline, key_questions, fallback=None):
+    """
+    读取大纲后调用：返回该大纲的过渡语表，并在后台并发生成所有话题之间的过渡语。
+    同一份大纲（多个会话 / 重复开始访谈）共用一张表；关闭预取时返回的表总是现场生成。
+    fallback 为 generate 失败时返回的兜底过渡语（见 TransitionTable）。
+    """
+    key = _outline_key(generate, interview_outline, key_questions)
+    with _tables_lock:
+        table = _tables.get(key)
+        if table is None:
+            table = _tables[key] = TransitionTable(generate, fallback)
+            while len(_tables) > PREFETCH_MAX_OUTLINES:
+                _tables.popitem(last=False)
+        else:
+            _tables.move_to_end(key)
+    table.prefetch_topics(key_questions)
+    return table
+
+
+def clear_transition_tables():
+    """丢弃所有大纲的过渡语表（下次 start_transition_prefetch 重新生成）"""
+    with _tables_lock:
+        _tables.clear()
@@ -1,13 +1,12 @@
 import re
 import json
-import requests
+from llm_client import MAX_CONCURRENCY, LLMError, get_client
+from task_profiles import ANALYSIS_STEP_TIMEOUT
 
 ###########################
 # API 配置
 ###########################
-API_URL = "http://10.77.110.129:8000/v1/chat/completions"
-HEADERS = {"Content-Type": "application/json"}
-MODEL_NAME = "/home/zhangyuheng/.cache/modelscope/hub/Qwen/Qwen2.5-7B-Instruct"
+# 接口地址、模型名等配置由 llm_client 统一提供
 
 # 全局采样参数
 DEFAULT_PARAMS = {
@@ -25,19 +24,23 @@ def query_api(messages, params=None):
     if params is None:
         params = DEFAULT_PARAMS
     
-    data = {
-        "model": MODEL_NAME,
-        "messages": messages,
-        **params
-    }
-    
     try:
-        response = requests.post(API_URL, headers=HEADERS, json=data, timeout=30)
-        if response.status_code == 200:
-            return response.json()["choices"][0]["message"]["content"]
-        return f"Error: API request failed with status {response.status_code}"
+        return get_client().chat(messages, params)
     except Exception as e:
-        return f"Error: {str(e)}"
+        return _error_text(e)
+
+def query_api_batch(messages_list, params=None, deadline=None):
+    """并发调用API，结果按输入顺序返回；deadline 为每条请求的超时，失败的条目为错误文本"""
+    if params is None:
+        params = DEFAULT_PARAMS
+
+    results = get_client().chat_batch(messages_list, params, max_concurrency=MAX_CONCURRENCY, deadline=deadline)
+    return [_error_text(r) if isinstance(r, Exception) else r for r in results]
+
+def _error_text(error):
+    if isinstance(error, LLMError) and error.status_code is not None:
+        return f"Error: API request failed with status {error.status_code}"
+    return f"Error: {str(error)}"
 
 def build_messages(system_prompt, user_content):
     """构建标准消息结构"""
@@ -174,14 +177,16 @@ def analyze_interview_outline(interview_outline, key_questions):
         }
     ]
 
-    analysis_data = {}
-    for step in analysis_steps:
-        messages = build_messages(
+    # 各步只依赖大纲和关键问题，并发请求，每步单独限时
+    messages_list = [
+        build_messages(
             system_prompt=f"You are in analysis state. {step['system']}",
             user_content=f"访谈大纲: {interview_outline}\n关键问题: {key_questions}\n{step['user']}"
         )
-        result = query_api(messages, params={"max_tokens": 1024})
-        analysis_data[step["name"]] = result
+        for step in analysis_steps
+    ]
+    results = query_api_batch(messages_list, params={"max_tokens": 1024}, deadline=ANALYSIS_STEP_TIMEOUT)
+    analysis_data = {step["name"]: result for step, result in zip(analysis_steps, results)}
 
     # 处理评分指标
     rating_metrics = []